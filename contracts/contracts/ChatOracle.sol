@@ -138,6 +138,12 @@ contract ChatOracle is IOracle {
         address sender
     );
 
+    // @notice Event emitted when a call of a response batch reverts
+    event BatchCallFailed(
+        uint index,
+        bytes reason
+    );
+
     constructor() {
         owner = msg.sender;
         promptsCount = 0;
@@ -530,4 +536,17 @@ contract ChatOracle is IOracle {
     function markKnowledgeBaseQueryAsProcessed(uint kbQueryId) public onlyWhitelisted {
         isKbQueryProcessed[kbQueryId] = true;
     }
+
+    // @notice Executes several response calls in a single transaction
+    // @param calls ABI encoded calls to the response and mark as processed functions of this contract
+    // @dev Called by teeML oracle, calls are delegated to this contract so msg.sender stays the oracle.
+    // A reverting call only undoes its own changes and is reported with BatchCallFailed
+    function batchResponses(bytes[] calldata calls) public onlyWhitelisted {
+        for (uint i = 0; i < calls.length; i++) {
+            (bool success, bytes memory reason) = address(this).delegatecall(calls[i]);
+            if (!success) {
+                emit BatchCallFailed(i, reason);
+            }
+        }
+    }
 }
@@ -52,4 +52,61 @@ describe("ChatOracle", function () {
       ).to.be.rejectedWith("Caller is not owner");
     });
   });
+
+  describe("Batch responses", function () {
+    const addResponseSignature = "addResponse(uint256,uint256,string,string)";
+
+    async function deployWithChat() {
+      const {oracle, owner, allSigners} = await deploy();
+      const oracleAccount = allSigners[6];
+      await oracle.updateWhitelist(oracleAccount, true);
+
+      const ChatGpt = await ethers.getContractFactory("ChatGpt");
+      const chatGpt = await ChatGpt.deploy(oracle.target, "");
+      await chatGpt.startChat("Hello");
+      await chatGpt.startChat("Hello again");
+
+      return {oracle, chatGpt, oracleAccount, allSigners};
+    }
+
+    it("Whitelisted account can add responses in a batch", async () => {
+      const {oracle, oracleAccount} = await loadFixture(deployWithChat);
+
+      await oracle.connect(oracleAccount).batchResponses([
+        oracle.interface.encodeFunctionData(addResponseSignature, [0, 0, "Hi", ""]),
+        oracle.interface.encodeFunctionData(addResponseSignature, [1, 1, "Hi again", ""]),
+      ]);
+
+      expect(await oracle.isPromptProcessed(0)).to.equal(true);
+      expect(await oracle.isPromptProcessed(1)).to.equal(true);
+      const messages = await oracle.getMessagesAndRoles(1, 1)
+      expect(messages.length).to.equal(2)
+      expect(messages[1].content[0].value).to.equal("Hi again")
+    });
+    it("Failing call does not revert the batch", async () => {
+      const {oracle, oracleAccount} = await loadFixture(deployWithChat);
+
+      await expect(
+        oracle.connect(oracleAccount).batchResponses([
+          oracle.interface.encodeFunctionData(addResponseSignature, [0, 0, "Hi", ""]),
+          oracle.interface.encodeFunctionData(addResponseSignature, [0, 0, "Hi", ""]),
+          oracle.interface.encodeFunctionData(addResponseSignature, [1, 1, "Hi again", ""]),
+        ])
+      ).to.emit(oracle, "BatchCallFailed");
+
+      expect(await oracle.isPromptProcessed(0)).to.equal(true);
+      expect(await oracle.isPromptProcessed(1)).to.equal(true);
+      const messages = await oracle.getMessagesAndRoles(0, 0)
+      expect(messages.length).to.equal(2)
+    });
+    it("Only whitelisted address can add responses in a batch", async () => {
+      const {oracle, allSigners} = await loadFixture(deployWithChat);
+
+      await expect(
+        oracle.connect(allSigners[1]).batchResponses([
+          oracle.interface.encodeFunctionData(addResponseSignature, [0, 0, "Hi", ""]),
+        ])
+      ).to.be.rejectedWith("Caller is not whitelisted");
+    });
+  });
 });
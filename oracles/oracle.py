@@ -1,65 +1,180 @@
+import time
+
+# every startup phase is timed for the startup report
+started_at = time.perf_counter()
+
 import asyncio
 import json
 
 import settings
 
+from src.domain.llm.rate_limiter import rate_limiter
+from src.domain.tracing import tracer
 from src.repositories.ipfs_repository import IpfsRepository
+from src.repositories.web3.chain_client import ChainClient
 from src.repositories.web3.chat_repository import Web3ChatRepository
 from src.repositories.web3.function_repository import Web3FunctionRepository
 from src.repositories.web3.knowledge_base_repository import Web3KnowledgeBaseRepository
+from src.repositories.web3.subscription import OracleSubscription
 from src.repositories.knowledge_base_repository import KnowledgeBaseRepository
 from src.service import chat_service
 from src.service import functions_service
 from src.service import knowledge_base_indexing_service
 from src.service import knowledge_base_query_service
+from src.service.job_engine import JobEngine
+from src.service.metrics_server import MetricsServer
+from src.service.supervisor import Supervisor
+from src.service.supervisor import get_worker_path
 
-web3_chat_repository = Web3ChatRepository()
-web3_function_repository = Web3FunctionRepository()
-web3_kb_repository = Web3KnowledgeBaseRepository()
-ipfs_repository = IpfsRepository()
-kb_repository = KnowledgeBaseRepository(max_size=settings.KNOWLEDGE_BASE_CACHE_MAX_SIZE)
+imported_at = time.perf_counter()
 
-repositories = [web3_chat_repository, web3_function_repository, web3_kb_repository]
 
+class Oracle:
+    """The clients, repositories and job handlers of one oracle process."""
 
-async def collect_and_save_metrics():
-    while True:
-        metrics = {
-            "transactions_sent": 0,
-            "errors": 0,
-        }
+    def __init__(self) -> None:
+        self.chain_client = ChainClient()
+        web3_chat_repository = Web3ChatRepository(self.chain_client)
+        web3_function_repository = Web3FunctionRepository(self.chain_client)
+        web3_kb_repository = Web3KnowledgeBaseRepository(self.chain_client)
+        self.oracle_subscription = OracleSubscription(
+            settings.WEB3_WS_URL, self.chain_client.oracle_contract
+        )
+        if settings.WEB3_WS_URL:
+            # check pending receipts on every new block instead of polling
+            self.chain_client.receipt_tracker.new_block = (
+                self.oracle_subscription.new_block
+            )
+        ipfs_repository = IpfsRepository()
+        kb_repository = KnowledgeBaseRepository(
+            max_size=settings.KNOWLEDGE_BASE_CACHE_MAX_SIZE
+        )
 
-        for repo in repositories:
-            repo_metrics = repo.get_metrics().copy()
-            metrics["transactions_sent"] += repo_metrics.pop(
-                "transactions_sent", 0
+        self.job_engine = JobEngine(self.oracle_subscription)
+        self.job_engine.register(
+            chat_service.ChatHandler(web3_chat_repository, ipfs_repository)
+        )
+        self.job_engine.register(
+            functions_service.FunctionCallHandler(web3_function_repository)
+        )
+        self.job_engine.register(
+            knowledge_base_indexing_service.KnowledgeBaseIndexingHandler(
+                web3_kb_repository, ipfs_repository, kb_repository
             )
-            metrics["errors"] += repo_metrics.pop("errors", 0)
-            metrics.update(repo_metrics)
+        )
+        self.job_engine.register(
+            knowledge_base_query_service.KnowledgeBaseQueryHandler(
+                web3_kb_repository, ipfs_repository, kb_repository
+            )
+        )
+
+        self.repositories = [
+            web3_chat_repository,
+            web3_function_repository,
+            web3_kb_repository,
+        ]
+        # shared components, their metrics are kept apart from the per repository ones
+        self.components = [
+            self.chain_client,
+            self.chain_client.fee_oracle,
+            self.chain_client.signers,
+            self.job_engine,
+            rate_limiter,
+            tracer,
+        ]
+        self.components += [
+            repo.response_batcher for repo in self.repositories if repo.response_batcher
+        ]
+        # components keeping latency histograms for the metrics server
+        self.histogram_components = [rate_limiter, tracer]
+        self.startup_timing = {}
 
-        with open("metrics.json", "w") as f:
-            json.dump(metrics, f)
+    def collect_metrics(self):
+        """Returns the repository metrics and the component metrics."""
+        metrics = {}
+        for repo in self.repositories:
+            # every repository counts its transactions and errors, they add up
+            for key, value in repo.get_metrics().items():
+                metrics[key] = metrics.get(key, 0) + value
 
-        print("Metrics saved to file.")
-        await asyncio.sleep(10)
+        component_metrics = dict(self.startup_timing)
+        for component in self.components:
+            component_metrics.update(component.get_metrics())
+        return metrics, component_metrics
+
+    def collect_histograms(self):
+        return [
+            histogram
+            for component in self.histogram_components
+            for histogram in component.get_histograms()
+        ]
+
+    def get_all_metrics(self):
+        metrics, component_metrics = self.collect_metrics()
+        return {**metrics, **component_metrics}
+
+    async def collect_and_save_metrics(self):
+        while True:
+            metrics, component_metrics = self.collect_metrics()
+            # both are fresh dicts, written from a thread to keep the loop free
+            await asyncio.to_thread(save_metrics, "metrics.json", metrics)
+            await asyncio.to_thread(
+                save_metrics, "component_metrics.json", component_metrics
+            )
+            print("Metrics saved to file.")
+            await tracer.flush()
+            await asyncio.sleep(10)
+
+    async def run(self, set_up_at: float):
+        await self.chain_client.connect()
+        self.startup_timing.update(
+            {
+                "startup_imports_s": round(imported_at - started_at, 3),
+                "startup_setup_s": round(set_up_at - imported_at, 3),
+                "startup_connect_s": round(time.perf_counter() - set_up_at, 3),
+            }
+        )
+        print(f"Startup timing: {self.startup_timing}", flush=True)
+        tasks = [
+            self.job_engine.run(),
+            self.oracle_subscription.run(),
+            self.chain_client.fee_oracle.run(),
+            self.chain_client.signers.run(),
+            self.collect_and_save_metrics(),
+        ]
+        if settings.SERVE_METRICS:
+            metrics_server = MetricsServer(
+                self.get_all_metrics,
+                self.collect_histograms,
+                port=settings.METRICS_PORT + (settings.ORACLE_WORKER_INDEX or 0),
+            )
+            tasks.append(metrics_server.run())
+
+        print("Oracle started!")
+        await asyncio.gather(*tasks)
+
+
+def save_metrics(name: str, metrics) -> None:
+    with open(get_worker_path(name, settings.ORACLE_WORKER_INDEX), "w") as f:
+        json.dump(metrics, f)
 
 
 async def main():
-    tasks = [
-        chat_service.execute(web3_chat_repository, ipfs_repository),
-        functions_service.execute(web3_function_repository),
-        knowledge_base_indexing_service.execute(
-            web3_kb_repository, ipfs_repository, kb_repository
-        ),
-        knowledge_base_query_service.execute(
-            web3_kb_repository, ipfs_repository, kb_repository
-        ),
-        collect_and_save_metrics(),
-    ]
-
-    print("Oracle started!")
-    await asyncio.gather(*tasks)
+    # the supervisor process of a sharded oracle never builds these
+    oracle = Oracle()
+    await oracle.run(time.perf_counter())
+
+
+def run(coroutine) -> None:
+    if settings.UVLOOP:
+        import uvloop
+
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    asyncio.run(coroutine)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if settings.ORACLE_WORKERS > 1 and settings.ORACLE_WORKER_INDEX is None:
+        run(Supervisor(__file__).run())
+    else:
+        run(main())
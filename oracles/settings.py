@@ -8,17 +8,75 @@ ENVIRONMENT = os.getenv("ENVIRONMENT", "local")
 OPEN_AI_API_KEY = os.getenv("OPEN_AI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
 
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 
 CHAIN_ID = os.getenv("CHAIN_ID", "696969")
 WEB3_RPC_URL = os.getenv("WEB3_RPC_URL", "https://devnet.galadriel.com")
+WEB3_RPC_URLS = [
+    url.strip() for url in os.getenv("WEB3_RPC_URLS", "").split(",") if url.strip()
+] or [WEB3_RPC_URL]
+RPC_HEDGE_AFTER = float(os.getenv("RPC_HEDGE_AFTER", 0))
+RPC_BROADCAST_COUNT = int(os.getenv("RPC_BROADCAST_COUNT", 3))
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", 100))
+RPC_KEEPALIVE_TIMEOUT = float(os.getenv("RPC_KEEPALIVE_TIMEOUT", 30))
+WEB3_WS_URL = os.getenv("WEB3_WS_URL")
+WEB3_WS_IDLE_POLL_INTERVAL = float(os.getenv("WEB3_WS_IDLE_POLL_INTERVAL", 10))
+WEB3_WS_STALE_TIMEOUT = float(os.getenv("WEB3_WS_STALE_TIMEOUT", 60))
+RECEIPT_POLL_INTERVAL = float(os.getenv("RECEIPT_POLL_INTERVAL", 0.5))
+RECEIPT_TIMEOUT = float(os.getenv("RECEIPT_TIMEOUT", 120))
+FEE_ORACLE_INTERVAL = float(os.getenv("FEE_ORACLE_INTERVAL", 5))
+FEE_HISTORY_BLOCKS = int(os.getenv("FEE_HISTORY_BLOCKS", 20))
+FEE_PRIORITY_PERCENTILE = float(os.getenv("FEE_PRIORITY_PERCENTILE", 50))
+FEE_MIN_PRIORITY_FEE_GWEI = float(os.getenv("FEE_MIN_PRIORITY_FEE_GWEI", 0.01))
+FEE_MAX_FEE_GWEI = float(os.getenv("FEE_MAX_FEE_GWEI", 0))
 PRIVATE_KEY = os.getenv("PRIVATE_KEY")
+PRIVATE_KEYS = [
+    key.strip() for key in os.getenv("PRIVATE_KEYS", "").split(",") if key.strip()
+] or [PRIVATE_KEY]
+SIGNER_STRATEGY = os.getenv("SIGNER_STRATEGY", "round_robin")
+SIGNER_BALANCE_INTERVAL = float(os.getenv("SIGNER_BALANCE_INTERVAL", 60))
+ORACLE_WORKERS = max(1, int(os.getenv("ORACLE_WORKERS", 1)))
+# set by the supervisor for each of its worker processes
+ORACLE_WORKER_INDEX = (
+    int(os.environ["ORACLE_WORKER_INDEX"]) if os.getenv("ORACLE_WORKER_INDEX") else None
+)
 ORACLE_ADDRESS = os.getenv("ORACLE_ADDRESS")
 ORACLE_ABI_PATH = os.getenv("ORACLE_ABI_PATH", "abi/ChatOracle.json")
+MULTICALL_ADDRESS = os.getenv("MULTICALL_ADDRESS")
+MULTICALL_BATCH_SIZE = int(os.getenv("MULTICALL_BATCH_SIZE", 25))
+INDEXING_CONCURRENCY = max(1, int(os.getenv("INDEXING_CONCURRENCY", 1)))
+DISCOVERY_MODE = os.getenv("DISCOVERY_MODE", "count")
+DISCOVERY_REORG_DEPTH = int(os.getenv("DISCOVERY_REORG_DEPTH", 5))
+DISCOVERY_CONFIRMATIONS = int(os.getenv("DISCOVERY_CONFIRMATIONS", 0))
+DISCOVERY_MAX_BLOCK_RANGE = int(os.getenv("DISCOVERY_MAX_BLOCK_RANGE", 2000))
+DISCOVERY_SYNC_INTERVAL = float(os.getenv("DISCOVERY_SYNC_INTERVAL", 1))
+DISCOVERY_VERIFY_INTERVAL = float(os.getenv("DISCOVERY_VERIFY_INTERVAL", 60))
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH")
+COLD_START_SEARCH_FANOUT = int(os.getenv("COLD_START_SEARCH_FANOUT", 1))
+PENDING_HISTORY_SIZE = int(os.getenv("PENDING_HISTORY_SIZE", 100))
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", 1000))
+KB_INDEX_CACHE_TTL = float(os.getenv("KB_INDEX_CACHE_TTL", 60))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 1))
+JOB_RETRY_MAX_DELAY = float(os.getenv("JOB_RETRY_MAX_DELAY", 60))
+JOB_DEADLINE = float(os.getenv("JOB_DEADLINE", 0))
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "False").lower() == "true"
+ADAPTIVE_CONCURRENCY_MIN = int(os.getenv("ADAPTIVE_CONCURRENCY_MIN", 1))
+ADAPTIVE_CONCURRENCY_MAX = int(os.getenv("ADAPTIVE_CONCURRENCY_MAX", 50))
+ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE = float(
+    os.getenv("ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE", 2)
+)
+FAIR_QUEUE_WEIGHTS = os.getenv("FAIR_QUEUE_WEIGHTS", "")
+RESPONSE_BATCH_SIZE = int(os.getenv("RESPONSE_BATCH_SIZE", 1))
+RESPONSE_BATCH_MAX_WAIT = float(os.getenv("RESPONSE_BATCH_MAX_WAIT", 0.5))
+UVLOOP = os.getenv("UVLOOP", "False").lower() == "true"
+TRACE_PATH = os.getenv("TRACE_PATH")
 
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "galadriel-assets")
 SERVE_METRICS = os.getenv("SERVE_METRICS", "False").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 8000))
 E2B_API_KEY = os.getenv("E2B_API_KEY")
 PINATA_API_JWT = os.getenv("PINATA_API_JWT")
 PINATA_GATEWAY_TOKEN = os.getenv("PINATA_GATEWAY_TOKEN")
@@ -0,0 +1,55 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import aiohttp
+import httpx
+
+# total timeout of the aiohttp requests, the aiohttp default
+SESSION_TIMEOUT = 300
+# error message of the requests that ran out of time
+DEADLINE_EXCEEDED_ERROR = "Request deadline exceeded"
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    pass
+
+
+_current_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def set_deadline(deadline: Optional[float]) -> None:
+    """
+    Sets the unix time the current task has to finish its work by, every stage
+    it runs afterwards gets the remaining time as its timeout.
+    """
+    _current_deadline.set(deadline)
+
+
+def get_timeout(timeout: Optional[float]) -> Optional[float]:
+    """
+    Returns the stage timeout capped at the remaining time, raises
+    DeadlineExceeded when there is none left.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise DeadlineExceeded(DEADLINE_EXCEEDED_ERROR)
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def get_http_timeout(timeout: httpx.Timeout) -> httpx.Timeout:
+    """get_timeout for the httpx timeouts of the provider clients."""
+    if _current_deadline.get() is None:
+        return timeout
+    return httpx.Timeout(
+        timeout=get_timeout(timeout.read), connect=get_timeout(timeout.connect)
+    )
+
+
+def get_session_timeout() -> aiohttp.ClientTimeout:
+    """get_timeout for aiohttp sessions."""
+    return aiohttp.ClientTimeout(total=get_timeout(SESSION_TIMEOUT))
@@ -22,35 +22,52 @@ from anthropic import NOT_GIVEN
 from anthropic import AsyncAnthropic
 from anthropic.types import Message
 
+from src.domain import deadline
+from src.domain import throttling
+from src.domain.llm.rate_limiter import rate_limiter
+from src.domain.llm.utils import TIMEOUT
 from src.entities import Chat
 
 import settings
 
 
 @backoff.on_exception(
-    backoff.expo, (anthropic.RateLimitError, anthropic.APITimeoutError), max_tries=3
+    backoff.expo,
+    (anthropic.RateLimitError, anthropic.APITimeoutError),
+    max_tries=3,
+    on_backoff=throttling.on_backoff,
 )
 async def execute(chat: Chat) -> Optional[ChatCompletion]:
-    client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
     system_prompt = NOT_GIVEN
     messages = chat.messages
 
     if len(messages) > 0 and messages[0]["role"] == "system":
         system_prompt = messages[0]["content"]
         messages = messages[1:]
-    message = await client.messages.create(
-        max_tokens=chat.config.max_tokens or 4096,
-        messages=messages,
-        model=chat.config.model,
-        stop_sequences=chat.config.stop or NOT_GIVEN,
-        system=system_prompt,
-        temperature=chat.config.temperature or NOT_GIVEN,
-        tool_choice=(
-            {"type": "auto"} if chat.config.tool_choice == "auto" else NOT_GIVEN
-        ),
-        tools=_convert_tool_definitions(chat.config.tools),
-        top_p=chat.config.top_p or NOT_GIVEN,
+    reservation = await rate_limiter.reserve(
+        "anthropic", chat.config.model, chat.messages, chat.config.max_tokens or 4096
     )
+    async with reservation:
+        client = AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            timeout=deadline.get_http_timeout(TIMEOUT),
+        )
+        message = await client.messages.create(
+            max_tokens=chat.config.max_tokens or 4096,
+            messages=messages,
+            model=chat.config.model,
+            stop_sequences=chat.config.stop or NOT_GIVEN,
+            system=system_prompt,
+            temperature=chat.config.temperature or NOT_GIVEN,
+            tool_choice=(
+                {"type": "auto"} if chat.config.tool_choice == "auto" else NOT_GIVEN
+            ),
+            tools=_convert_tool_definitions(chat.config.tools),
+            top_p=chat.config.top_p or NOT_GIVEN,
+        )
+        reservation.used_tokens = (
+            message.usage.input_tokens + message.usage.output_tokens
+        )
 
     return _convert_output_to_chat_completion(chat, message)
 
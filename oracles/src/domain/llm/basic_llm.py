@@ -7,19 +7,29 @@ from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletion
 
 import settings
+from src.domain import deadline
+from src.domain import throttling
+from src.domain.llm.rate_limiter import get_used_tokens
+from src.domain.llm.rate_limiter import rate_limiter
 from src.domain.llm.utils import TIMEOUT
 
 
 @backoff.on_exception(
-    backoff.expo, (openai.RateLimitError, openai.APITimeoutError), max_tries=3
+    backoff.expo,
+    (openai.RateLimitError, openai.APITimeoutError),
+    max_tries=3,
+    on_backoff=throttling.on_backoff,
 )
 async def execute(model: str, messages: List[dict]) -> Optional[str]:
-    client = AsyncOpenAI(
-        api_key=settings.OPEN_AI_API_KEY,
-        timeout=TIMEOUT,
-    )
-    chat_completion: ChatCompletion = await client.chat.completions.create(
-        messages=messages,
-        model=model,
-    )
+    reservation = await rate_limiter.reserve("openai", model, messages)
+    async with reservation:
+        client = AsyncOpenAI(
+            api_key=settings.OPEN_AI_API_KEY,
+            timeout=deadline.get_http_timeout(TIMEOUT),
+        )
+        chat_completion: ChatCompletion = await client.chat.completions.create(
+            messages=messages,
+            model=model,
+        )
+        reservation.used_tokens = get_used_tokens(chat_completion)
     return chat_completion.choices[0].message.content
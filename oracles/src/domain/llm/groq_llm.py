@@ -7,37 +7,49 @@ from groq.types.chat import ChatCompletion as GroqChatCompletion
 from openai.types.chat.chat_completion import ChatCompletion
 
 import settings
+from src.domain import deadline
+from src.domain import throttling
+from src.domain.llm.rate_limiter import get_used_tokens
+from src.domain.llm.rate_limiter import rate_limiter
 from src.domain.llm.utils import TIMEOUT
 from src.entities import Chat
 
 
 @backoff.on_exception(
-    backoff.expo, (groq.RateLimitError, groq.APITimeoutError), max_tries=3
+    backoff.expo,
+    (groq.RateLimitError, groq.APITimeoutError),
+    max_tries=3,
+    on_backoff=throttling.on_backoff,
 )
 async def execute(chat: Chat) -> Optional[GroqChatCompletion]:
-    client = AsyncGroq(
-        api_key=settings.GROQ_API_KEY,
-        timeout=TIMEOUT,
-    )
     for message in chat.messages:
         if len(message.get("content")) and message.get("content"):
             content = message.get("content")
             if type(content) is not str:
                 message["content"] = message.get("content")[0].get("text")
-    chat_completion: ChatCompletion = await client.chat.completions.create(
-        messages=chat.messages,
-        model=chat.config.model,
-        frequency_penalty=chat.config.frequency_penalty,
-        logit_bias=chat.config.logit_bias,
-        max_tokens=chat.config.max_tokens,
-        presence_penalty=chat.config.presence_penalty,
-        response_format=chat.config.response_format,
-        seed=chat.config.seed,
-        stop=chat.config.stop,
-        temperature=chat.config.temperature,
-        top_p=chat.config.top_p,
-        user=chat.config.user,
+    reservation = await rate_limiter.reserve(
+        "groq", chat.config.model, chat.messages, chat.config.max_tokens
     )
+    async with reservation:
+        client = AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            timeout=deadline.get_http_timeout(TIMEOUT),
+        )
+        chat_completion: ChatCompletion = await client.chat.completions.create(
+            messages=chat.messages,
+            model=chat.config.model,
+            frequency_penalty=chat.config.frequency_penalty,
+            logit_bias=chat.config.logit_bias,
+            max_tokens=chat.config.max_tokens,
+            presence_penalty=chat.config.presence_penalty,
+            response_format=chat.config.response_format,
+            seed=chat.config.seed,
+            stop=chat.config.stop,
+            temperature=chat.config.temperature,
+            top_p=chat.config.top_p,
+            user=chat.config.user,
+        )
+        reservation.used_tokens = get_used_tokens(chat_completion)
     assert (
         chat_completion.choices[0].message.content
         or chat_completion.choices[0].message.tool_calls
@@ -6,35 +6,48 @@ from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletion
 
 from src.entities import Chat
+from src.domain import deadline
+from src.domain import throttling
+from src.domain.llm.rate_limiter import get_used_tokens
+from src.domain.llm.rate_limiter import rate_limiter
 from src.domain.llm.utils import TIMEOUT
 import settings
 
 
 @backoff.on_exception(
-    backoff.expo, (openai.RateLimitError, openai.APITimeoutError), max_tries=3
+    backoff.expo,
+    (openai.RateLimitError, openai.APITimeoutError),
+    max_tries=3,
+    on_backoff=throttling.on_backoff,
 )
 async def execute(chat: Chat) -> Optional[ChatCompletion]:
-    client = AsyncOpenAI(
-        api_key=settings.OPEN_AI_API_KEY,
-        timeout=TIMEOUT,
-    )
-    chat_completion: ChatCompletion = await client.chat.completions.create(
-        messages=chat.messages,
-        model=chat.config.model,
-        frequency_penalty=chat.config.frequency_penalty,
-        logit_bias=chat.config.logit_bias,
-        max_tokens=chat.config.max_tokens,
-        presence_penalty=chat.config.presence_penalty,
-        response_format=chat.config.response_format,
-        seed=chat.config.seed,
-        # TODO gpt-4-turbo currently broken, keep the default for now
-        # stop=chat.config.stop,
-        temperature=chat.config.temperature,
-        top_p=chat.config.top_p,
-        tools=chat.config.tools,
-        tool_choice=chat.config.tool_choice,
-        user=chat.config.user,
+    reservation = await rate_limiter.reserve(
+        "openai", chat.config.model, chat.messages, chat.config.max_tokens
     )
+    async with reservation:
+        # built after the rate limit wait, its timeout is what is left of the deadline
+        client = AsyncOpenAI(
+            api_key=settings.OPEN_AI_API_KEY,
+            timeout=deadline.get_http_timeout(TIMEOUT),
+        )
+        chat_completion: ChatCompletion = await client.chat.completions.create(
+            messages=chat.messages,
+            model=chat.config.model,
+            frequency_penalty=chat.config.frequency_penalty,
+            logit_bias=chat.config.logit_bias,
+            max_tokens=chat.config.max_tokens,
+            presence_penalty=chat.config.presence_penalty,
+            response_format=chat.config.response_format,
+            seed=chat.config.seed,
+            # TODO gpt-4-turbo currently broken, keep the default for now
+            # stop=chat.config.stop,
+            temperature=chat.config.temperature,
+            top_p=chat.config.top_p,
+            tools=chat.config.tools,
+            tool_choice=chat.config.tool_choice,
+            user=chat.config.user,
+        )
+        reservation.used_tokens = get_used_tokens(chat_completion)
     assert (
         chat_completion.choices[0].message.content
         or chat_completion.choices[0].message.tool_calls
@@ -0,0 +1,199 @@
+import asyncio
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import settings
+from src.domain.tracing import LatencyHistogram
+
+# rough number of characters per token for English text
+CHARS_PER_TOKEN = 4
+# tokens charged for an image in a message
+IMAGE_TOKENS = 765
+# expected completion size when the request does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 1000
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        # a request larger than the whole bucket only waits for a full bucket
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing * 60 / self.capacity)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.capacity / 60
+        )
+        self.updated = now
+
+
+class ModelLimits:
+    """Requests and tokens per minute allowed for one provider model."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int) -> None:
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        # waiters are served in order, a large request is not starved by small ones
+        self.lock = asyncio.Lock()
+
+    def wait_time(self, tokens: int) -> float:
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def take(self, tokens: int) -> None:
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(tokens)
+
+
+class Reservation:
+    def __init__(
+        self,
+        limits: Optional[ModelLimits],
+        estimated_tokens: int,
+        latency: Optional[LatencyHistogram] = None,
+    ) -> None:
+        self.limits = limits
+        self.estimated_tokens = estimated_tokens
+        self.latency = latency
+        # set from the response usage once the call succeeded
+        self.used_tokens: Optional[int] = None
+        self.started = 0.0
+
+    async def __aenter__(self) -> "Reservation":
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self.latency:
+            self.latency.observe(time.monotonic() - self.started)
+        if not self.limits or not self.limits.tokens:
+            return
+        if exc_type:
+            # failed calls are not charged, the estimate is handed back
+            self.limits.tokens.take(-self.estimated_tokens)
+        elif self.used_tokens is not None:
+            self.limits.tokens.take(self.used_tokens - self.estimated_tokens)
+
+
+class RateLimiter:
+    """
+    Holds LLM calls locally until the request and token per minute budgets of
+    the provider model allow them, configured with LLM_RATE_LIMITS. Token use
+    is estimated before the call and corrected with the reported usage.
+    """
+
+    def __init__(self) -> None:
+        self.config = parse_rate_limits(settings.LLM_RATE_LIMITS)
+        self.limits: Dict[Tuple[str, str], Optional[ModelLimits]] = {}
+        # duration of the calls of every provider model, waits excluded
+        self.latencies: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.metrics = {
+            "llm_requests_held": 0,
+            "llm_rate_limit_wait_s": 0.0,
+        }
+
+    async def reserve(
+        self,
+        provider: str,
+        model: str,
+        messages: List[Dict[str, Any]],
+        max_tokens: Optional[int] = None,
+    ) -> Reservation:
+        """
+        Waits for the budget of one call, use the reservation as an async
+        context around the call and set used_tokens from its usage.
+        """
+        tokens = estimate_tokens(messages, max_tokens)
+        limits = self._get_limits(provider, model)
+        latency = self.latencies.setdefault((provider, model), LatencyHistogram())
+        if not limits:
+            return Reservation(None, tokens, latency)
+        async with limits.lock:
+            wait = limits.wait_time(tokens)
+            if wait > 0:
+                self.metrics["llm_requests_held"] += 1
+            while wait > 0:
+                self.metrics["llm_rate_limit_wait_s"] += wait
+                await asyncio.sleep(wait)
+                wait = limits.wait_time(tokens)
+            limits.take(tokens)
+        return Reservation(limits, tokens, latency)
+
+    def _get_limits(self, provider: str, model: str) -> Optional[ModelLimits]:
+        key = (provider, model)
+        if key not in self.limits:
+            config = self.config.get(f"{provider}/{model}") or self.config.get(provider)
+            self.limits[key] = ModelLimits(*config) if config else None
+        return self.limits[key]
+
+    def get_metrics(self):
+        return {
+            "llm_requests_held": self.metrics["llm_requests_held"],
+            "llm_rate_limit_wait_s": round(self.metrics["llm_rate_limit_wait_s"], 3),
+        }
+
+    def get_histograms(self):
+        return [
+            ("llm_request_duration_seconds", {"provider": p, "model": m}, latency)
+            for (p, m), latency in self.latencies.items()
+        ]
+
+
+def parse_rate_limits(value: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Parses "provider[/model]=requests:tokens" entries separated by commas, a 0
+    leaves that budget unlimited.
+    """
+    limits = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        key, budget = entry.split("=")
+        requests_per_minute, tokens_per_minute = budget.split(":")
+        limits[key.strip()] = (int(requests_per_minute), int(tokens_per_minute))
+    return limits
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> int:
+    prompt_tokens = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            prompt_tokens += len(content) // CHARS_PER_TOKEN
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                prompt_tokens += IMAGE_TOKENS
+            else:
+                prompt_tokens += len(part.get("text") or "") // CHARS_PER_TOKEN
+    return prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def get_used_tokens(completion: Any) -> Optional[int]:
+    usage = getattr(completion, "usage", None)
+    return usage.total_tokens if usage else None
+
+
+rate_limiter = RateLimiter()
@@ -5,6 +5,7 @@ import settings
 from typing import Optional
 from urllib.parse import urlparse, unquote
 
+from src.domain import deadline
 from src.domain.storage import upload_to_gcp_use_case
 from src.domain.storage.entities import UploadToGCPRequest
 
@@ -17,7 +18,7 @@ async def execute(download_url: str) -> Optional[str]:
     original_image_name = unquote(parsed_url.path.split("/")[-1])
     new_image_name = await _generate_filename(original_image_name)
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(timeout=deadline.get_session_timeout()) as session:
         async with session.get(download_url) as response:
             if response.status == 200:
                 image_data = await response.read()
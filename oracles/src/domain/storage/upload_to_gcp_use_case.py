@@ -1,9 +1,11 @@
 import settings
 from typing import Optional
-from google.cloud import storage
-from google.oauth2 import service_account
+from typing import TYPE_CHECKING
 from src.domain.storage.entities import UploadToGCPRequest
 
+if TYPE_CHECKING:
+    from google.cloud import storage
+
 KEY_PATH = "/app/sidekik.json"
 
 
@@ -19,7 +21,11 @@ async def execute(request: UploadToGCPRequest) -> Optional[str]:
     return f"https://storage.googleapis.com/{settings.GCS_BUCKET_NAME}/{request.destination}"
 
 
-def _get_storage_client() -> storage.Client:
+def _get_storage_client() -> "storage.Client":
+    # the google cloud client is slow to import, only load it once needed
+    from google.cloud import storage
+    from google.oauth2 import service_account
+
     credentials = service_account.Credentials.from_service_account_file(KEY_PATH)
     return storage.Client(
         project="sidekik-ai",
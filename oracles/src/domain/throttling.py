@@ -0,0 +1,39 @@
+from contextvars import ContextVar
+from typing import Any
+from typing import Dict
+from typing import Optional
+
+
+class RateLimitWatch:
+    """Counts the rate limit responses hit while running one piece of work."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+
+
+_current_watch: ContextVar[Optional[RateLimitWatch]] = ContextVar(
+    "rate_limit_watch", default=None
+)
+
+
+def watch_rate_limits() -> RateLimitWatch:
+    """
+    Starts counting the rate limits hit by the current task, provider errors
+    are usually retried and turned into error messages before reaching the
+    caller.
+    """
+    watch = RateLimitWatch()
+    _current_watch.set(watch)
+    return watch
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return status == 429
+
+
+def on_backoff(details: Dict[str, Any]) -> None:
+    """backoff handler reporting rate limited retries to the current watch."""
+    watch = _current_watch.get()
+    if watch and is_rate_limit_error(details.get("exception")):
+        watch.hits += 1
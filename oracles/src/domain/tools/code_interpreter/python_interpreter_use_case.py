@@ -1,7 +1,7 @@
 import re
 import asyncio
 import settings
-from e2b_code_interpreter import CodeInterpreter
+from src.domain import deadline
 from src.domain.tools.code_interpreter.entities import PythonInterpreterResult
 
 
@@ -9,6 +9,9 @@ async def _interpret_code(code: str) -> PythonInterpreterResult:
     try:
 
         def interpret_sync():
+            # e2b is slow to import, only load it once code is interpreted
+            from e2b_code_interpreter import CodeInterpreter
+
             with CodeInterpreter(api_key=settings.E2B_API_KEY) as code_interpreter:
                 exec = code_interpreter.notebook.exec_cell(code)
                 stdout = "".join(exec.logs.stdout)
@@ -21,7 +24,10 @@ async def _interpret_code(code: str) -> PythonInterpreterResult:
                     exit_code=len(stderr),
                 )
 
-        return await asyncio.to_thread(interpret_sync)
+        # the sandbox keeps running in its thread, the job gives up its slot
+        return await asyncio.wait_for(
+            asyncio.to_thread(interpret_sync), deadline.get_timeout(None)
+        )
     except Exception as e:
         return PythonInterpreterResult(output="", error=str(e), exit_code=1)
 
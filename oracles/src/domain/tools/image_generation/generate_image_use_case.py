@@ -4,18 +4,23 @@ from typing import Optional
 import httpx
 import openai
 from openai import AsyncOpenAI
+from src.domain import deadline
+from src.domain import throttling
 from src.domain.tools.image_generation.entities import ImageGenerationResult
 
 TIMEOUT = httpx.Timeout(timeout=600.0, connect=10.0)
 
 
 @backoff.on_exception(
-    backoff.expo, (openai.RateLimitError, openai.APITimeoutError), max_tries=3
+    backoff.expo,
+    (openai.RateLimitError, openai.APITimeoutError),
+    max_tries=3,
+    on_backoff=throttling.on_backoff,
 )
 async def _generate_image(prompt: str) -> Optional[ImageGenerationResult]:
     client = AsyncOpenAI(
         api_key=settings.OPEN_AI_API_KEY,
-        timeout=TIMEOUT,
+        timeout=deadline.get_http_timeout(TIMEOUT),
     )
 
     return await client.images.generate(
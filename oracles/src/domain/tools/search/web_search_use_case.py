@@ -1,12 +1,15 @@
 import aiohttp
 import json
 import settings
+from src.domain import deadline
 from src.domain.tools.search.entities import WebSearchResult
 
 
 async def execute(query: str) -> WebSearchResult:
     try:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(
+            timeout=deadline.get_session_timeout()
+        ) as session:
             async with session.post(
                 "https://google.serper.dev/search",
                 headers={
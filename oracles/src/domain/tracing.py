@@ -0,0 +1,174 @@
+import asyncio
+import bisect
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import settings
+
+# upper bounds of the latency histogram buckets in seconds, the last one is open
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    600,
+    float("inf"),
+)
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Trace:
+    """Stages of one request as (stage, unix start time, duration) spans."""
+
+    def __init__(self) -> None:
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def add(self, stage: str, duration: float, start: Optional[float] = None) -> None:
+        if start is None:
+            start = time.time() - duration
+        self.spans.append((stage, start, duration))
+
+    def extend(self, other: "Trace") -> None:
+        self.spans.extend(other.spans)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def set_trace(trace: Optional[Trace]) -> None:
+    """Sets the trace the stages run by the current task are recorded on."""
+    _current_trace.set(trace)
+
+
+def get_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Times the block as a stage of the current trace, if there is one."""
+    trace = _current_trace.get()
+    start = time.time()
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(stage, time.monotonic() - started, start)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimates the quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                if upper == float("inf"):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-2]
+
+
+class Tracer:
+    """
+    Collects the traces of finished requests into per stage latency
+    histograms. With TRACE_PATH set every trace is also kept as a JSON line
+    until flush appends it to the file.
+    """
+
+    def __init__(self, path: Optional[str] = settings.TRACE_PATH) -> None:
+        self.path = path
+        self.histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self.lines: List[str] = []
+
+    def finish(self, name: str, request_id: int, trace: Trace, success: bool) -> None:
+        for stage, _, duration in trace.spans:
+            if (name, stage) not in self.histograms:
+                self.histograms[(name, stage)] = LatencyHistogram()
+            self.histograms[(name, stage)].observe(duration)
+        if self.path:
+            self.lines.append(_format_trace(name, request_id, trace, success))
+
+    async def flush(self) -> None:
+        """Appends the kept traces to TRACE_PATH from a thread."""
+        if not self.lines:
+            return
+        lines, self.lines = self.lines, []
+        try:
+            await asyncio.to_thread(self._append, lines)
+        except OSError as e:
+            print(f"Error writing {len(lines)} traces: {e}", flush=True)
+
+    def _append(self, lines: List[str]) -> None:
+        with open(self.path, "a") as f:
+            f.writelines(lines)
+
+    def get_metrics(self):
+        metrics = {}
+        for (name, stage), histogram in self.histograms.items():
+            for q in LATENCY_QUANTILES:
+                metrics[f"{name}_{stage}_latency_p{int(q * 100)}_s"] = round(
+                    histogram.quantile(q), 3
+                )
+        return metrics
+
+    def get_histograms(self):
+        return [
+            ("stage_duration_seconds", {"job": name, "stage": stage}, histogram)
+            for (name, stage), histogram in self.histograms.items()
+        ]
+
+
+def _format_trace(name: str, request_id: int, trace: Trace, success: bool) -> str:
+    record = {
+        "type": name,
+        "id": request_id,
+        "success": success,
+        "spans": [
+            {
+                "stage": stage,
+                "start": round(start, 3),
+                "duration": round(duration, 4),
+            }
+            for stage, start, duration in trace.spans
+        ],
+    }
+    return json.dumps(record) + "\n"
+
+
+tracer = Tracer()
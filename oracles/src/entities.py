@@ -1,13 +1,17 @@
+import time
 from enum import Enum
 from typing import Dict
 from typing import List
 from typing import Literal
 from typing import Optional
 from dataclasses import dataclass
+from dataclasses import field
 from typing import Union
 from openai.types.chat import ChatCompletion
 from openai.types.chat import ChatCompletionToolParam
 
+from src.domain.tracing import Trace
+
 ALLOWED_FUNCTION_NAMES = ["image_generation", "web_search", "code_interpreter"]
 
 OpenAiModelType = Literal[
@@ -31,6 +35,7 @@ AnthropicModelType = Literal[
     "claude-instant-1.2",
 ]
 
+
 class PromptType(str, Enum):
     DEFAULT = "default"
     OPENAI = "OpenAI"
@@ -98,10 +103,15 @@ class Chat:
     is_processed: bool
     prompt_type: PromptTypeLiteral
     messages: List[dict]
+    callback_address: Optional[str] = None
     config: Optional[LlmConfig] = None
     response: Optional[Union[str, ChatCompletion]] = None
     error_message: Optional[str] = None
     transaction_receipt: dict = None
+    # unix time of the creation block, or when the oracle first read it
+    created_at: float = field(default_factory=time.time)
+    # stages of the current attempt, recorded while the request is processed
+    trace: Trace = field(default_factory=Trace, compare=False, repr=False)
 
 
 @dataclass
@@ -111,9 +121,12 @@ class FunctionCall:
     is_processed: bool
     function_type: str
     function_input: str
+    callback_address: Optional[str] = None
     response: Optional[str] = None
     error_message: Optional[str] = None
     transaction_receipt: dict = None
+    created_at: float = field(default_factory=time.time)
+    trace: Trace = field(default_factory=Trace, compare=False, repr=False)
 
 
 @dataclass
@@ -123,6 +136,8 @@ class KnowledgeBaseIndexingRequest:
     is_processed: bool
     index_cid: Optional[str] = None
     transaction_receipt: dict = None
+    created_at: float = field(default_factory=time.time)
+    trace: Trace = field(default_factory=Trace, compare=False, repr=False)
 
 
 @dataclass
@@ -134,4 +149,7 @@ class KnowledgeBaseQuery:
     index_cid: str
     query: str
     num_documents: int
+    callback_address: Optional[str] = None
     transaction_receipt: dict = None
+    created_at: float = field(default_factory=time.time)
+    trace: Trace = field(default_factory=Trace, compare=False, repr=False)
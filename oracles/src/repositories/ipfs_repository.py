@@ -2,6 +2,7 @@ import aiohttp
 import settings
 from typing import Union
 
+from src.domain import deadline
 from src.domain.storage.entities import IpfsFile
 
 PINATA_LINK_BASE = "https://galadriel.mypinata.cloud/ipfs/{}"
@@ -9,7 +10,9 @@ PINATA_LINK_BASE = "https://galadriel.mypinata.cloud/ipfs/{}"
 
 class IpfsRepository:
     async def read_file(self, cid: str, max_bytes: int = 0) -> IpfsFile:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(
+            timeout=deadline.get_session_timeout()
+        ) as session:
             headers = {"x-pinata-gateway-token": settings.PINATA_GATEWAY_TOKEN}
             async with session.get(
                 PINATA_LINK_BASE.format(cid), headers=headers
@@ -37,7 +40,9 @@ class IpfsRepository:
         )
         form_data = aiohttp.FormData()
         form_data.add_field("file", data, filename="file", content_type=mime_type)
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(
+            timeout=deadline.get_session_timeout()
+        ) as session:
             async with session.post(
                 "https://api.pinata.cloud/pinning/pinFileToIPFS",
                 headers={
@@ -1,15 +1,14 @@
 import time
-import faiss
 import backoff
 import asyncio
 import settings
-import numpy as np
 from io import BytesIO
 import httpx
 import openai
 from openai import AsyncOpenAI
 from collections import OrderedDict
 from typing import List, Any, Tuple, Dict
+from src.domain import deadline
 from src.domain.knowledge_base.entities import Document
 
 BATCH_SIZE = 2048
@@ -39,6 +38,10 @@ class KnowledgeBaseRepository:
             self.document_stores[name] = documents
 
     async def create(self, name: str, documents: List[Document]):
+        # faiss and numpy are only imported once knowledge bases are used
+        import faiss
+        import numpy as np
+
         embeddings = []
         for i in range(0, len(documents), BATCH_SIZE):
             batch = [
@@ -54,6 +57,9 @@ class KnowledgeBaseRepository:
         await self._add_knowledge_base(name, index, documents)
 
     async def serialize(self, name: str) -> bytes:
+        import faiss
+        import numpy as np
+
         index, time = self.indexes[name]
         np_index = await asyncio.get_running_loop().run_in_executor(
             None, faiss.serialize_index, index
@@ -63,6 +69,9 @@ class KnowledgeBaseRepository:
         return bytes_container.getvalue()
 
     async def deserialize(self, name: str, documents: List[Document], data: bytes):
+        import faiss
+        import numpy as np
+
         bytes_container = BytesIO(data)
         np_index = np.load(bytes_container)
         index = await asyncio.get_running_loop().run_in_executor(
@@ -72,6 +81,8 @@ class KnowledgeBaseRepository:
         await self._add_knowledge_base(name, index, documents)
 
     async def query(self, name: str, query: str, k: int = 1) -> List[Document]:
+        import numpy as np
+
         async with self.lock:
             self.indexes.move_to_end(name)
             index, time = self.indexes[name]
@@ -96,7 +107,9 @@ class KnowledgeBaseRepository:
     )
     async def _create_embedding(self, texts: List[str]) -> List[float]:
         response = await self.openai_client.embeddings.create(
-            input=texts, model="text-embedding-3-small"
+            input=texts,
+            model="text-embedding-3-small",
+            timeout=deadline.get_http_timeout(TIMEOUT),
         )
         embeddings = [data.embedding for data in response.data]
         return embeddings
@@ -1,63 +1,349 @@
-import json
+import asyncio
+import time
+from collections import deque
+from typing import Any
+from typing import AsyncIterator
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
 
-from web3 import AsyncWeb3
+from web3.contract.async_contract import AsyncContractFunction
+from web3.types import TxParams
 from web3.types import TxReceipt
 
 import settings
+from src.domain import tracing
+from src.repositories.web3.chain_client import ChainClient
+from src.repositories.web3.response_batcher import ResponseBatcher
+from src.repositories.web3.signer_pool import Signer
 
 
 class Web3BaseRepository:
-    def __init__(self) -> None:
-        self.web3_client = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(settings.WEB3_RPC_URL))
-        self.account = self.web3_client.eth.account.from_key(settings.PRIVATE_KEY)
-        with open(settings.ORACLE_ABI_PATH, "r", encoding="utf-8") as f:
-            oracle_abi = json.loads(f.read())["abi"]
-
-        self.oracle_contract = self.web3_client.eth.contract(
-            address=settings.ORACLE_ADDRESS, abi=oracle_abi
-        )
+    def __init__(self, chain_client: ChainClient) -> None:
+        self.chain_client = chain_client
+        self.web3_client = chain_client.web3_client
+        self.signers = chain_client.signers
+        self.receipt_tracker = chain_client.receipt_tracker
+        self.fee_oracle = chain_client.fee_oracle
+        self.checkpoint = chain_client.checkpoint
+        self.oracle_contract = chain_client.oracle_contract
+        self.multicall = chain_client.multicall
+        self.read_cache = chain_client.read_cache
+        self.event_discovery = chain_client.event_discovery
+        # number of entities hydrated together when indexing new requests
+        self.read_batch_size = settings.MULTICALL_BATCH_SIZE if self.multicall else 1
+        self.response_batcher: Optional[ResponseBatcher] = None
         self.metrics = {
             "transactions_sent": 0,
             "errors": 0,
         }
 
+    async def _get_requests_count(
+        self, event_name: str, count_function: AsyncContractFunction
+    ) -> int:
+        if self.event_discovery:
+            try:
+                return await self.event_discovery.get_count(
+                    event_name, count_function.call
+                )
+            except Exception as e:
+                print(
+                    f"Error discovering {event_name} events, falling back to {count_function.fn_name}: {e}",
+                    flush=True,
+                )
+        return await count_function.call()
+
+    async def _set_created_at(self, event_name: str, entity: Any) -> None:
+        """Dates the entity by its creation block when the event was discovered."""
+        if not self.event_discovery:
+            return
+        try:
+            created_at = await self.event_discovery.get_created_at(
+                event_name, entity.id
+            )
+        except Exception as e:
+            print(f"Error getting {event_name} {entity.id} block: {e}", flush=True)
+            return
+        if created_at:
+            entity.created_at = float(created_at)
+            # from the creation block until the request was read
+            entity.trace.add("discovery", max(0.0, time.time() - created_at))
+
+    async def _read_in_order(
+        self,
+        start: int,
+        end: int,
+        read_func: Callable[[List[int]], Awaitable[List[Optional[Any]]]],
+    ) -> AsyncIterator[Tuple[int, Optional[Any]]]:
+        """
+        Reads the entities of this worker in [start, end) in batches of
+        read_batch_size, keeping up to INDEXING_CONCURRENCY batches in flight.
+        Entities are yielded strictly in index order, a failing batch stops the
+        iteration before any later entity is yielded.
+        """
+        own_ids = [i for i in range(start, end) if is_own_request(i)]
+        batches = (
+            own_ids[n : n + self.read_batch_size]
+            for n in range(0, len(own_ids), self.read_batch_size)
+        )
+        in_flight = deque()
+        try:
+            for ids in batches:
+                in_flight.append((ids, asyncio.create_task(_hydrate(read_func, ids))))
+                if len(in_flight) < settings.INDEXING_CONCURRENCY:
+                    continue
+                ids, task = in_flight.popleft()
+                for i, entity in zip(ids, await task):
+                    yield i, entity
+            while in_flight:
+                ids, task = in_flight.popleft()
+                for i, entity in zip(ids, await task):
+                    yield i, entity
+        finally:
+            for _, task in in_flight:
+                task.cancel()
+            await asyncio.gather(
+                *[task for _, task in in_flight], return_exceptions=True
+            )
+
+    async def _aggregate(self, calls: List[AsyncContractFunction]) -> List[Any]:
+        return await self.read_cache.aggregate(calls, self.multicall.aggregate)
+
+    async def _find_resume_point(
+        self,
+        name: str,
+        count: int,
+        is_processed_func: Callable[[int], Awaitable[bool]],
+        read_func: Callable[[List[int]], Awaitable[List[Optional[Any]]]],
+    ) -> Tuple[int, List[Any]]:
+        """
+        Returns the index to continue indexing from on cold start, together with
+        the entities that were left unanswered before it. Without a usable
+        checkpoint everything before the first unprocessed entity is treated as
+        processed.
+        """
+        state = self.checkpoint.get(name) if self.checkpoint else None
+        if not state or state["last_count"] > count:
+            return await self._find_first_unprocessed(count, is_processed_func), []
+        print(
+            f"Resuming {name} from checkpoint at {state['last_count']}, re-reading {len(state['in_flight'])} unanswered",
+            flush=True,
+        )
+        ids = state["in_flight"]
+        entities = []
+        for n in range(0, len(ids), self.read_batch_size):
+            entities.extend(await read_func(ids[n : n + self.read_batch_size]))
+        return state["last_count"], [entity for entity in entities if entity]
+
+    async def _save_checkpoint(
+        self, name: str, last_count: int, in_flight: List[Any]
+    ) -> None:
+        if not self.checkpoint:
+            return
+        try:
+            await self.checkpoint.save(
+                name, last_count, [entity.id for entity in in_flight]
+            )
+        except Exception as e:
+            print(f"Error saving {name} checkpoint: {e}", flush=True)
+
     async def _find_first_unprocessed(self, count, is_processed_func, max_retries=3):
+        """
+        Finds the first unprocessed index, every index before it is assumed to be
+        processed. Each round probes COLD_START_SEARCH_FANOUT evenly spaced indices
+        concurrently, a fanout of 1 is a plain binary search. Indices that stay
+        unreadable are treated as unprocessed so the search never skips past them.
+        """
+        fanout = max(1, settings.COLD_START_SEARCH_FANOUT)
         low = 0
         high = count
         while low < high:
-            index = (low + high) // 2
-            retries = 0
-            while retries < max_retries:
-                try:
-                    is_prompt_processed = await is_processed_func(index)
-                    if is_prompt_processed:
-                        low = index + 1
-                    else:
-                        high = index
+            size = high - low
+            probes = sorted(
+                {low + size * (n + 1) // (fanout + 1) for n in range(fanout)}
+            )
+            states = await self._probe(probes, is_processed_func, max_retries)
+            for index in probes:
+                if states[index]:
+                    low = index + 1
+                else:
+                    high = index
                     break
-                except Exception as e:
-                    print(f"Error getting job state at index {index}: {e}. Retrying ({retries + 1}/{max_retries})...")
-                    retries += 1
-                    if retries == max_retries:
-                        print(f"Skipping unreadable job at index {index} after {max_retries} retries.")
-                        low = index + 1
-                        break
         return low
 
-    async def _sign_and_send_tx(self, tx) -> TxReceipt:
-        try:
-            signed_tx = self.web3_client.eth.account.sign_transaction(
-                tx, private_key=self.account.key
+    async def _probe(
+        self,
+        indices: List[int],
+        is_processed_func: Callable[[int], Awaitable[bool]],
+        max_retries: int,
+    ) -> Dict[int, bool]:
+        states = {}
+        pending = indices
+        for retries in range(max_retries):
+            results = await asyncio.gather(
+                *[is_processed_func(index) for index in pending],
+                return_exceptions=True,
             )
-            tx_hash = await self.web3_client.eth.send_raw_transaction(
-                signed_tx.rawTransaction
+            failed = []
+            for index, result in zip(pending, results):
+                if isinstance(result, Exception):
+                    print(
+                        f"Error getting job state at index {index}: {result}. Retrying ({retries + 1}/{max_retries})..."
+                    )
+                    failed.append(index)
+                else:
+                    states[index] = bool(result)
+            pending = failed
+            if not pending:
+                break
+        for index in pending:
+            print(
+                f"Treating unreadable job at index {index} as unprocessed after {max_retries} retries."
             )
-            return await self.web3_client.eth.wait_for_transaction_receipt(tx_hash)
+            states[index] = False
+        return states
+
+    async def _build_tx(self, contract_function: AsyncContractFunction) -> TxParams:
+        with tracing.span("tx_build"):
+            signer = self.signers.acquire()
+            nonce = await signer.nonce_manager.get_nonce()
+            tx_data = {
+                "from": signer.address,
+                "nonce": nonce,
+                # TODO: pick gas amount in a better way
+                # "gas": 1000000,
+            }
+            if chain_id := settings.CHAIN_ID:
+                tx_data["chainId"] = int(chain_id)
+            try:
+                tx_data.update(await self.fee_oracle.get_fees())
+                return await contract_function.build_transaction(tx_data)
+            except Exception as e:
+                # nothing was sent with this nonce, hand it to the next transaction
+                signer.nonce_manager.release(nonce)
+                raise e
+
+    async def _sign_and_send_tx(self, tx) -> TxReceipt:
+        return await (await self._send_tx(tx))
+
+    async def _send_tx(self, tx) -> Awaitable[TxReceipt]:
+        """
+        Signs and broadcasts the transaction without waiting for it to be mined,
+        the returned awaitable resolves with the receipt.
+        """
+        signer = self.signers.get(tx["from"])
+        try:
+            with tracing.span("tx_sign"):
+                signed_tx = self.web3_client.eth.account.sign_transaction(
+                    tx, private_key=signer.account.key
+                )
+            try:
+                with tracing.span("tx_broadcast"):
+                    tx_hash = await self.web3_client.eth.send_raw_transaction(
+                        signed_tx.rawTransaction
+                    )
+            except Exception as e:
+                signer.nonce_manager.release(tx["nonce"])
+                await signer.nonce_manager.resync()
+                raise e
+        except Exception as e:
+            self.metrics["errors"] += 1
+            self.metrics["transactions_sent"] += 1
+            raise e
+        signer.transactions_sent += 1
+        return asyncio.ensure_future(
+            self._wait_for_receipt(signer, tx, self.receipt_tracker.track(tx_hash))
+        )
+
+    async def _wait_for_receipt(
+        self, signer: Signer, tx, receipt: Awaitable[TxReceipt]
+    ) -> TxReceipt:
+        try:
+            with tracing.span("tx_receipt"):
+                tx_receipt = await receipt
+            signer.nonce_manager.confirm(tx["nonce"])
+            return tx_receipt
         except Exception as e:
             self.metrics["errors"] += 1
+            # the transaction may never be mined, free its nonce if so
+            await signer.nonce_manager.resync(dropped=tx["nonce"])
             raise e
         finally:
             self.metrics["transactions_sent"] += 1
 
+    async def _submit_tx(
+        self, tx, on_receipt: Callable[[TxReceipt], bool]
+    ) -> Awaitable[bool]:
+        """
+        Broadcasts the transaction, the returned awaitable resolves with
+        on_receipt applied to the receipt once it is mined.
+        """
+        receipt = await self._send_tx(tx)
+
+        async def _on_mined() -> bool:
+            return on_receipt(await receipt)
+
+        return asyncio.ensure_future(_on_mined())
+
+    def _create_response_batcher(self, name: str) -> Optional[ResponseBatcher]:
+        if settings.RESPONSE_BATCH_SIZE <= 1:
+            return None
+        return ResponseBatcher(
+            name, self.oracle_contract, self._build_tx, self._send_tx
+        )
+
+    async def _submit_call(
+        self,
+        get_function: Callable[[], AsyncContractFunction],
+        on_receipt: Callable[[TxReceipt], bool],
+        on_error: Callable[[Exception], Awaitable[None]],
+    ) -> Awaitable[bool]:
+        """
+        Sends the response call on its own or in the next batch when response
+        batching is enabled. A call that cannot be built or reverts in its batch
+        is handed to on_error and resolves with False.
+        """
+        try:
+            function = get_function()
+            if self.response_batcher:
+                return self.response_batcher.submit(function, on_receipt, on_error)
+            tx = await self._build_tx(function)
+        except Exception as e:
+            await on_error(e)
+            return self._completed(False)
+        return await self._submit_tx(tx, on_receipt)
+
+    @staticmethod
+    def _completed(value: Any) -> Awaitable[Any]:
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        return future
+
     def get_metrics(self):
         return self.metrics
+
+
+async def _hydrate(
+    read_func: Callable[[List[int]], Awaitable[List[Optional[Any]]]], ids: List[int]
+) -> List[Optional[Any]]:
+    """Reads the batch, its read time is the hydration stage of every entity."""
+    started = time.monotonic()
+    entities = await read_func(ids)
+    duration = time.monotonic() - started
+    for entity in entities:
+        if entity:
+            entity.trace.add("hydration", duration)
+    return entities
+
+
+def is_own_request(request_id: int) -> bool:
+    """Workers of a sharded oracle answer the requests whose id maps to them."""
+    return request_id % settings.ORACLE_WORKERS == (settings.ORACLE_WORKER_INDEX or 0)
+
+
+def count_own_requests(count: int) -> int:
+    """Number of the ids in [0, count) this worker answers."""
+    return len(range(settings.ORACLE_WORKER_INDEX or 0, count, settings.ORACLE_WORKERS))
@@ -0,0 +1,145 @@
+import json
+from types import SimpleNamespace
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from aiohttp import ClientSession
+from aiohttp import TCPConnector
+from aiohttp import TraceConfig
+from web3 import AsyncWeb3
+from web3.contract import AsyncContract
+
+import settings
+from src.repositories.web3.checkpoint import Checkpoint
+from src.repositories.web3.event_discovery import OracleEventDiscovery
+from src.repositories.web3.fee_oracle import FeeOracle
+from src.repositories.web3.multicall import Multicall
+from src.repositories.web3.nonce_manager import NonceManager
+from src.repositories.web3.read_cache import ReadCache
+from src.repositories.web3.receipt_tracker import ReceiptTracker
+from src.repositories.web3.rpc_pool import PooledHTTPProvider
+from src.repositories.web3.signer_pool import SignerPool
+
+
+class ChainClient:
+    """
+    Everything the web3 repositories share: one AsyncWeb3 client over the RPC
+    endpoint pool on a single keep-alive connection pool, contract objects built
+    once per ABI and address, and the chain wide helpers (nonces, receipts, fees,
+    event discovery and the indexing checkpoint).
+    """
+
+    def __init__(self, rpc_urls: List[str] = settings.WEB3_RPC_URLS) -> None:
+        self.provider = PooledHTTPProvider(rpc_urls)
+        self.web3_client = AsyncWeb3(self.provider)
+        self.session: Optional[ClientSession] = None
+        self.abis: Dict[str, List] = {}
+        self.contracts: Dict[Tuple[str, str], AsyncContract] = {}
+        self.nonce_managers: Dict[str, NonceManager] = {}
+        self.signers = SignerPool(
+            self.web3_client, settings.PRIVATE_KEYS, self.get_nonce_manager
+        )
+        self.metrics = {
+            "rpc_connections_created": 0,
+            "rpc_connections_reused": 0,
+        }
+
+        self.oracle_contract = self.get_contract(
+            settings.ORACLE_ABI_PATH, settings.ORACLE_ADDRESS
+        )
+        self.multicall = (
+            Multicall(self.web3_client, settings.MULTICALL_ADDRESS)
+            if settings.MULTICALL_ADDRESS
+            else None
+        )
+        self.read_cache = ReadCache(settings.READ_CACHE_SIZE)
+        # one event cursor, every request type is discovered with a single call
+        self.event_discovery = (
+            OracleEventDiscovery(self.web3_client, self.oracle_contract)
+            if settings.DISCOVERY_MODE == "logs"
+            else None
+        )
+        # a single tracker checks the receipts of every repository once per block
+        self.receipt_tracker = ReceiptTracker(self.web3_client)
+        self.fee_oracle = FeeOracle(self.web3_client)
+        self.checkpoint = (
+            Checkpoint(*get_checkpoint_location()) if settings.CHECKPOINT_PATH else None
+        )
+
+    async def connect(self) -> None:
+        """
+        Opens the connection pool used for every RPC request, must be awaited
+        from the running event loop before the first request.
+        """
+        if self.session:
+            return
+        trace_config = TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_created)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reused)
+        session = ClientSession(
+            connector=TCPConnector(
+                limit=settings.RPC_POOL_SIZE,
+                keepalive_timeout=settings.RPC_KEEPALIVE_TIMEOUT,
+            ),
+            trace_configs=[trace_config],
+            raise_for_status=True,
+        )
+        self.session = await self.provider.cache_async_session(session)
+        if self.session is not session:
+            # a session was already cached for this endpoint, it is used instead
+            await session.close()
+
+    async def close(self) -> None:
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def get_contract(self, abi_path: str, address: str) -> AsyncContract:
+        key = (abi_path, address)
+        if key not in self.contracts:
+            if abi_path not in self.abis:
+                with open(abi_path, "r", encoding="utf-8") as f:
+                    self.abis[abi_path] = json.loads(f.read())["abi"]
+            self.contracts[key] = self.web3_client.eth.contract(
+                address=address, abi=self.abis[abi_path]
+            )
+        return self.contracts[key]
+
+    def get_nonce_manager(self, address: str) -> NonceManager:
+        if address not in self.nonce_managers:
+            self.nonce_managers[address] = NonceManager(self.web3_client, address)
+        return self.nonce_managers[address]
+
+    async def _on_connection_created(
+        self, session: ClientSession, context: SimpleNamespace, params
+    ) -> None:
+        self.metrics["rpc_connections_created"] += 1
+
+    async def _on_connection_reused(
+        self, session: ClientSession, context: SimpleNamespace, params
+    ) -> None:
+        self.metrics["rpc_connections_reused"] += 1
+
+    def get_metrics(self):
+        return {
+            **self.metrics,
+            **self.provider.get_metrics(),
+            **self.read_cache.get_metrics(),
+        }
+
+
+def get_checkpoint_location() -> Tuple[str, str]:
+    """
+    Returns the checkpoint file and scope. Workers of a sharded oracle keep
+    their own file, a changed number of workers starts from a fresh scope.
+    """
+    scope = f"{settings.CHAIN_ID}:{settings.ORACLE_ADDRESS}"
+    if settings.ORACLE_WORKER_INDEX is None:
+        return settings.CHECKPOINT_PATH, scope
+    shard = f"{settings.ORACLE_WORKER_INDEX}/{settings.ORACLE_WORKERS}"
+    return (
+        f"{settings.CHECKPOINT_PATH}.{settings.ORACLE_WORKER_INDEX}",
+        f"{scope}:{shard}",
+    )
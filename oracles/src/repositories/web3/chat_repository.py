@@ -1,5 +1,6 @@
 import json
 from typing import Any
+from typing import Awaitable
 from typing import Dict
 from typing import List
 from typing import Optional
@@ -9,6 +10,7 @@ from groq.types.chat import ChatCompletion as GroqChatCompletion
 from openai.types.chat import ChatCompletion
 from openai.types.chat import ChatCompletionToolParam
 from pydantic import TypeAdapter
+from web3.types import TxReceipt
 
 import settings
 from src.entities import ALLOWED_FUNCTION_NAMES
@@ -22,13 +24,20 @@ from src.entities import LlmConfig
 from src.entities import AnthropicModelType
 from src.entities import PromptType
 from src.repositories.web3.base import Web3BaseRepository
+from src.repositories.web3.base import count_own_requests
+from src.repositories.web3.chain_client import ChainClient
+from src.repositories.web3.multicall import get_first_error
+from src.repositories.web3.pending_work import PendingWork
 
 
 class Web3ChatRepository(Web3BaseRepository):
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, chain_client: ChainClient) -> None:
+        super().__init__(chain_client)
         self.last_chats_count = 0
-        self.indexed_chats = []
+        self.pending_chats: PendingWork[Chat] = PendingWork(
+            settings.PENDING_HISTORY_SIZE
+        )
+        self.response_batcher = self._create_response_batcher("chats")
         self.metrics.update(
             {
                 "chats_count": 0,
@@ -43,9 +52,14 @@ class Web3ChatRepository(Web3BaseRepository):
 
     async def _get_chat(self, i: int) -> Optional[Chat]:
         config = None
-        callback_id = await self.oracle_contract.functions.promptCallbackIds(i).call()
+        callback_id = await self.read_cache.call(
+            self.oracle_contract.functions.promptCallbackIds(i)
+        )
 
         try:
+            callback_address = await self.read_cache.call(
+                self.oracle_contract.functions.callbackAddresses(i)
+            )
             prompt_type = await self._get_prompt_type(i)
             is_prompt_processed = (
                 await self.oracle_contract.functions.isPromptProcessed(i).call()
@@ -64,19 +78,19 @@ class Web3ChatRepository(Web3BaseRepository):
         messages = []
         try:
             # first try new method of reading history
-            history = await self.oracle_contract.functions.getMessagesAndRoles(
-                i, callback_id
-            ).call()
+            history = await self.read_cache.call(
+                self.oracle_contract.functions.getMessagesAndRoles(i, callback_id)
+            )
             messages = await self._format_history(history)
         except:
             # fallback to old method
             try:
-                contents = await self.oracle_contract.functions.getMessages(
-                    i, callback_id
-                ).call()
-                roles = await self.oracle_contract.functions.getRoles(
-                    i, callback_id
-                ).call()
+                contents = await self.read_cache.call(
+                    self.oracle_contract.functions.getMessages(i, callback_id)
+                )
+                roles = await self.read_cache.call(
+                    self.oracle_contract.functions.getRoles(i, callback_id)
+                )
                 for j in range(len(contents)):
                     messages.append(
                         {
@@ -92,22 +106,148 @@ class Web3ChatRepository(Web3BaseRepository):
             id=i,
             messages=messages,
             callback_id=callback_id,
+            callback_address=callback_address,
             is_processed=is_prompt_processed,
             prompt_type=prompt_type,
             config=config,
         )
 
+    async def _get_chats(self, ids: List[int]) -> List[Optional[Chat]]:
+        if self.multicall:
+            try:
+                return await self._get_chats_aggregated(ids)
+            except Exception as e:
+                print(f"Error reading chats {ids} with multicall: {e}", flush=True)
+        return [await self._get_chat(i) for i in ids]
+
+    async def _get_chats_aggregated(self, ids: List[int]) -> List[Optional[Chat]]:
+        functions = self.oracle_contract.functions
+        results = await self._aggregate(
+            [
+                call
+                for i in ids
+                for call in (
+                    functions.promptCallbackIds(i),
+                    functions.promptType(i),
+                    functions.isPromptProcessed(i),
+                    functions.callbackAddresses(i),
+                )
+            ]
+        )
+        headers = {}
+        callback_addresses = {}
+        for n, i in enumerate(ids):
+            callback_id, prompt_type, is_processed, callback_address = results[
+                4 * n : 4 * n + 4
+            ]
+            error = get_first_error(
+                callback_id, prompt_type, is_processed, callback_address
+            )
+            if error:
+                print(f"Error getting chat {i} configuration: {error}", flush=True)
+                self.metrics["chats_configuration_errors"] += 1
+                continue
+            headers[i] = (callback_id, _parse_prompt_type(prompt_type), is_processed)
+            callback_addresses[i] = callback_address
+
+        calls = []
+        for i, (callback_id, prompt_type, _) in headers.items():
+            if prompt_type == PromptType.OPENAI:
+                calls.append(functions.openAiConfigurations(i))
+            elif prompt_type == PromptType.GROQ:
+                calls.append(functions.groqConfigurations(i))
+            else:
+                calls.append(functions.llmConfigurations(i))
+            calls.append(functions.getMessagesAndRoles(i, callback_id))
+        results = await self._aggregate(calls)
+
+        bodies = {}
+        legacy_history_ids = []
+        for n, (i, (callback_id, prompt_type, _)) in enumerate(headers.items()):
+            config, history = results[2 * n : 2 * n + 2]
+            if isinstance(config, Exception):
+                print(f"Error getting chat {i} configuration: {config}", flush=True)
+                self.metrics["chats_configuration_errors"] += 1
+                continue
+            if prompt_type == PromptType.OPENAI:
+                config = _parse_openai_config(config)
+            elif prompt_type == PromptType.GROQ:
+                config = _parse_groq_config(config)
+            else:
+                config = _parse_llm_config(config)
+            if isinstance(history, Exception):
+                # fallback to old method of reading history
+                legacy_history_ids.append(i)
+                bodies[i] = (config, None)
+            else:
+                bodies[i] = (config, await self._format_history(history))
+
+        if legacy_history_ids:
+            results = await self._aggregate(
+                [
+                    call
+                    for i in legacy_history_ids
+                    for call in (
+                        functions.getMessages(i, headers[i][0]),
+                        functions.getRoles(i, headers[i][0]),
+                    )
+                ]
+            )
+            for n, i in enumerate(legacy_history_ids):
+                contents, roles = results[2 * n : 2 * n + 2]
+                error = get_first_error(contents, roles)
+                if error:
+                    print(f"Error getting chat {i} history: {error}", flush=True)
+                    self.metrics["chats_history_read_errors"] += 1
+                    del bodies[i]
+                    continue
+                messages = [
+                    {"role": role, "content": content}
+                    for role, content in zip(roles, contents)
+                ]
+                bodies[i] = (bodies[i][0], messages)
+
+        chats = []
+        for i in ids:
+            if i not in bodies:
+                chats.append(None)
+                continue
+            callback_id, prompt_type, is_processed = headers[i]
+            config, messages = bodies[i]
+            chats.append(
+                Chat(
+                    id=i,
+                    messages=messages,
+                    callback_id=callback_id,
+                    callback_address=callback_addresses[i],
+                    is_processed=is_processed,
+                    prompt_type=prompt_type,
+                    config=config,
+                )
+            )
+        return chats
+
     async def _index_new_chats(self):
-        chats_count = await self.oracle_contract.functions.promptsCount().call()
+        chats_count = await self._get_requests_count(
+            "PromptAdded", self.oracle_contract.functions.promptsCount()
+        )
         self.metrics["chats_count"] = chats_count
         if not self.last_chats_count and chats_count > 0:
-            self.last_chats_count = await self._find_first_unprocessed(
+            self.last_chats_count, resumed_chats = await self._find_resume_point(
+                "chats",
                 chats_count,
                 lambda index: self.oracle_contract.functions.isPromptProcessed(
                     index
                 ).call(),
+                self._get_chats,
+            )
+            self.pending_chats.extend(resumed_chats)
+            self.metrics["chats_read"] += len(resumed_chats)
+            # ids of the other workers are left to them
+            own_count = count_own_requests(self.last_chats_count)
+            self.metrics["chats_marked_as_done"] = own_count - sum(
+                not chat.is_processed for chat in resumed_chats
             )
-            self.metrics["chats_marked_as_done"] = self.last_chats_count
             print(
                 f"Found first unprocessed chat {self.last_chats_count} on cold start, marking all previous as processed",
                 flush=True,
@@ -117,35 +257,51 @@ class Web3ChatRepository(Web3BaseRepository):
                 f"Indexing new prompts from {self.last_chats_count} to {chats_count}",
                 flush=True,
             )
-            for i in range(self.last_chats_count, chats_count):
-                chat = await self._get_chat(i)
+            async for i, chat in self._read_in_order(
+                self.last_chats_count, chats_count, self._get_chats
+            ):
                 if chat:
-                    self.indexed_chats.append(chat)
+                    await self._set_created_at("PromptAdded", chat)
+                    self.pending_chats.add(chat)
                     self.metrics["chats_read"] += 1
                     if chat.is_processed:
                         self.metrics["chats_marked_as_done"] += 1
                 self.last_chats_count = i + 1
+            # the ids after the last one of this worker were skipped
+            self.last_chats_count = chats_count
 
     async def get_unanswered_chats(self) -> List[Chat]:
         await self._index_new_chats()
-        unanswered_chats = [
-            chat for chat in self.indexed_chats if not chat.is_processed
-        ]
+        unanswered_chats = self.pending_chats.get_unprocessed()
+        await self._save_checkpoint("chats", self.last_chats_count, unanswered_chats)
         return unanswered_chats
 
     async def send_chat_response(self, chat: Chat) -> bool:
-        try:
-            tx = await self._build_response_tx(chat)
-        except Exception as e:
-            chat.is_processed = True
-            chat.transaction_receipt = {"error": str(e)}
-            self.metrics["chats_write_errors"] += 1
-            await self.mark_as_done(chat)
-            return False
-        tx_receipt = await self._sign_and_send_tx(tx)
+        return await (await self.submit_chat_response(chat))
+
+    async def submit_chat_response(self, chat: Chat) -> Awaitable[bool]:
+        """
+        Broadcasts the chat response, the returned awaitable resolves once the
+        transaction is mined.
+        """
+        return await self._submit_call(
+            lambda: self._get_response_function(chat),
+            lambda tx_receipt: self._on_response_mined(chat, tx_receipt),
+            lambda error: self._on_response_failed(chat, error),
+        )
+
+    async def _on_response_failed(self, chat: Chat, error: Exception) -> None:
+        chat.is_processed = True
+        chat.transaction_receipt = {"error": str(error)}
+        self.pending_chats.complete(chat)
+        self.metrics["chats_write_errors"] += 1
+        await self.mark_as_done(chat)
+
+    def _on_response_mined(self, chat: Chat, tx_receipt: TxReceipt) -> bool:
         chat.transaction_receipt = tx_receipt
         chat.is_processed = bool(tx_receipt.get("status"))
         if chat.is_processed:
+            self.pending_chats.complete(chat)
             self.metrics["chats_answered"] += 1
             self.metrics["chats_marked_as_done"] += 1
         else:
@@ -153,167 +309,80 @@ class Web3ChatRepository(Web3BaseRepository):
         return bool(tx_receipt.get("status"))
 
     async def mark_as_done(self, chat: Chat):
-        nonce = await self.web3_client.eth.get_transaction_count(self.account.address)
-        tx_data = {
-            "from": self.account.address,
-            "nonce": nonce,
-            # TODO: pick gas amount in a better way
-            # "gas": 1000000,
-            "maxFeePerGas": self.web3_client.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": self.web3_client.to_wei("1", "gwei"),
-        }
-        if chain_id := settings.CHAIN_ID:
-            tx_data["chainId"] = int(chain_id)
-
         if chat.prompt_type == PromptType.OPENAI:
-            tx = await self.oracle_contract.functions.markOpenAiPromptAsProcessed(
+            function = self.oracle_contract.functions.markOpenAiPromptAsProcessed(
                 chat.id,
-            ).build_transaction(tx_data)
+            )
         elif chat.prompt_type == PromptType.GROQ:
-            tx = await self.oracle_contract.functions.markGroqPromptAsProcessed(
+            function = self.oracle_contract.functions.markGroqPromptAsProcessed(
                 chat.id,
-            ).build_transaction(tx_data)
+            )
         else:
-            tx = await self.oracle_contract.functions.markPromptAsProcessed(
+            function = self.oracle_contract.functions.markPromptAsProcessed(
                 chat.id,
-            ).build_transaction(tx_data)
+            )
+        tx = await self._build_tx(function)
         tx_receipt = await self._sign_and_send_tx(tx)
         if bool(tx_receipt.get("status")):
             self.metrics["chats_marked_as_done"] += 1
         return tx_receipt
 
-    async def _build_response_tx(self, chat: Chat):
-        nonce = await self.web3_client.eth.get_transaction_count(self.account.address)
-        tx_data = {
-            "from": self.account.address,
-            "nonce": nonce,
-            # TODO: pick gas amount in a better way
-            # "gas": 1000000,
-            "maxFeePerGas": self.web3_client.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": self.web3_client.to_wei("1", "gwei"),
-        }
-        if chain_id := settings.CHAIN_ID:
-            tx_data["chainId"] = int(chain_id)
+    def _get_response_function(self, chat: Chat):
         if chat.prompt_type == PromptType.OPENAI:
-            tx = await self.oracle_contract.functions.addOpenAiResponse(
+            function = self.oracle_contract.functions.addOpenAiResponse(
                 chat.id,
                 chat.callback_id,
                 _format_openai_response(chat.response),
                 chat.error_message,
-            ).build_transaction(tx_data)
+            )
         elif chat.prompt_type == PromptType.GROQ:
-            tx = await self.oracle_contract.functions.addGroqResponse(
+            function = self.oracle_contract.functions.addGroqResponse(
                 chat.id,
                 chat.callback_id,
                 _format_groq_response(chat.response),
                 chat.error_message,
-            ).build_transaction(tx_data)
+            )
         # Eventually more options here
         else:
             if chat.config:
-                tx = await self.oracle_contract.functions.addResponse(
+                function = self.oracle_contract.functions.addResponse(
                     chat.id,
                     chat.callback_id,
                     _format_llm_response(chat.response),
                     chat.error_message,
-                ).build_transaction(tx_data)
+                )
             else:
-                tx = await self.oracle_contract.functions.addResponse(
+                function = self.oracle_contract.functions.addResponse(
                     chat.id,
                     chat.callback_id,
                     chat.response,
                     chat.error_message,
-                ).build_transaction(tx_data)
-        return tx
+                )
+        return function
 
     async def _get_llm_config(self, i: int) -> Optional[LlmConfig]:
-        config = await self.oracle_contract.functions.llmConfigurations(i).call()
-        if not config or not config[0] or not config[0] in get_args(AnthropicModelType):
-            return None
-        try:
-            return LlmConfig(
-                model=config[0],
-                frequency_penalty=_parse_float_from_int(config[1], -20, 20),
-                logit_bias=_parse_json_string(config[2]),
-                # Check max value?
-                max_tokens=_value_or_none(config[3]),
-                presence_penalty=_parse_float_from_int(config[4], -20, 20),
-                response_format=_get_response_format(config[5]),
-                seed=_value_or_none(config[6]),
-                stop=_value_or_none(config[7]),
-                temperature=_parse_float_from_int(config[8], 0, 20),
-                top_p=_parse_float_from_int(config[9], 0, 100, decimals=2),
-                tools=_parse_tools(config[10]),
-                tool_choice=(
-                    config[11]
-                    if (config[11] and config[11] in get_args(ToolChoiceType))
-                    else None
-                ),
-                user=_value_or_none(config[12]),
-            )
-        except:
-            return None
+        config = await self.read_cache.call(
+            self.oracle_contract.functions.llmConfigurations(i)
+        )
+        return _parse_llm_config(config)
 
     async def _get_openai_config(self, i: int) -> Optional[OpenAiConfig]:
-        config = await self.oracle_contract.functions.openAiConfigurations(i).call()
-        if not config or not config[0] or not config[0] in get_args(OpenAiModelType):
-            return None
-        try:
-            return OpenAiConfig(
-                model=config[0],
-                frequency_penalty=_parse_float_from_int(config[1], -20, 20),
-                logit_bias=_parse_json_string(config[2]),
-                # Check max value?
-                max_tokens=_value_or_none(config[3]),
-                presence_penalty=_parse_float_from_int(config[4], -20, 20),
-                response_format=_get_response_format(config[5]),
-                seed=_value_or_none(config[6]),
-                stop=_value_or_none(config[7]),
-                temperature=_parse_float_from_int(config[8], 0, 20),
-                top_p=_parse_float_from_int(config[9], 0, 100, decimals=2),
-                tools=_parse_tools(config[10]),
-                tool_choice=(
-                    config[11]
-                    if (config[11] and config[11] in get_args(ToolChoiceType))
-                    else None
-                ),
-                user=_value_or_none(config[12]),
-            )
-        except:
-            return None
+        config = await self.read_cache.call(
+            self.oracle_contract.functions.openAiConfigurations(i)
+        )
+        return _parse_openai_config(config)
 
     async def _get_groq_config(self, i: int) -> Optional[GroqConfig]:
-        config = await self.oracle_contract.functions.groqConfigurations(i).call()
-        if not config or not config[0] or not config[0] in get_args(GroqModelType):
-            return None
-        try:
-            return GroqConfig(
-                model=config[0],
-                frequency_penalty=_parse_float_from_int(config[1], -20, 20),
-                logit_bias=_parse_json_string(config[2]),
-                # Check max value?
-                max_tokens=_value_or_none(config[3]),
-                presence_penalty=_parse_float_from_int(config[4], -20, 20),
-                response_format=_get_response_format(config[5]),
-                seed=_value_or_none(config[6]),
-                stop=_value_or_none(config[7]),
-                temperature=_parse_float_from_int(config[8], 0, 20),
-                top_p=_parse_float_from_int(config[9], 0, 100, decimals=2),
-                user=_value_or_none(config[10]),
-            )
-        except:
-            return None
+        config = await self.read_cache.call(
+            self.oracle_contract.functions.groqConfigurations(i)
+        )
+        return _parse_groq_config(config)
 
     async def _get_prompt_type(self, i) -> PromptType:
-        prompt_type: Optional[str] = await self.oracle_contract.functions.promptType(
-            i
-        ).call()
-        if not prompt_type:
-            return PromptType.DEFAULT
-        try:
-            return PromptType(prompt_type)
-        except:
-            return PromptType.DEFAULT
+        prompt_type: Optional[str] = await self.read_cache.call(
+            self.oracle_contract.functions.promptType(i)
+        )
+        return _parse_prompt_type(prompt_type)
 
     async def _format_history(self, history: List[str]) -> List[Dict]:
         formatted_history = []
@@ -344,6 +413,93 @@ class Web3ChatRepository(Web3BaseRepository):
         return formatted_history
 
 
+def _parse_llm_config(config: Any) -> Optional[LlmConfig]:
+    if not config or not config[0] or not config[0] in get_args(AnthropicModelType):
+        return None
+    try:
+        return LlmConfig(
+            model=config[0],
+            frequency_penalty=_parse_float_from_int(config[1], -20, 20),
+            logit_bias=_parse_json_string(config[2]),
+            # Check max value?
+            max_tokens=_value_or_none(config[3]),
+            presence_penalty=_parse_float_from_int(config[4], -20, 20),
+            response_format=_get_response_format(config[5]),
+            seed=_value_or_none(config[6]),
+            stop=_value_or_none(config[7]),
+            temperature=_parse_float_from_int(config[8], 0, 20),
+            top_p=_parse_float_from_int(config[9], 0, 100, decimals=2),
+            tools=_parse_tools(config[10]),
+            tool_choice=(
+                config[11]
+                if (config[11] and config[11] in get_args(ToolChoiceType))
+                else None
+            ),
+            user=_value_or_none(config[12]),
+        )
+    except:
+        return None
+
+
+def _parse_openai_config(config: Any) -> Optional[OpenAiConfig]:
+    if not config or not config[0] or not config[0] in get_args(OpenAiModelType):
+        return None
+    try:
+        return OpenAiConfig(
+            model=config[0],
+            frequency_penalty=_parse_float_from_int(config[1], -20, 20),
+            logit_bias=_parse_json_string(config[2]),
+            # Check max value?
+            max_tokens=_value_or_none(config[3]),
+            presence_penalty=_parse_float_from_int(config[4], -20, 20),
+            response_format=_get_response_format(config[5]),
+            seed=_value_or_none(config[6]),
+            stop=_value_or_none(config[7]),
+            temperature=_parse_float_from_int(config[8], 0, 20),
+            top_p=_parse_float_from_int(config[9], 0, 100, decimals=2),
+            tools=_parse_tools(config[10]),
+            tool_choice=(
+                config[11]
+                if (config[11] and config[11] in get_args(ToolChoiceType))
+                else None
+            ),
+            user=_value_or_none(config[12]),
+        )
+    except:
+        return None
+
+
+def _parse_groq_config(config: Any) -> Optional[GroqConfig]:
+    if not config or not config[0] or not config[0] in get_args(GroqModelType):
+        return None
+    try:
+        return GroqConfig(
+            model=config[0],
+            frequency_penalty=_parse_float_from_int(config[1], -20, 20),
+            logit_bias=_parse_json_string(config[2]),
+            # Check max value?
+            max_tokens=_value_or_none(config[3]),
+            presence_penalty=_parse_float_from_int(config[4], -20, 20),
+            response_format=_get_response_format(config[5]),
+            seed=_value_or_none(config[6]),
+            stop=_value_or_none(config[7]),
+            temperature=_parse_float_from_int(config[8], 0, 20),
+            top_p=_parse_float_from_int(config[9], 0, 100, decimals=2),
+            user=_value_or_none(config[10]),
+        )
+    except:
+        return None
+
+
+def _parse_prompt_type(prompt_type: Optional[str]) -> PromptType:
+    if not prompt_type:
+        return PromptType.DEFAULT
+    try:
+        return PromptType(prompt_type)
+    except:
+        return PromptType.DEFAULT
+
+
 def _value_or_none(value: Any) -> Optional[Any]:
     return value if value else None
 
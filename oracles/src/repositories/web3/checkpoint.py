@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+class Checkpoint:
+    """
+    Remembers how far every request type was indexed and which requests were
+    still unanswered, so a restart resumes from there instead of searching the
+    whole history. State is kept per scope (chain and oracle address) in a JSON
+    file that is replaced atomically on every change, from a thread so the
+    event loop never waits for the disk.
+    """
+
+    def __init__(self, path: str, scope: str) -> None:
+        self.path = path
+        self.scope = scope
+        self.state: Dict[str, Dict] = self._load()
+        # writes land in the order of the changes
+        self.lock = asyncio.Lock()
+
+    def get(self, name: str) -> Optional[Dict]:
+        return self.state.get(self.scope, {}).get(name)
+
+    async def save(self, name: str, last_count: int, in_flight: List[int]) -> None:
+        entry = {"last_count": last_count, "in_flight": sorted(in_flight)}
+        if self.get(name) == entry:
+            return
+        self.state.setdefault(self.scope, {})[name] = entry
+        data = json.dumps(self.state)
+        async with self.lock:
+            await asyncio.to_thread(self._write, data)
+
+    def _write(self, data: str) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error reading checkpoint {self.path}, ignoring it: {e}", flush=True)
+            return {}
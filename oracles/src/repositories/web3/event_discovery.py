@@ -0,0 +1,200 @@
+import asyncio
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from eth_utils import event_abi_to_log_topic
+from hexbytes import HexBytes
+from web3 import AsyncWeb3
+from web3.contract import AsyncContract
+
+import settings
+
+# Events emitted when a new request is created, the first indexed topic of each
+# of them is the id of the created request
+REQUEST_EVENTS = [
+    "PromptAdded",
+    "FunctionAdded",
+    "KnowledgeBaseIndexRequestAdded",
+    "KnowledgeBaseQueryAdded",
+]
+# block timestamps kept for dating the requests created in them
+BLOCK_TIMES_SIZE = 100
+
+
+class OracleEventDiscovery:
+    """
+    Finds newly created requests from the oracle event logs. All request types
+    are pulled with a single eth_getLogs call per block range, every repository
+    sharing the instance reads the request counts from the same block cursor.
+    Logs are scanned at most once per DISCOVERY_SYNC_INTERVAL for all types.
+    """
+
+    def __init__(self, web3_client: AsyncWeb3, oracle_contract: AsyncContract):
+        self.web3_client = web3_client
+        self.oracle_address = oracle_contract.address
+        self.topics = get_request_event_topics(oracle_contract)
+        self.lock = asyncio.Lock()
+        # last block that was scanned for logs
+        self.cursor: Optional[int] = None
+        # monotonic time the last scan started at and whether it is running
+        self.synced_at = 0.0
+        self.syncing = False
+        self.counts: Dict[str, int] = {}
+        # counts last confirmed by the on-chain counter and when
+        self.verified_counts: Dict[str, int] = {}
+        self.verified_at: Dict[str, float] = {}
+        # block number and hash of the logs in the rescanned blocks
+        self.recent_logs: Dict[Tuple[str, int], Tuple[int, Any]] = {}
+        # request types whose logs changed in a reorg
+        self.reorged: Set[str] = set()
+        # creation block of the discovered requests that were not read yet
+        self.created_blocks: Dict[Tuple[str, int], int] = {}
+        self.block_times: Dict[int, int] = {}
+
+    async def get_count(
+        self, event_name: str, count_func: Callable[[], Awaitable[int]]
+    ) -> int:
+        """
+        Returns the number of created requests of the given type. The count is
+        read once with count_func, afterwards it grows from event logs. The
+        logs are scanned after the call, a scan started by another request type
+        in the meantime is shared. Growth is checked against count_func every
+        DISCOVERY_VERIFY_INTERVAL and after a reorg, so requests of blocks that
+        were reorged out do not stay counted.
+        """
+        # a scan running when the call comes in is as good as a new one
+        called_at = self.synced_at if self.syncing else time.monotonic()
+        async with self.lock:
+            if self.synced_at < called_at:
+                await asyncio.sleep(
+                    self.synced_at + settings.DISCOVERY_SYNC_INTERVAL - called_at
+                )
+                self.syncing = True
+                self.synced_at = time.monotonic()
+                try:
+                    if self.cursor is None:
+                        self.cursor = await self._get_safe_block_number()
+                    else:
+                        await self._sync()
+                finally:
+                    self.syncing = False
+            if event_name not in self.counts:
+                self.counts[event_name] = await count_func()
+            elif event_name in self.reorged or (
+                self.counts[event_name] > self.verified_counts[event_name]
+                and time.monotonic() - self.verified_at[event_name]
+                >= settings.DISCOVERY_VERIFY_INTERVAL
+            ):
+                await self._verify(event_name, count_func)
+            else:
+                return self.counts[event_name]
+            self.reorged.discard(event_name)
+            self.verified_counts[event_name] = self.counts[event_name]
+            self.verified_at[event_name] = time.monotonic()
+            return self.counts[event_name]
+
+    async def _verify(
+        self, event_name: str, count_func: Callable[[], Awaitable[int]]
+    ) -> None:
+        chain_count = await count_func()
+        if chain_count >= self.counts[event_name]:
+            return
+        print(
+            f"Discovered {self.counts[event_name]} {event_name} requests, chain has {chain_count}",
+            flush=True,
+        )
+        self.counts[event_name] = chain_count
+        for key in [
+            key
+            for key in self.created_blocks
+            if key[0] == event_name and key[1] >= chain_count
+        ]:
+            del self.created_blocks[key]
+
+    async def _sync(self) -> None:
+        latest = await self._get_safe_block_number()
+        if latest <= self.cursor:
+            return
+        # Rescan the last blocks before the cursor, logs re-included after a
+        # shallow reorg are picked up again, counts never go backwards.
+        rescan_from = max(0, self.cursor - settings.DISCOVERY_REORG_DEPTH + 1)
+        seen: Dict[Tuple[str, int], Tuple[int, Any]] = {}
+        from_block = rescan_from
+        while from_block <= latest:
+            to_block = min(latest, from_block + settings.DISCOVERY_MAX_BLOCK_RANGE - 1)
+            logs = await self.web3_client.eth.get_logs(
+                {
+                    "address": self.oracle_address,
+                    "fromBlock": from_block,
+                    "toBlock": to_block,
+                    "topics": [[topic.hex() for topic in self.topics]],
+                }
+            )
+            for log in logs:
+                event_name = self.topics.get(log["topics"][0])
+                if not event_name or event_name not in self.counts:
+                    continue
+                request_id = int.from_bytes(log["topics"][1], "big")
+                seen[(event_name, request_id)] = (
+                    log["blockNumber"],
+                    log.get("blockHash"),
+                )
+                if request_id >= self.counts[event_name]:
+                    # rescanned logs of counted requests are not dated again
+                    self.created_blocks[(event_name, request_id)] = log["blockNumber"]
+                self.counts[event_name] = max(self.counts[event_name], request_id + 1)
+            self.cursor = to_block
+            from_block = to_block + 1
+        self._check_reorgs(rescan_from, latest, seen)
+
+    def _check_reorgs(
+        self,
+        rescan_from: int,
+        latest: int,
+        seen: Dict[Tuple[str, int], Tuple[int, Any]],
+    ) -> None:
+        """
+        A log of the rescanned blocks that is gone or moved to another block
+        means its request type has to be checked against the chain.
+        """
+        for key, log_block in self.recent_logs.items():
+            if log_block[0] >= rescan_from and seen.get(key) != log_block:
+                self.reorged.add(key[0])
+        rescanned_from = latest - settings.DISCOVERY_REORG_DEPTH + 1
+        self.recent_logs = {
+            key: log_block
+            for key, log_block in seen.items()
+            if log_block[0] >= rescanned_from
+        }
+
+    async def get_created_at(self, event_name: str, request_id: int) -> Optional[int]:
+        """
+        Returns the timestamp of the block the request was created in, None
+        when its event was not discovered. Every request is dated once.
+        """
+        block_number = self.created_blocks.pop((event_name, request_id), None)
+        if block_number is None:
+            return None
+        if block_number not in self.block_times:
+            block = await self.web3_client.eth.get_block(block_number)
+            if len(self.block_times) >= BLOCK_TIMES_SIZE:
+                del self.block_times[next(iter(self.block_times))]
+            self.block_times[block_number] = block["timestamp"]
+        return self.block_times[block_number]
+
+    async def _get_safe_block_number(self) -> int:
+        block_number = await self.web3_client.eth.get_block_number()
+        return max(0, block_number - settings.DISCOVERY_CONFIRMATIONS)
+
+
+def get_request_event_topics(oracle_contract: AsyncContract) -> Dict[HexBytes, str]:
+    return {
+        HexBytes(event_abi_to_log_topic(oracle_contract.events[name]().abi)): name
+        for name in REQUEST_EVENTS
+    }
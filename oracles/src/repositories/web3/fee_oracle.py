@@ -0,0 +1,113 @@
+import asyncio
+import statistics
+import time
+from typing import Dict
+from typing import Optional
+
+from web3 import AsyncWeb3
+
+import settings
+
+# used until the first fee history sample, and whenever sampling fails
+DEFAULT_MAX_FEE_PER_GAS = AsyncWeb3.to_wei("2", "gwei")
+DEFAULT_MAX_PRIORITY_FEE_PER_GAS = AsyncWeb3.to_wei("1", "gwei")
+
+
+class FeeOracle:
+    """
+    Suggests EIP-1559 fees from eth_feeHistory. The suggestion is refreshed in
+    the background so transaction builders never wait for it: the priority fee
+    is the median of the FEE_PRIORITY_PERCENTILE rewards of the last
+    FEE_HISTORY_BLOCKS blocks, the max fee leaves room for the next base fee to
+    double.
+    """
+
+    def __init__(self, web3_client: AsyncWeb3) -> None:
+        self.web3_client = web3_client
+        self.lock = asyncio.Lock()
+        self.fees: Optional[Dict[str, int]] = None
+        self.updated_at: Optional[float] = None
+        self.metrics = {
+            "fee_oracle_updates": 0,
+            "fee_oracle_errors": 0,
+            "fee_oracle_fallbacks": 0,
+            "fee_oracle_capped": 0,
+            "fee_oracle_base_fee_per_gas": 0,
+            "fee_oracle_max_fee_per_gas": DEFAULT_MAX_FEE_PER_GAS,
+            "fee_oracle_max_priority_fee_per_gas": DEFAULT_MAX_PRIORITY_FEE_PER_GAS,
+        }
+
+    async def run(self) -> None:
+        while True:
+            async with self.lock:
+                await self._update()
+            await asyncio.sleep(settings.FEE_ORACLE_INTERVAL)
+
+    async def get_fees(self) -> Dict[str, int]:
+        """
+        Returns the maxFeePerGas and maxPriorityFeePerGas transaction fields.
+        A missing or stale suggestion is refreshed before returning.
+        """
+        async with self.lock:
+            if self._is_stale():
+                await self._update()
+            if not self.fees:
+                self.metrics["fee_oracle_fallbacks"] += 1
+                return {
+                    "maxFeePerGas": DEFAULT_MAX_FEE_PER_GAS,
+                    "maxPriorityFeePerGas": DEFAULT_MAX_PRIORITY_FEE_PER_GAS,
+                }
+            return self.fees.copy()
+
+    def _is_stale(self) -> bool:
+        return (
+            self.updated_at is None
+            or time.monotonic() - self.updated_at > 2 * settings.FEE_ORACLE_INTERVAL
+        )
+
+    async def _update(self) -> None:
+        try:
+            fee_history = await self.web3_client.eth.fee_history(
+                settings.FEE_HISTORY_BLOCKS,
+                "latest",
+                [settings.FEE_PRIORITY_PERCENTILE],
+            )
+        except Exception as e:
+            print(f"Error getting fee history: {e}", flush=True)
+            self.metrics["fee_oracle_errors"] += 1
+            self.fees = None
+            self.updated_at = time.monotonic()
+            return
+        self.fees = self._suggest(fee_history)
+        self.updated_at = time.monotonic()
+        self.metrics["fee_oracle_updates"] += 1
+        self.metrics["fee_oracle_max_fee_per_gas"] = self.fees["maxFeePerGas"]
+        self.metrics["fee_oracle_max_priority_fee_per_gas"] = self.fees[
+            "maxPriorityFeePerGas"
+        ]
+
+    def _suggest(self, fee_history) -> Dict[str, int]:
+        # the last base fee is the one of the next block
+        base_fee = fee_history["baseFeePerGas"][-1]
+        self.metrics["fee_oracle_base_fee_per_gas"] = base_fee
+        rewards = [reward[0] for reward in fee_history.get("reward") or [] if reward]
+        priority_fee = (
+            int(statistics.median(rewards))
+            if rewards
+            else DEFAULT_MAX_PRIORITY_FEE_PER_GAS
+        )
+        # nodes reject transactions without a tip below their price limit
+        priority_fee = max(
+            priority_fee,
+            AsyncWeb3.to_wei(str(settings.FEE_MIN_PRIORITY_FEE_GWEI), "gwei"),
+        )
+        max_fee = 2 * base_fee + priority_fee
+        fee_cap = AsyncWeb3.to_wei(str(settings.FEE_MAX_FEE_GWEI), "gwei")
+        if fee_cap and max_fee > fee_cap:
+            self.metrics["fee_oracle_capped"] += 1
+            max_fee = fee_cap
+            priority_fee = min(priority_fee, max_fee)
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": priority_fee}
+
+    def get_metrics(self):
+        return self.metrics
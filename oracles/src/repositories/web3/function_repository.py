@@ -1,19 +1,27 @@
+from typing import Awaitable
 from typing import List
 from typing import Optional
 
 from web3.exceptions import ContractLogicError
+from web3.types import TxReceipt
 
 import settings
-
 from src.entities import FunctionCall
 from src.repositories.web3.base import Web3BaseRepository
+from src.repositories.web3.base import count_own_requests
+from src.repositories.web3.chain_client import ChainClient
+from src.repositories.web3.multicall import get_first_error
+from src.repositories.web3.pending_work import PendingWork
 
 
 class Web3FunctionRepository(Web3BaseRepository):
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, chain_client: ChainClient) -> None:
+        super().__init__(chain_client)
+        self.response_batcher = self._create_response_batcher("functions")
         self.last_function_calls_count = 0
-        self.indexed_function_calls = []
+        self.pending_function_calls: PendingWork[FunctionCall] = PendingWork(
+            settings.PENDING_HISTORY_SIZE
+        )
         self.metrics.update(
             {
                 "functions_count": 0,
@@ -27,41 +35,118 @@ class Web3FunctionRepository(Web3BaseRepository):
 
     async def _get_function_call(self, i: int) -> Optional[FunctionCall]:
         try:
-            callback_id = await self.oracle_contract.functions.functionCallbackIds(
-                i
-            ).call()
+            callback_id = await self.read_cache.call(
+                self.oracle_contract.functions.functionCallbackIds(i)
+            )
             is_function_call_processed = (
                 await self.oracle_contract.functions.isFunctionProcessed(i).call()
             )
-            function_type = await self.oracle_contract.functions.functionTypes(i).call()
-            function_input = await self.oracle_contract.functions.functionInputs(
-                i
-            ).call()
+            function_type = await self.read_cache.call(
+                self.oracle_contract.functions.functionTypes(i)
+            )
+            function_input = await self.read_cache.call(
+                self.oracle_contract.functions.functionInputs(i)
+            )
+            callback_address = await self.read_cache.call(
+                self.oracle_contract.functions.functionCallbackAddresses(i)
+            )
             return FunctionCall(
                 id=i,
                 callback_id=callback_id,
                 is_processed=is_function_call_processed,
                 function_type=function_type,
                 function_input=function_input,
+                callback_address=callback_address,
             )
         except ContractLogicError as e:
             print(f"Error getting function call {i}: {e}", flush=True)
             self.metrics["functions_read_errors"] += 1
             return None
 
+    async def _get_function_calls(self, ids: List[int]) -> List[Optional[FunctionCall]]:
+        if self.multicall:
+            try:
+                return await self._get_function_calls_aggregated(ids)
+            except Exception as e:
+                print(
+                    f"Error reading function calls {ids} with multicall: {e}",
+                    flush=True,
+                )
+        return [await self._get_function_call(i) for i in ids]
+
+    async def _get_function_calls_aggregated(
+        self, ids: List[int]
+    ) -> List[Optional[FunctionCall]]:
+        functions = self.oracle_contract.functions
+        results = await self._aggregate(
+            [
+                call
+                for i in ids
+                for call in (
+                    functions.functionCallbackIds(i),
+                    functions.isFunctionProcessed(i),
+                    functions.functionTypes(i),
+                    functions.functionInputs(i),
+                    functions.functionCallbackAddresses(i),
+                )
+            ]
+        )
+        function_calls = []
+        for n, i in enumerate(ids):
+            (
+                callback_id,
+                is_processed,
+                function_type,
+                function_input,
+                callback_address,
+            ) = results[5 * n : 5 * n + 5]
+            error = get_first_error(
+                callback_id,
+                is_processed,
+                function_type,
+                function_input,
+                callback_address,
+            )
+            if error:
+                print(f"Error getting function call {i}: {error}", flush=True)
+                self.metrics["functions_read_errors"] += 1
+                function_calls.append(None)
+                continue
+            function_calls.append(
+                FunctionCall(
+                    id=i,
+                    callback_id=callback_id,
+                    is_processed=is_processed,
+                    function_type=function_type,
+                    function_input=function_input,
+                    callback_address=callback_address,
+                )
+            )
+        return function_calls
+
     async def _index_new_function_calls(self):
-        function_calls_count = (
-            await self.oracle_contract.functions.functionsCount().call()
+        function_calls_count = await self._get_requests_count(
+            "FunctionAdded", self.oracle_contract.functions.functionsCount()
         )
         self.metrics["functions_count"] = function_calls_count
         if not self.last_function_calls_count and function_calls_count > 0:
-            self.last_function_calls_count = await self._find_first_unprocessed(
+            (
+                self.last_function_calls_count,
+                resumed_function_calls,
+            ) = await self._find_resume_point(
+                "function_calls",
                 function_calls_count,
                 lambda index: self.oracle_contract.functions.isFunctionProcessed(
                     index
                 ).call(),
+                self._get_function_calls,
+            )
+            self.pending_function_calls.extend(resumed_function_calls)
+            self.metrics["functions_read"] += len(resumed_function_calls)
+            own_count = count_own_requests(self.last_function_calls_count)
+            self.metrics["functions_marked_as_done"] = own_count - sum(
+                not f.is_processed for f in resumed_function_calls
             )
-            self.metrics["functions_marked_as_done"] = self.last_function_calls_count
             print(
                 f"Found first unprocessed functions {self.last_function_calls_count} on cold start, marking all previous as processed",
                 flush=True,
@@ -71,55 +156,73 @@ class Web3FunctionRepository(Web3BaseRepository):
                 f"Indexing new function calls from {self.last_function_calls_count} to {function_calls_count}",
                 flush=True,
             )
-            for i in range(self.last_function_calls_count, function_calls_count):
-                function_call = await self._get_function_call(i)
+            async for i, function_call in self._read_in_order(
+                self.last_function_calls_count,
+                function_calls_count,
+                self._get_function_calls,
+            ):
                 if function_call:
-                    self.indexed_function_calls.append(function_call)
+                    await self._set_created_at("FunctionAdded", function_call)
+                    self.pending_function_calls.add(function_call)
                     self.metrics["functions_read"] += 1
                     if function_call.is_processed:
                         self.metrics["functions_marked_as_done"] += 1
                 self.last_function_calls_count = i + 1
+            self.last_function_calls_count = function_calls_count
 
     async def get_unanswered_function_calls(self) -> List[FunctionCall]:
         await self._index_new_function_calls()
-        unanswered_function_calls = [
-            function_call
-            for function_call in self.indexed_function_calls
-            if not function_call.is_processed
-        ]
+        unanswered_function_calls = self.pending_function_calls.get_unprocessed()
+        await self._save_checkpoint(
+            "function_calls",
+            self.last_function_calls_count,
+            unanswered_function_calls,
+        )
         return unanswered_function_calls
 
     async def send_function_call_response(
         self, function_call: FunctionCall, response: str, error_message: str = ""
     ) -> bool:
-        nonce = await self.web3_client.eth.get_transaction_count(self.account.address)
-        tx_data = {
-            "from": self.account.address,
-            "nonce": nonce,
-            # TODO: pick gas amount in a better way
-            # "gas": 1000000,
-            "maxFeePerGas": self.web3_client.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": self.web3_client.to_wei("1", "gwei"),
-        }
-        if chain_id := settings.CHAIN_ID:
-            tx_data["chainId"] = int(chain_id)
-        try:
-            tx = await self.oracle_contract.functions.addFunctionResponse(
+        return await (
+            await self.submit_function_call_response(
+                function_call, response, error_message
+            )
+        )
+
+    async def submit_function_call_response(
+        self, function_call: FunctionCall, response: str, error_message: str = ""
+    ) -> Awaitable[bool]:
+        """
+        Broadcasts the function call response, the returned awaitable resolves
+        once the transaction is mined.
+        """
+        return await self._submit_call(
+            lambda: self.oracle_contract.functions.addFunctionResponse(
                 function_call.id,
                 function_call.callback_id,
                 response,
                 error_message,
-            ).build_transaction(tx_data)
-        except Exception as e:
-            function_call.is_processed = True
-            function_call.transaction_receipt = {"error": str(e)}
-            self.metrics["functions_write_errors"] += 1
-            await self.mark_function_call_as_done(function_call)
-            return False
-        tx_receipt = await self._sign_and_send_tx(tx)
+            ),
+            lambda tx_receipt: self._on_response_mined(function_call, tx_receipt),
+            lambda error: self._on_response_failed(function_call, error),
+        )
+
+    async def _on_response_failed(
+        self, function_call: FunctionCall, error: Exception
+    ) -> None:
+        function_call.is_processed = True
+        function_call.transaction_receipt = {"error": str(error)}
+        self.pending_function_calls.complete(function_call)
+        self.metrics["functions_write_errors"] += 1
+        await self.mark_function_call_as_done(function_call)
+
+    def _on_response_mined(
+        self, function_call: FunctionCall, tx_receipt: TxReceipt
+    ) -> bool:
         function_call.transaction_receipt = tx_receipt
         function_call.is_processed = bool(tx_receipt.get("status"))
         if function_call.is_processed:
+            self.pending_function_calls.complete(function_call)
             self.metrics["functions_answered"] += 1
             self.metrics["functions_marked_as_done"] += 1
         else:
@@ -127,21 +230,11 @@ class Web3FunctionRepository(Web3BaseRepository):
         return bool(tx_receipt.get("status"))
 
     async def mark_function_call_as_done(self, function_call: FunctionCall):
-        nonce = await self.web3_client.eth.get_transaction_count(self.account.address)
-        tx_data = {
-            "from": self.account.address,
-            "nonce": nonce,
-            # TODO: pick gas amount in a better way
-            # "gas": 1000000,
-            "maxFeePerGas": self.web3_client.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": self.web3_client.to_wei("1", "gwei"),
-        }
-        if chain_id := settings.CHAIN_ID:
-            tx_data["chainId"] = int(chain_id)
-
-        tx = await self.oracle_contract.functions.markFunctionAsProcessed(
-            function_call.id,
-        ).build_transaction(tx_data)
+        tx = await self._build_tx(
+            self.oracle_contract.functions.markFunctionAsProcessed(
+                function_call.id,
+            )
+        )
         tx_receipt = await self._sign_and_send_tx(tx)
         if bool(tx_receipt.get("status")):
             self.metrics["functions_marked_as_done"] += 1
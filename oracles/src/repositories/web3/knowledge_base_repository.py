@@ -1,22 +1,41 @@
+import asyncio
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 
 from web3.exceptions import ContractLogicError
+from web3.types import TxReceipt
 
 import settings
-
 from src.entities import KnowledgeBaseIndexingRequest
 from src.entities import KnowledgeBaseQuery
 from src.repositories.web3.base import Web3BaseRepository
+from src.repositories.web3.base import count_own_requests
+from src.repositories.web3.chain_client import ChainClient
+from src.repositories.web3.multicall import get_first_error
+from src.repositories.web3.pending_work import PendingWork
 
 
 class Web3KnowledgeBaseRepository(Web3BaseRepository):
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, chain_client: ChainClient) -> None:
+        super().__init__(chain_client)
+        self.response_batcher = self._create_response_batcher("knowledgebase")
         self.last_kb_index_request_count = 0
-        self.indexed_kb_index_requests = []
+        self.pending_kb_index_requests: PendingWork[KnowledgeBaseIndexingRequest] = (
+            PendingWork(settings.PENDING_HISTORY_SIZE)
+        )
         self.last_kb_query_count = 0
-        self.indexed_kb_queries = []
+        self.pending_kb_queries: PendingWork[KnowledgeBaseQuery] = PendingWork(
+            settings.PENDING_HISTORY_SIZE
+        )
+        # resolved index cids with the monotonic time they expire at, another
+        # indexing request of the same cid can still replace or reset the index
+        self.index_cids: Dict[str, Tuple[str, float]] = {}
+        self.index_cid_lookups: Dict[str, asyncio.Future] = {}
         self.metrics.update(
             {
                 "knowledgebase_index_count": 0,
@@ -43,8 +62,10 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
                     i
                 ).call()
             )
-            cid = await self.oracle_contract.functions.kbIndexingRequests(i).call()
-            index_cid = await self.oracle_contract.functions.kbIndexes(cid).call()
+            cid = await self.read_cache.call(
+                self.oracle_contract.functions.kbIndexingRequests(i)
+            )
+            index_cid = await self._get_index_cid(cid)
             return KnowledgeBaseIndexingRequest(
                 id=i,
                 cid=cid,
@@ -55,20 +76,145 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
             print(f"Error getting knowledge base indexing request {i}: {e}")
             return None
 
+    async def _get_knowledge_base_indexing_requests(
+        self, ids: List[int]
+    ) -> List[Optional[KnowledgeBaseIndexingRequest]]:
+        if self.multicall:
+            try:
+                return await self._get_knowledge_base_indexing_requests_aggregated(ids)
+            except Exception as e:
+                print(
+                    f"Error reading knowledge base indexing requests {ids} with multicall: {e}"
+                )
+        return [await self._get_knowledge_base_indexing_request(i) for i in ids]
+
+    async def _get_knowledge_base_indexing_requests_aggregated(
+        self, ids: List[int]
+    ) -> List[Optional[KnowledgeBaseIndexingRequest]]:
+        functions = self.oracle_contract.functions
+        results = await self._aggregate(
+            [
+                call
+                for i in ids
+                for call in (
+                    functions.isKbIndexingRequestProcessed(i),
+                    functions.kbIndexingRequests(i),
+                )
+            ]
+        )
+        requests = {}
+        for n, i in enumerate(ids):
+            is_processed, cid = results[2 * n : 2 * n + 2]
+            error = get_first_error(is_processed, cid)
+            if error:
+                print(f"Error getting knowledge base indexing request {i}: {error}")
+                continue
+            requests[i] = (is_processed, cid)
+        index_cids = await self._get_index_cids([cid for _, cid in requests.values()])
+        kb_index_requests = {}
+        for (i, (is_processed, cid)), index_cid in zip(requests.items(), index_cids):
+            if isinstance(index_cid, Exception):
+                print(f"Error getting knowledge base indexing request {i}: {index_cid}")
+                continue
+            kb_index_requests[i] = KnowledgeBaseIndexingRequest(
+                id=i,
+                cid=cid,
+                index_cid=index_cid,
+                is_processed=is_processed,
+            )
+        return [kb_index_requests.get(i) for i in ids]
+
+    async def _get_index_cid(self, cid: str) -> str:
+        index_cid = (await self._get_index_cids([cid]))[0]
+        if isinstance(index_cid, Exception):
+            raise index_cid
+        return index_cid
+
+    async def _get_index_cids(self, cids: List[str]) -> List[Any]:
+        """
+        Resolves the index cid of every knowledge base, an empty string if it is
+        not indexed yet. Index cids resolved within KB_INDEX_CACHE_TTL need no RPC
+        call and concurrent lookups of the same cid share one read. Failed reads
+        are returned as exceptions in place of their index cid.
+        """
+        cached = {}
+        lookups = {}
+        missing = []
+        for cid in dict.fromkeys(cids):
+            index_cid = self._get_cached_index_cid(cid)
+            if index_cid:
+                cached[cid] = index_cid
+                continue
+            if cid not in self.index_cid_lookups:
+                self.index_cid_lookups[cid] = asyncio.get_running_loop().create_future()
+                missing.append(cid)
+            lookups[cid] = self.index_cid_lookups[cid]
+        if missing:
+            await self._read_index_cids(missing)
+        results = dict(zip(lookups, await asyncio.gather(*lookups.values())))
+        return [cached[cid] if cid in cached else results[cid] for cid in cids]
+
+    def _get_cached_index_cid(self, cid: str) -> Optional[str]:
+        index_cid, expires_at = self.index_cids.get(cid, ("", 0.0))
+        if index_cid and expires_at <= time.monotonic():
+            del self.index_cids[cid]
+            return None
+        return index_cid or None
+
+    def _cache_index_cid(self, cid: str, index_cid: str) -> None:
+        if index_cid and settings.KB_INDEX_CACHE_TTL > 0:
+            self.index_cids[cid] = (
+                index_cid,
+                time.monotonic() + settings.KB_INDEX_CACHE_TTL,
+            )
+        else:
+            self.index_cids.pop(cid, None)
+
+    async def _read_index_cids(self, cids: List[str]) -> None:
+        functions = self.oracle_contract.functions
+        try:
+            if self.multicall:
+                index_cids = await self.multicall.aggregate(
+                    [functions.kbIndexes(cid) for cid in cids]
+                )
+            else:
+                index_cids = await asyncio.gather(
+                    *[functions.kbIndexes(cid).call() for cid in cids],
+                    return_exceptions=True,
+                )
+        except Exception as e:
+            for cid in cids:
+                self.index_cid_lookups.pop(cid).set_result(e)
+            raise e
+        for cid, index_cid in zip(cids, index_cids):
+            if not isinstance(index_cid, Exception):
+                # not indexed yet is not cached, the index may be added any time
+                self._cache_index_cid(cid, index_cid)
+            self.index_cid_lookups.pop(cid).set_result(index_cid)
+
     async def _index_new_kb_index_requests(self):
-        kb_index_request_count = (
-            await self.oracle_contract.functions.kbIndexingRequestCount().call()
+        kb_index_request_count = await self._get_requests_count(
+            "KnowledgeBaseIndexRequestAdded",
+            self.oracle_contract.functions.kbIndexingRequestCount(),
         )
         self.metrics["knowledgebase_index_count"] = kb_index_request_count
         if not self.last_kb_index_request_count and kb_index_request_count > 0:
-            self.last_kb_index_request_count = await self._find_first_unprocessed(
+            (
+                self.last_kb_index_request_count,
+                resumed_requests,
+            ) = await self._find_resume_point(
+                "kb_index_requests",
                 kb_index_request_count,
                 lambda index: self.oracle_contract.functions.isKbIndexingRequestProcessed(
                     index
                 ).call(),
+                self._get_knowledge_base_indexing_requests,
             )
-            self.metrics["knowledgebase_index_marked_as_done"] = (
-                self.last_kb_index_request_count
+            self.pending_kb_index_requests.extend(resumed_requests)
+            self.metrics["knowledgebase_index_read"] += len(resumed_requests)
+            own_count = count_own_requests(self.last_kb_index_request_count)
+            self.metrics["knowledgebase_index_marked_as_done"] = own_count - sum(
+                not request.is_processed for request in resumed_requests
             )
             print(
                 f"Found first unprocessed kb indexing request {self.last_kb_index_request_count} on cold start, marking all previous as processed",
@@ -78,24 +224,34 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
             print(
                 f"Indexing new knowledge base indexing requests from {self.last_kb_index_request_count} to {kb_index_request_count}"
             )
-            for i in range(self.last_kb_index_request_count, kb_index_request_count):
-                kb_index_request = await self._get_knowledge_base_indexing_request(i)
+            async for i, kb_index_request in self._read_in_order(
+                self.last_kb_index_request_count,
+                kb_index_request_count,
+                self._get_knowledge_base_indexing_requests,
+            ):
                 if kb_index_request:
-                    self.indexed_kb_index_requests.append(kb_index_request)
+                    await self._set_created_at(
+                        "KnowledgeBaseIndexRequestAdded", kb_index_request
+                    )
+                    self.pending_kb_index_requests.add(kb_index_request)
                     self.metrics["knowledgebase_index_read"] += 1
                     if kb_index_request.is_processed:
                         self.metrics["knowledgebase_index_marked_as_done"] += 1
                 else:
                     self.metrics["knowledgebase_index_read_errors"] += 1
                 self.last_kb_index_request_count = i + 1
+            self.last_kb_index_request_count = kb_index_request_count
 
     async def get_unindexed_knowledge_bases(self) -> List[KnowledgeBaseIndexingRequest]:
         await self._index_new_kb_index_requests()
-        unanswered_kb_indexing_requests = [
-            kb_indexing_request
-            for kb_indexing_request in self.indexed_kb_index_requests
-            if not kb_indexing_request.is_processed
-        ]
+        unanswered_kb_indexing_requests = (
+            self.pending_kb_index_requests.get_unprocessed()
+        )
+        await self._save_checkpoint(
+            "kb_index_requests",
+            self.last_kb_index_request_count,
+            unanswered_kb_indexing_requests,
+        )
         return unanswered_kb_indexing_requests
 
     async def send_kb_indexing_response(
@@ -104,31 +260,51 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
         index_cid: str,
         error_message: str,
     ) -> bool:
-        nonce = await self.web3_client.eth.get_transaction_count(self.account.address)
-        tx_data = {
-            "from": self.account.address,
-            "nonce": nonce,
-            # TODO: pick gas amount in a better way
-            # "gas": 1000000,
-            "maxFeePerGas": self.web3_client.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": self.web3_client.to_wei("1", "gwei"),
-        }
-        if chain_id := settings.CHAIN_ID:
-            tx_data["chainId"] = int(chain_id)
-        try:
-            tx = await self.oracle_contract.functions.addKnowledgeBaseIndex(
+        return await (
+            await self.submit_kb_indexing_response(request, index_cid, error_message)
+        )
+
+    async def submit_kb_indexing_response(
+        self,
+        request: KnowledgeBaseIndexingRequest,
+        index_cid: str,
+        error_message: str,
+    ) -> Awaitable[bool]:
+        """
+        Broadcasts the indexing response, the returned awaitable resolves once
+        the transaction is mined.
+        """
+        return await self._submit_call(
+            lambda: self.oracle_contract.functions.addKnowledgeBaseIndex(
                 request.id, index_cid, error_message
-            ).build_transaction(tx_data)
-        except Exception as e:
-            request.is_processed = True
-            request.transaction_receipt = {"error": str(e)}
-            self.metrics["knowledgebase_index_write_errors"] += 1
-            await self.mark_kb_indexing_request_as_done(request)
-            return False
-        tx_receipt = await self._sign_and_send_tx(tx)
+            ),
+            lambda tx_receipt: self._on_indexing_response_mined(
+                request, index_cid, tx_receipt
+            ),
+            lambda error: self._on_indexing_response_failed(request, error),
+        )
+
+    async def _on_indexing_response_failed(
+        self, request: KnowledgeBaseIndexingRequest, error: Exception
+    ) -> None:
+        request.is_processed = True
+        request.transaction_receipt = {"error": str(error)}
+        self.pending_kb_index_requests.complete(request)
+        self.metrics["knowledgebase_index_write_errors"] += 1
+        await self.mark_kb_indexing_request_as_done(request)
+
+    def _on_indexing_response_mined(
+        self,
+        request: KnowledgeBaseIndexingRequest,
+        index_cid: str,
+        tx_receipt: TxReceipt,
+    ) -> bool:
         request.transaction_receipt = tx_receipt
         request.is_processed = bool(tx_receipt.get("status"))
         if request.is_processed:
+            # the index is what this response wrote, an error resets it to ""
+            self._cache_index_cid(request.cid, index_cid)
+            self.pending_kb_index_requests.complete(request)
             self.metrics["knowledgebase_index_answered"] += 1
             self.metrics["knowledgebase_index_marked_as_done"] += 1
         return bool(tx_receipt.get("status"))
@@ -136,21 +312,11 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
     async def mark_kb_indexing_request_as_done(
         self, request: KnowledgeBaseIndexingRequest
     ):
-        nonce = await self.web3_client.eth.get_transaction_count(self.account.address)
-        tx_data = {
-            "from": self.account.address,
-            "nonce": nonce,
-            # TODO: pick gas amount in a better way
-            # "gas": 1000000,
-            "maxFeePerGas": self.web3_client.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": self.web3_client.to_wei("1", "gwei"),
-        }
-        if chain_id := settings.CHAIN_ID:
-            tx_data["chainId"] = int(chain_id)
-
-        tx = await self.oracle_contract.functions.markKnowledgeBaseAsProcessed(
-            request.id,
-        ).build_transaction(tx_data)
+        tx = await self._build_tx(
+            self.oracle_contract.functions.markKnowledgeBaseAsProcessed(
+                request.id,
+            )
+        )
         tx_receipt = await self._sign_and_send_tx(tx)
         if bool(tx_receipt.get("status")):
             self.metrics["knowledgebase_index_marked_as_done"] += 1
@@ -158,17 +324,22 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
 
     async def _get_kb_query(self, i: int) -> Optional[KnowledgeBaseQuery]:
         try:
-            callback_id = await self.oracle_contract.functions.kbQueryCallbackIds(
-                i
-            ).call()
+            callback_id = await self.read_cache.call(
+                self.oracle_contract.functions.kbQueryCallbackIds(i)
+            )
             is_processed = await self.oracle_contract.functions.isKbQueryProcessed(
                 i
             ).call()
-            request = await self.oracle_contract.functions.kbQueries(i).call()
+            request = await self.read_cache.call(
+                self.oracle_contract.functions.kbQueries(i)
+            )
+            callback_address = await self.read_cache.call(
+                self.oracle_contract.functions.kbQueryCallbackAddresses(i)
+            )
             cid = request[0]
             query = request[1]
             num_documents = request[2]
-            index_cid = await self.oracle_contract.functions.kbIndexes(cid).call()
+            index_cid = await self._get_index_cid(cid)
             return KnowledgeBaseQuery(
                 id=i,
                 callback_id=callback_id,
@@ -177,23 +348,93 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
                 index_cid=index_cid,
                 query=query,
                 num_documents=num_documents,
+                callback_address=callback_address,
             )
         except ContractLogicError as e:
             print(f"Error getting knowledge base query {i}: {e}")
             return None
 
+    async def _get_kb_queries(
+        self, ids: List[int]
+    ) -> List[Optional[KnowledgeBaseQuery]]:
+        if self.multicall:
+            try:
+                return await self._get_kb_queries_aggregated(ids)
+            except Exception as e:
+                print(f"Error reading knowledge base queries {ids} with multicall: {e}")
+        return [await self._get_kb_query(i) for i in ids]
+
+    async def _get_kb_queries_aggregated(
+        self, ids: List[int]
+    ) -> List[Optional[KnowledgeBaseQuery]]:
+        functions = self.oracle_contract.functions
+        results = await self._aggregate(
+            [
+                call
+                for i in ids
+                for call in (
+                    functions.kbQueryCallbackIds(i),
+                    functions.isKbQueryProcessed(i),
+                    functions.kbQueries(i),
+                    functions.kbQueryCallbackAddresses(i),
+                )
+            ]
+        )
+        requests = {}
+        callback_addresses = {}
+        for n, i in enumerate(ids):
+            callback_id, is_processed, request, callback_address = results[
+                4 * n : 4 * n + 4
+            ]
+            error = get_first_error(
+                callback_id, is_processed, request, callback_address
+            )
+            if error:
+                print(f"Error getting knowledge base query {i}: {error}")
+                continue
+            requests[i] = (callback_id, is_processed, request)
+            callback_addresses[i] = callback_address
+        index_cids = await self._get_index_cids(
+            [request[0] for _, _, request in requests.values()]
+        )
+        kb_queries = {}
+        for (i, (callback_id, is_processed, request)), index_cid in zip(
+            requests.items(), index_cids
+        ):
+            if isinstance(index_cid, Exception):
+                print(f"Error getting knowledge base query {i}: {index_cid}")
+                continue
+            kb_queries[i] = KnowledgeBaseQuery(
+                id=i,
+                callback_id=callback_id,
+                is_processed=is_processed,
+                cid=request[0],
+                index_cid=index_cid,
+                query=request[1],
+                num_documents=request[2],
+                callback_address=callback_addresses[i],
+            )
+        return [kb_queries.get(i) for i in ids]
+
     async def _index_new_kb_queries(self):
-        kb_query_count = await self.oracle_contract.functions.kbQueryCount().call()
+        kb_query_count = await self._get_requests_count(
+            "KnowledgeBaseQueryAdded", self.oracle_contract.functions.kbQueryCount()
+        )
         self.metrics["knowledgebase_query_count"] = kb_query_count
         if not self.last_kb_query_count and kb_query_count > 0:
-            self.last_kb_query_count = await self._find_first_unprocessed(
+            self.last_kb_query_count, resumed_queries = await self._find_resume_point(
+                "kb_queries",
                 kb_query_count,
                 lambda index: self.oracle_contract.functions.isKbQueryProcessed(
                     index
                 ).call(),
+                self._get_kb_queries,
             )
-            self.metrics["knowledgebase_query_marked_as_done"] = (
-                self.last_kb_query_count
+            self.pending_kb_queries.extend(resumed_queries)
+            self.metrics["knowledgebase_query_read"] += len(resumed_queries)
+            own_count = count_own_requests(self.last_kb_query_count)
+            self.metrics["knowledgebase_query_marked_as_done"] = own_count - sum(
+                not query.is_processed for query in resumed_queries
             )
             print(
                 f"Found first unprocessed kb query request {self.last_kb_query_count} on cold start, marking all previous as processed",
@@ -203,24 +444,26 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
             print(
                 f"Indexing new knowledge base queries from {self.last_kb_query_count} to {kb_query_count}"
             )
-            for i in range(self.last_kb_query_count, kb_query_count):
-                kb_query = await self._get_kb_query(i)
+            async for i, kb_query in self._read_in_order(
+                self.last_kb_query_count, kb_query_count, self._get_kb_queries
+            ):
                 if kb_query:
-                    self.indexed_kb_queries.append(kb_query)
+                    await self._set_created_at("KnowledgeBaseQueryAdded", kb_query)
+                    self.pending_kb_queries.add(kb_query)
                     self.metrics["knowledgebase_query_read"] += 1
                     if kb_query.is_processed:
                         self.metrics["knowledgebase_query_marked_as_done"] += 1
                 else:
                     self.metrics["knowledgebase_query_read_errors"] += 1
                 self.last_kb_query_count = i + 1
+            self.last_kb_query_count = kb_query_count
 
     async def get_unanswered_kb_queries(self) -> List[KnowledgeBaseQuery]:
         await self._index_new_kb_queries()
-        unanswered_kb_queries = [
-            kb_query
-            for kb_query in self.indexed_kb_queries
-            if not kb_query.is_processed
-        ]
+        unanswered_kb_queries = self.pending_kb_queries.get_unprocessed()
+        await self._save_checkpoint(
+            "kb_queries", self.last_kb_query_count, unanswered_kb_queries
+        )
         return unanswered_kb_queries
 
     async def send_kb_query_response(
@@ -229,51 +472,54 @@ class Web3KnowledgeBaseRepository(Web3BaseRepository):
         documents: List[str],
         error_message: str = "",
     ) -> bool:
-        nonce = await self.web3_client.eth.get_transaction_count(self.account.address)
-        tx_data = {
-            "from": self.account.address,
-            "nonce": nonce,
-            # TODO: pick gas amount in a better way
-            # "gas": 1000000,
-            "maxFeePerGas": self.web3_client.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": self.web3_client.to_wei("1", "gwei"),
-        }
-        if chain_id := settings.CHAIN_ID:
-            tx_data["chainId"] = int(chain_id)
-        try:
-            tx = await self.oracle_contract.functions.addKnowledgeBaseQueryResponse(
+        return await (
+            await self.submit_kb_query_response(request, documents, error_message)
+        )
+
+    async def submit_kb_query_response(
+        self,
+        request: KnowledgeBaseQuery,
+        documents: List[str],
+        error_message: str = "",
+    ) -> Awaitable[bool]:
+        """
+        Broadcasts the query response, the returned awaitable resolves once the
+        transaction is mined.
+        """
+        return await self._submit_call(
+            lambda: self.oracle_contract.functions.addKnowledgeBaseQueryResponse(
                 request.id, request.callback_id, documents, error_message
-            ).build_transaction(tx_data)
-        except Exception as e:
-            request.is_processed = True
-            request.transaction_receipt = {"error": str(e)}
-            self.metrics["knowledgebase_query_write_errors"] += 1
-            await self.mark_kb_query_as_done(request)
-            return False
-        tx_receipt = await self._sign_and_send_tx(tx)
+            ),
+            lambda tx_receipt: self._on_query_response_mined(request, tx_receipt),
+            lambda error: self._on_query_response_failed(request, error),
+        )
+
+    async def _on_query_response_failed(
+        self, request: KnowledgeBaseQuery, error: Exception
+    ) -> None:
+        request.is_processed = True
+        request.transaction_receipt = {"error": str(error)}
+        self.pending_kb_queries.complete(request)
+        self.metrics["knowledgebase_query_write_errors"] += 1
+        await self.mark_kb_query_as_done(request)
+
+    def _on_query_response_mined(
+        self, request: KnowledgeBaseQuery, tx_receipt: TxReceipt
+    ) -> bool:
         request.transaction_receipt = tx_receipt
         request.is_processed = bool(tx_receipt.get("status"))
         if request.is_processed:
+            self.pending_kb_queries.complete(request)
             self.metrics["knowledgebase_query_answered"] += 1
             self.metrics["knowledgebase_query_marked_as_done"] += 1
         return bool(tx_receipt.get("status"))
 
     async def mark_kb_query_as_done(self, query: KnowledgeBaseQuery):
-        nonce = await self.web3_client.eth.get_transaction_count(self.account.address)
-        tx_data = {
-            "from": self.account.address,
-            "nonce": nonce,
-            # TODO: pick gas amount in a better way
-            # "gas": 1000000,
-            "maxFeePerGas": self.web3_client.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": self.web3_client.to_wei("1", "gwei"),
-        }
-        if chain_id := settings.CHAIN_ID:
-            tx_data["chainId"] = int(chain_id)
-
-        tx = await self.oracle_contract.functions.markKnowledgeBaseQueryAsProcessed(
-            query.id,
-        ).build_transaction(tx_data)
+        tx = await self._build_tx(
+            self.oracle_contract.functions.markKnowledgeBaseQueryAsProcessed(
+                query.id,
+            )
+        )
         tx_receipt = await self._sign_and_send_tx(tx)
         if bool(tx_receipt.get("status")):
             self.metrics["knowledgebase_query_marked_as_done"] += 1
@@ -0,0 +1,93 @@
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from web3 import AsyncWeb3
+from web3._utils.abi import get_abi_output_types
+from web3._utils.abi import map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from web3.contract.async_contract import AsyncContractFunction
+from web3.exceptions import ContractLogicError
+
+# Only the aggregate3 entrypoint of Multicall3 is needed,
+# see https://github.com/mds1/multicall
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    }
+]
+
+
+class Multicall:
+    def __init__(self, web3_client: AsyncWeb3, address: str) -> None:
+        self.web3_client = web3_client
+        self.contract = web3_client.eth.contract(
+            address=AsyncWeb3.to_checksum_address(address), abi=MULTICALL3_ABI
+        )
+
+    async def aggregate(self, calls: Sequence[AsyncContractFunction]) -> List[Any]:
+        """
+        Executes all the calls in a single eth_call. Every result is decoded on its
+        own, a reverting call is returned as an exception in place of its value.
+        """
+        if not calls:
+            return []
+        responses = await self.contract.functions.aggregate3(
+            [(call.address, True, call._encode_transaction_data()) for call in calls]
+        ).call()
+        return [
+            self._decode(call, success, return_data)
+            for call, (success, return_data) in zip(calls, responses)
+        ]
+
+    def _decode(
+        self, call: AsyncContractFunction, success: bool, return_data: bytes
+    ) -> Any:
+        if not success:
+            return ContractLogicError(
+                f"{call.fn_name} reverted, return data: {return_data.hex()}"
+            )
+        output_types = get_abi_output_types(call.abi)
+        try:
+            output_data = self.web3_client.codec.decode(output_types, return_data)
+        except Exception as e:
+            return ContractLogicError(f"Could not decode {call.fn_name} output: {e}")
+        normalized_data = map_abi_data(
+            BASE_RETURN_NORMALIZERS, output_types, output_data
+        )
+        if len(normalized_data) == 1:
+            return normalized_data[0]
+        return normalized_data
+
+
+def get_first_error(*results: Any) -> Optional[Exception]:
+    for result in results:
+        if isinstance(result, Exception):
+            return result
+    return None
@@ -0,0 +1,73 @@
+import asyncio
+import heapq
+from typing import List
+from typing import Optional
+from typing import Set
+
+from web3 import AsyncWeb3
+
+
+class NonceManager:
+    """
+    Hands out transaction nonces for one account locally, so many transactions
+    can be in flight at once without racing on get_transaction_count.
+    Nonces of transactions that were never broadcast are released and reused
+    first, so no gap is left behind.
+    """
+
+    def __init__(self, web3_client: AsyncWeb3, address: str) -> None:
+        self.web3_client = web3_client
+        self.address = address
+        self.lock = asyncio.Lock()
+        self.next_nonce: Optional[int] = None
+        # nonces handed out and not yet confirmed or released
+        self.in_flight: Set[int] = set()
+        # min-heap of released nonces below next_nonce
+        self.released: List[int] = []
+
+    async def get_nonce(self) -> int:
+        async with self.lock:
+            if self.next_nonce is None:
+                self.next_nonce = await self._get_chain_nonce()
+            if self.released:
+                nonce = heapq.heappop(self.released)
+            else:
+                nonce = self.next_nonce
+                self.next_nonce += 1
+            self.in_flight.add(nonce)
+            return nonce
+
+    def release(self, nonce: int) -> None:
+        """Returns the nonce of a transaction that did not reach the chain."""
+        if nonce not in self.in_flight:
+            return
+        self.in_flight.discard(nonce)
+        heapq.heappush(self.released, nonce)
+
+    def confirm(self, nonce: int) -> None:
+        """Marks the nonce as used by a mined transaction."""
+        self.in_flight.discard(nonce)
+
+    async def resync(self, dropped: Optional[int] = None) -> None:
+        """
+        Resynchronises with the chain after errors: nonces already used on-chain
+        are dropped, nonces below next_nonce that nobody holds are reused. The
+        dropped nonce belongs to a transaction that is given up on, it is reused
+        unless the chain already counts it.
+        """
+        async with self.lock:
+            chain_nonce = await self._get_chain_nonce()
+            self.in_flight = {
+                n for n in self.in_flight if n >= chain_nonce and n != dropped
+            }
+            if self.next_nonce is None or chain_nonce > self.next_nonce:
+                self.next_nonce = chain_nonce
+            self.released = [
+                n
+                for n in range(chain_nonce, self.next_nonce)
+                if n not in self.in_flight
+            ]
+            heapq.heapify(self.released)
+
+    async def _get_chain_nonce(self) -> int:
+        return await self.web3_client.eth.get_transaction_count(self.address, "pending")
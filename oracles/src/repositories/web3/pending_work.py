@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from collections import deque
+from typing import Deque
+from typing import Generic
+from typing import Iterable
+from typing import List
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class PendingWork(Generic[T]):
+    """
+    Indexed entities that still need an answer, keyed by id in creation order.
+    Processed entities are evicted in O(1) and only the last history_size of
+    them are kept around for debugging.
+    """
+
+    def __init__(self, history_size: int) -> None:
+        self.pending: "OrderedDict[int, T]" = OrderedDict()
+        self.history: Deque[T] = deque(maxlen=history_size)
+
+    def add(self, entity: T) -> None:
+        if entity.is_processed:
+            self.history.append(entity)
+        else:
+            self.pending[entity.id] = entity
+
+    def extend(self, entities: Iterable[T]) -> None:
+        for entity in entities:
+            self.add(entity)
+
+    def complete(self, entity: T) -> None:
+        if self.pending.pop(entity.id, None) is not None:
+            self.history.append(entity)
+
+    def get_unprocessed(self) -> List[T]:
+        for entity in [e for e in self.pending.values() if e.is_processed]:
+            self.complete(entity)
+        return list(self.pending.values())
+
+    def __len__(self) -> int:
+        return len(self.pending)
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Hashable
+from typing import List
+from typing import Optional
+
+from web3.contract.async_contract import AsyncContractFunction
+
+# getters whose result never changes once the request exists, the is*Processed
+# flags and kbIndexes are mutable and always read from the chain
+IMMUTABLE_FUNCTIONS = {
+    "promptCallbackIds",
+    "callbackAddresses",
+    "promptType",
+    "openAiConfigurations",
+    "groqConfigurations",
+    "llmConfigurations",
+    "getMessagesAndRoles",
+    "getMessages",
+    "getRoles",
+    "functionCallbackIds",
+    "functionCallbackAddresses",
+    "functionTypes",
+    "functionInputs",
+    "kbIndexingRequests",
+    "kbQueryCallbackIds",
+    "kbQueryCallbackAddresses",
+    "kbQueries",
+}
+
+
+class ReadCache:
+    """
+    Read-through LRU cache for contract getters listed in IMMUTABLE_FUNCTIONS,
+    keyed by contract address, function and arguments. Every other call and
+    every failed call goes to the chain.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.metrics = {
+            "read_cache_hits": 0,
+            "read_cache_misses": 0,
+            "read_cache_evictions": 0,
+        }
+
+    async def call(self, function: AsyncContractFunction) -> Any:
+        key = self._get_key(function)
+        if key is None:
+            return await function.call()
+        if key in self.entries:
+            return self._hit(key)
+        self.metrics["read_cache_misses"] += 1
+        value = await function.call()
+        self._store(key, value)
+        return value
+
+    async def aggregate(
+        self,
+        calls: List[AsyncContractFunction],
+        aggregate_func: Callable[[List[AsyncContractFunction]], Awaitable[List]],
+    ) -> List[Any]:
+        """
+        Same as aggregate_func, only the calls missing from the cache are sent.
+        """
+        results: List[Any] = [None] * len(calls)
+        missing = []
+        for n, call in enumerate(calls):
+            key = self._get_key(call)
+            if key is not None and key in self.entries:
+                results[n] = self._hit(key)
+            else:
+                if key is not None:
+                    self.metrics["read_cache_misses"] += 1
+                missing.append((n, key, call))
+        if missing:
+            values = await aggregate_func([call for _, _, call in missing])
+            for (n, key, _), value in zip(missing, values):
+                results[n] = value
+                if key is not None and not isinstance(value, Exception):
+                    self._store(key, value)
+        return results
+
+    def _get_key(self, function: AsyncContractFunction) -> Optional[Hashable]:
+        if not self.max_size or function.fn_name not in IMMUTABLE_FUNCTIONS:
+            return None
+        return function.address, function.fn_name, tuple(function.args)
+
+    def _hit(self, key: Hashable) -> Any:
+        self.metrics["read_cache_hits"] += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = value
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.metrics["read_cache_evictions"] += 1
+
+    def get_metrics(self):
+        lookups = self.metrics["read_cache_hits"] + self.metrics["read_cache_misses"]
+        return {
+            **self.metrics,
+            "read_cache_size": len(self.entries),
+            "read_cache_hit_rate": (
+                round(self.metrics["read_cache_hits"] / lookups, 3) if lookups else 0.0
+            ),
+        }
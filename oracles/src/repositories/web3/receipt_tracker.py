@@ -0,0 +1,112 @@
+import asyncio
+import time
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from hexbytes import HexBytes
+from web3 import AsyncWeb3
+from web3.exceptions import TimeExhausted
+from web3.exceptions import TransactionNotFound
+from web3.types import TxReceipt
+
+import settings
+
+# seconds to wait for a new block before checking anyway, blocks may stop
+# arriving while the subscription is reconnecting
+NEW_BLOCK_TIMEOUT = 5
+
+
+class ReceiptTracker:
+    """
+    Resolves futures with transaction receipts. All outstanding transactions
+    are looked up with a single block query per new block instead of a
+    polling loop per transaction.
+    """
+
+    def __init__(self, web3_client: AsyncWeb3) -> None:
+        self.web3_client = web3_client
+        # set on every new block when a block subscription is available
+        self.new_block: Optional[asyncio.Event] = None
+        # tx hash -> (future, tracking start time, checked directly)
+        self.pending: Dict[HexBytes, Tuple[asyncio.Future, float, bool]] = {}
+        self.last_block: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def track(self, tx_hash: HexBytes) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.pending[HexBytes(tx_hash)] = (future, time.monotonic(), False)
+        if not self.task or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return future
+
+    async def wait(self, tx_hash: HexBytes) -> TxReceipt:
+        return await self.track(tx_hash)
+
+    async def _run(self) -> None:
+        while self.pending:
+            try:
+                await self._check_unseen()
+                await self._check_new_blocks()
+            except Exception as e:
+                print(f"Error checking transaction receipts: {e}", flush=True)
+            self._expire()
+            if self.pending:
+                await self._wait_for_block()
+        self.last_block = None
+
+    async def _check_unseen(self) -> None:
+        # Transactions could be mined in a block scanned before they were
+        # tracked, these are looked up directly once.
+        for tx_hash, (future, tracked_at, _) in list(self.pending.items()):
+            if tx_hash not in self.pending or self.pending[tx_hash][2]:
+                continue
+            self.pending[tx_hash] = (future, tracked_at, True)
+            try:
+                receipt = await self.web3_client.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+            self._resolve(tx_hash, receipt)
+
+    async def _check_new_blocks(self) -> None:
+        latest = await self.web3_client.eth.get_block_number()
+        if self.last_block is None:
+            self.last_block = latest - 1
+        for block_number in range(self.last_block + 1, latest + 1):
+            if not self.pending:
+                break
+            block = await self.web3_client.eth.get_block(block_number)
+            for tx_hash in block["transactions"]:
+                if tx_hash in self.pending:
+                    receipt = await self.web3_client.eth.get_transaction_receipt(
+                        tx_hash
+                    )
+                    self._resolve(tx_hash, receipt)
+            self.last_block = block_number
+
+    def _resolve(self, tx_hash: HexBytes, receipt: TxReceipt) -> None:
+        future, _, _ = self.pending.pop(tx_hash)
+        if not future.done():
+            future.set_result(receipt)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for tx_hash, (future, tracked_at, _) in list(self.pending.items()):
+            if now - tracked_at > settings.RECEIPT_TIMEOUT:
+                del self.pending[tx_hash]
+                if not future.done():
+                    future.set_exception(
+                        TimeExhausted(
+                            f"Transaction {tx_hash.hex()} is not in the chain "
+                            f"after {settings.RECEIPT_TIMEOUT} seconds"
+                        )
+                    )
+
+    async def _wait_for_block(self) -> None:
+        if not self.new_block:
+            await asyncio.sleep(settings.RECEIPT_POLL_INTERVAL)
+            return
+        try:
+            await asyncio.wait_for(self.new_block.wait(), NEW_BLOCK_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
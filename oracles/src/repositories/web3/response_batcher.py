@@ -0,0 +1,148 @@
+import asyncio
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from web3.contract import AsyncContract
+from web3.contract.async_contract import AsyncContractFunction
+from web3.exceptions import ContractLogicError
+from web3.logs import DISCARD
+from web3.types import TxParams
+from web3.types import TxReceipt
+
+import settings
+from src.domain import tracing
+
+
+class BatchItem:
+    def __init__(
+        self,
+        function: AsyncContractFunction,
+        on_receipt: Callable[[TxReceipt], bool],
+        on_error: Callable[[Exception], Awaitable[None]],
+    ) -> None:
+        self.fn_name = function.fn_name
+        # encoded right away so invalid arguments fail the submission itself
+        self.data = function._encode_transaction_data()
+        self.on_receipt = on_receipt
+        self.on_error = on_error
+        self.trace = tracing.get_trace()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class ResponseBatcher:
+    """
+    Collects response calls and sends them together through the oracle's
+    batchResponses entrypoint, a batch is flushed once it holds
+    RESPONSE_BATCH_SIZE calls or RESPONSE_BATCH_MAX_WAIT seconds after its first
+    call. A call reverting inside the batch is handled like a response that
+    could not be built, the rest of the batch is unaffected.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        oracle_contract: AsyncContract,
+        build_tx: Callable[[AsyncContractFunction], Awaitable[TxParams]],
+        send_tx: Callable[[TxParams], Awaitable[Awaitable[TxReceipt]]],
+    ) -> None:
+        self.name = name
+        self.oracle_contract = oracle_contract
+        self.build_tx = build_tx
+        self.send_tx = send_tx
+        self.items: List[BatchItem] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.flushes: Set[asyncio.Task] = set()
+        self.metrics = {
+            f"{name}_response_batches_sent": 0,
+            f"{name}_responses_batched": 0,
+            f"{name}_batch_calls_failed": 0,
+        }
+
+    def submit(
+        self,
+        function: AsyncContractFunction,
+        on_receipt: Callable[[TxReceipt], bool],
+        on_error: Callable[[Exception], Awaitable[None]],
+    ) -> Awaitable[bool]:
+        """
+        Queues the call, the returned awaitable resolves with on_receipt applied
+        to the receipt of its batch, or False after on_error if the call reverted.
+        """
+        item = BatchItem(function, on_receipt, on_error)
+        self.items.append(item)
+        if len(self.items) >= settings.RESPONSE_BATCH_SIZE:
+            self.flush()
+        elif not self.timer:
+            self.timer = asyncio.get_running_loop().call_later(
+                settings.RESPONSE_BATCH_MAX_WAIT, self.flush
+            )
+        return item.future
+
+    def flush(self) -> None:
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if not self.items:
+            return
+        items, self.items = self.items, []
+        task = asyncio.create_task(self._send(items))
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def _send(self, items: List[BatchItem]) -> None:
+        # the transaction stages are shared by every call of the batch
+        batch_trace = tracing.Trace()
+        tracing.set_trace(batch_trace)
+        try:
+            tx = await self.build_tx(
+                self.oracle_contract.functions.batchResponses(
+                    [item.data for item in items]
+                )
+            )
+            receipt = await self.send_tx(tx)
+            self.metrics[f"{self.name}_response_batches_sent"] += 1
+            self.metrics[f"{self.name}_responses_batched"] += len(items)
+            tx_receipt = await receipt
+            failed = self._get_failed_calls(tx_receipt)
+        except Exception as e:
+            print(f"Error sending batch of {len(items)} responses: {e}", flush=True)
+            for item in items:
+                _add_spans(item, batch_trace)
+                item.future.set_exception(e)
+            return
+        for index, item in enumerate(items):
+            _add_spans(item, batch_trace)
+            try:
+                if index in failed:
+                    self.metrics[f"{self.name}_batch_calls_failed"] += 1
+                    await item.on_error(
+                        ContractLogicError(
+                            f"{item.fn_name} reverted, return data: {failed[index].hex()}"
+                        )
+                    )
+                    item.future.set_result(False)
+                else:
+                    item.future.set_result(item.on_receipt(tx_receipt))
+            except Exception as e:
+                item.future.set_exception(e)
+
+    def _get_failed_calls(self, tx_receipt: TxReceipt) -> Dict[int, bytes]:
+        if not tx_receipt.get("status"):
+            # the whole batch reverted, every call sees the failed receipt
+            return {}
+        events = self.oracle_contract.events.BatchCallFailed().process_receipt(
+            tx_receipt, errors=DISCARD
+        )
+        return {event["args"]["index"]: event["args"]["reason"] for event in events}
+
+    def get_metrics(self):
+        return self.metrics
+
+
+def _add_spans(item: BatchItem, batch_trace: tracing.Trace) -> None:
+    if item.trace is not None:
+        item.trace.extend(batch_trace)
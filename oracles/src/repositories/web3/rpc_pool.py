@@ -0,0 +1,170 @@
+import asyncio
+import time
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Set
+
+from aiohttp import ClientSession
+from web3 import AsyncHTTPProvider
+from web3.types import RPCEndpoint
+from web3.types import RPCResponse
+
+import settings
+
+# weight of the newest sample in the latency and error rate averages
+EWMA_ALPHA = 0.2
+# how much a failing endpoint is penalised over a slow one
+ERROR_PENALTY = 10
+
+BROADCAST_METHODS = {"eth_sendRawTransaction"}
+
+
+class RpcEndpoint:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.provider = AsyncHTTPProvider(url)
+        # exponentially weighted moving averages, in seconds and failure ratio
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+
+    @property
+    def score(self) -> float:
+        """Lower is healthier, endpoints never measured are tried first."""
+        latency = self.latency or 0.0
+        return latency * (1 + ERROR_PENALTY * self.error_rate) + self.error_rate
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        started = time.monotonic()
+        try:
+            response = await self.provider.make_request(method, params)
+        except asyncio.CancelledError:
+            # the other side of a hedged read answered first
+            raise
+        except Exception as e:
+            self._record(time.monotonic() - started, failed=True)
+            raise e
+        self._record(time.monotonic() - started, failed=False)
+        return response
+
+    def _record(self, latency: float, failed: bool) -> None:
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += EWMA_ALPHA * (latency - self.latency)
+        self.error_rate += EWMA_ALPHA * ((1.0 if failed else 0.0) - self.error_rate)
+
+
+class PooledHTTPProvider(AsyncHTTPProvider):
+    """
+    Spreads requests over several RPC endpoints scored by latency and errors.
+    Reads go to the healthiest endpoint and fail over to the next one, a second
+    read is hedged on the runner up once RPC_HEDGE_AFTER seconds pass. Raw
+    transactions are broadcast to the RPC_BROADCAST_COUNT healthiest endpoints.
+    """
+
+    def __init__(self, urls: List[str]) -> None:
+        super().__init__(urls[0])
+        self.endpoints = [RpcEndpoint(url) for url in urls]
+        # broadcasts still running after the first node accepted the transaction
+        self.background_tasks: Set[asyncio.Task] = set()
+        self.metrics = {
+            "rpc_hedged_reads": 0,
+            "rpc_failovers": 0,
+            "rpc_broadcasts": 0,
+        }
+
+    async def cache_async_session(self, session: ClientSession) -> ClientSession:
+        for endpoint in self.endpoints:
+            await endpoint.provider.cache_async_session(session)
+        return await super().cache_async_session(session)
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if method in BROADCAST_METHODS:
+            return await self._broadcast(method, params)
+        return await self._read(method, params)
+
+    async def _read(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        endpoints = sorted(self.endpoints, key=lambda e: e.score)
+        tasks: List[asyncio.Task] = []
+        next_index = 0
+        error: Optional[BaseException] = None
+
+        def _start_next() -> None:
+            nonlocal next_index
+            endpoint = endpoints[next_index]
+            next_index += 1
+            tasks.append(asyncio.ensure_future(endpoint.make_request(method, params)))
+
+        _start_next()
+        try:
+            while tasks:
+                hedge_after = (
+                    settings.RPC_HEDGE_AFTER
+                    if settings.RPC_HEDGE_AFTER and next_index < len(endpoints)
+                    else None
+                )
+                done, _ = await asyncio.wait(
+                    tasks, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.metrics["rpc_hedged_reads"] += 1
+                    _start_next()
+                    continue
+                for task in done:
+                    tasks.remove(task)
+                    if not task.exception():
+                        return task.result()
+                    error = task.exception()
+                if not tasks and next_index < len(endpoints):
+                    self.metrics["rpc_failovers"] += 1
+                    _start_next()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+                task.add_done_callback(_retrieve_exception)
+
+    async def _broadcast(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        endpoints = sorted(self.endpoints, key=lambda e: e.score)
+        tasks = [
+            asyncio.ensure_future(endpoint.make_request(method, params))
+            for endpoint in endpoints[: max(1, settings.RPC_BROADCAST_COUNT)]
+        ]
+        self.metrics["rpc_broadcasts"] += 1
+        pending = set(tasks)
+        rejected: Optional[RPCResponse] = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception():
+                    continue
+                response = task.result()
+                if "error" not in response:
+                    # the other nodes keep propagating in the background
+                    for background_task in pending:
+                        self.background_tasks.add(background_task)
+                        background_task.add_done_callback(self.background_tasks.discard)
+                        background_task.add_done_callback(_retrieve_exception)
+                    return response
+                rejected = rejected or response
+        if rejected:
+            return rejected
+        raise tasks[0].exception()
+
+    def get_metrics(self):
+        metrics = self.metrics.copy()
+        for i, endpoint in enumerate(self.endpoints):
+            metrics[f"rpc_endpoint_{i}_latency_ms"] = round(
+                (endpoint.latency or 0.0) * 1000, 1
+            )
+            metrics[f"rpc_endpoint_{i}_error_rate"] = round(endpoint.error_rate, 3)
+        return metrics
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # failures of requests nobody waits for anymore are expected
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,93 @@
+import asyncio
+from itertools import cycle
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from eth_account.signers.local import LocalAccount
+from web3 import AsyncWeb3
+
+import settings
+from src.repositories.web3.nonce_manager import NonceManager
+
+
+class Signer:
+    def __init__(self, account: LocalAccount, nonce_manager: NonceManager) -> None:
+        self.account = account
+        self.nonce_manager = nonce_manager
+        self.transactions_sent = 0
+        self.balance = 0
+
+    @property
+    def address(self) -> str:
+        return self.account.address
+
+    @property
+    def pending(self) -> int:
+        """Transactions built with this signer that are not mined yet."""
+        return len(self.nonce_manager.in_flight)
+
+
+class SignerPool:
+    """
+    Spreads transactions over every whitelisted oracle key. Each signer keeps
+    its own nonce sequence, so transactions of different signers never wait on
+    each other. Signers are picked in turn, or the one with the fewest
+    transactions in flight with SIGNER_STRATEGY=least_pending. A worker of a
+    sharded oracle only signs with its own share of the keys.
+    """
+
+    def __init__(
+        self,
+        web3_client: AsyncWeb3,
+        private_keys: List[str],
+        get_nonce_manager: Callable[[str], NonceManager],
+    ) -> None:
+        self.web3_client = web3_client
+        self.signers: Dict[str, Signer] = {}
+        # position of each signer in private_keys, unique across workers
+        self.indexes: Dict[str, int] = {}
+        worker_index = settings.ORACLE_WORKER_INDEX or 0
+        for index, private_key in enumerate(private_keys):
+            if index % settings.ORACLE_WORKERS != worker_index:
+                continue
+            account = web3_client.eth.account.from_key(private_key)
+            self.signers[account.address] = Signer(
+                account, get_nonce_manager(account.address)
+            )
+            self.indexes[account.address] = index
+        if not self.signers:
+            raise ValueError(
+                f"No private key for oracle worker {worker_index}, "
+                f"{settings.ORACLE_WORKERS} workers need as many PRIVATE_KEYS"
+            )
+        self.turns = cycle(list(self.signers.values()))
+
+    def acquire(self) -> Signer:
+        if settings.SIGNER_STRATEGY == "least_pending":
+            return min(self.signers.values(), key=lambda signer: signer.pending)
+        return next(self.turns)
+
+    def get(self, address: str) -> Signer:
+        return self.signers[address]
+
+    async def run(self) -> None:
+        while True:
+            await self.update_balances()
+            await asyncio.sleep(settings.SIGNER_BALANCE_INTERVAL)
+
+    async def update_balances(self) -> None:
+        for signer in self.signers.values():
+            try:
+                signer.balance = await self.web3_client.eth.get_balance(signer.address)
+            except Exception as e:
+                print(f"Error getting balance of {signer.address}: {e}", flush=True)
+
+    def get_metrics(self):
+        metrics = {}
+        for signer in self.signers.values():
+            i = self.indexes[signer.address]
+            metrics[f"signer_{i}_transactions_sent"] = signer.transactions_sent
+            metrics[f"signer_{i}_pending"] = signer.pending
+            metrics[f"signer_{i}_balance_wei"] = signer.balance
+        return metrics
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import time
+from typing import Dict
+from typing import Optional
+
+import websockets
+from hexbytes import HexBytes
+from web3.contract import AsyncContract
+
+import settings
+from src.repositories.web3.event_discovery import REQUEST_EVENTS
+from src.repositories.web3.event_discovery import get_request_event_topics
+
+POLL_INTERVAL = 1
+
+
+class OracleSubscription:
+    """
+    Keeps a WebSocket subscription to new blocks and oracle logs open and wakes
+    up whoever is waiting for the event that was emitted. While the socket is
+    down waiting falls back to polling every POLL_INTERVAL seconds.
+    """
+
+    def __init__(self, ws_url: Optional[str], oracle_contract: AsyncContract):
+        self.ws_url = ws_url
+        self.oracle_address = oracle_contract.address
+        self.topics = get_request_event_topics(oracle_contract)
+        self.events: Dict[str, asyncio.Event] = {
+            name: asyncio.Event() for name in REQUEST_EVENTS
+        }
+        self.new_block = asyncio.Event()
+        self.latest_block_number: Optional[int] = None
+        self.is_connected = False
+
+    async def wait_for(self, event_name: str, wake_at: Optional[float] = None) -> None:
+        """
+        Waits until event_name is emitted by the oracle, or until the poll
+        interval passes, at the latest until the monotonic time wake_at.
+        """
+        event = self.events[event_name]
+        timeout = (
+            settings.WEB3_WS_IDLE_POLL_INTERVAL if self.is_connected else POLL_INTERVAL
+        )
+        if wake_at is not None:
+            timeout = max(0.0, min(timeout, wake_at - time.monotonic()))
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    async def run(self) -> None:
+        if not self.ws_url:
+            return
+        while True:
+            try:
+                await self._listen()
+            except Exception as e:
+                print(f"Oracle subscription dropped: {e}", flush=True)
+            finally:
+                self.is_connected = False
+                # wake everyone up to poll for what was missed while disconnected
+                for event in self.events.values():
+                    event.set()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    async def _listen(self) -> None:
+        async with websockets.connect(self.ws_url) as websocket:
+            await websocket.send(
+                json.dumps(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": 1,
+                        "method": "eth_subscribe",
+                        "params": ["newHeads"],
+                    }
+                )
+            )
+            await websocket.send(
+                json.dumps(
+                    {
+                        "jsonrpc": "2.0",
+                        "id": 2,
+                        "method": "eth_subscribe",
+                        "params": [
+                            "logs",
+                            {
+                                "address": self.oracle_address,
+                                "topics": [[topic.hex() for topic in self.topics]],
+                            },
+                        ],
+                    }
+                )
+            )
+            subscriptions = {}
+            while True:
+                # a silent connection is treated as dropped, blocks keep coming
+                message = json.loads(
+                    await asyncio.wait_for(
+                        websocket.recv(), settings.WEB3_WS_STALE_TIMEOUT
+                    )
+                )
+                if "error" in message:
+                    raise Exception(message["error"])
+                if message.get("id") in (1, 2):
+                    subscriptions[message["result"]] = message["id"]
+                    if len(subscriptions) == 2:
+                        print("Oracle subscription connected", flush=True)
+                        self.is_connected = True
+                    continue
+                params = message.get("params") or {}
+                result = params.get("result") or {}
+                if subscriptions.get(params.get("subscription")) == 1:
+                    self.latest_block_number = int(result["number"], 16)
+                    self.new_block.set()
+                    self.new_block.clear()
+                else:
+                    topics = result.get("topics") or []
+                    event_name = topics and self.topics.get(HexBytes(topics[0]))
+                    if event_name:
+                        self.events[event_name].set()
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Optional
+
+import settings
+from src.service.fair_queue import FairQueue
+
+# limit multiplier when the provider reports it is overloaded
+OVERLOAD_BACKOFF = 0.5
+# limit multiplier when latency rises above the baseline
+LATENCY_BACKOFF = 0.9
+# weight of the newest sample in the baseline latency
+BASELINE_ALPHA = 0.1
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted with additive increase, multiplicative decrease.
+    While the limit is reached and latency stays within
+    ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE times the baseline the limit grows by
+    about one per limit completions, rising latency shrinks it a little and
+    rate limiting halves it. The limit stays within [min_limit, max_limit].
+    Jobs waiting for a slot are admitted through a FairQueue.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        waiters: Optional[FairQueue] = None,
+    ) -> None:
+        self.min_limit = max(1, min(min_limit, initial))
+        self.max_limit = max(max_limit, initial)
+        self.limit = float(initial)
+        self.in_use = 0
+        self.waiters = waiters if waiters is not None else FairQueue()
+        # smoothed latency of the jobs that did not overload the provider
+        self.baseline: Optional[float] = None
+        self.decreases = 0
+
+    @property
+    def current(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self, flow: str = "", deadline: float = 0.0) -> None:
+        if self.in_use < self.current and not self.waiters:
+            self.in_use += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.push(flow, waiter, deadline)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over right before the cancellation
+                self.in_use -= 1
+                self._wake()
+            else:
+                self.waiters.discard(waiter)
+            raise
+
+    def release(self, latency: Optional[float], overloaded: bool = False) -> None:
+        """
+        Frees the slot, latency is None when the job failed for other reasons
+        than overload and says nothing about the provider.
+        """
+        self._adjust(latency, overloaded)
+        self.in_use -= 1
+        self._wake()
+
+    def _adjust(self, latency: Optional[float], overloaded: bool) -> None:
+        if overloaded:
+            self._decrease(OVERLOAD_BACKOFF)
+            return
+        if latency is None:
+            return
+        if self.baseline is None:
+            self.baseline = latency
+        if latency > self.baseline * settings.ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE:
+            self._decrease(LATENCY_BACKOFF)
+        elif self.waiters or self.in_use >= self.current:
+            # only widen a limit that is actually holding jobs back
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.baseline += BASELINE_ALPHA * (latency - self.baseline)
+
+    def _decrease(self, factor: float) -> None:
+        limit = max(self.min_limit, self.limit * factor)
+        if limit < self.limit:
+            self.decreases += 1
+        self.limit = limit
+
+    def _wake(self) -> None:
+        while self.waiters and self.in_use < self.current:
+            waiter = self.waiters.pop()
+            if waiter and not waiter.done():
+                self.in_use += 1
+                waiter.set_result(None)
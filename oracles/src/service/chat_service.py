@@ -1,69 +1,68 @@
-import asyncio
-from asyncio import Semaphore
+from typing import Awaitable
+from typing import List
 
+from src.domain import tracing
+from src.domain.deadline import DEADLINE_EXCEEDED_ERROR
+from src.domain.deadline import DeadlineExceeded
 from src.entities import Chat
 from src.domain.llm import generate_response_use_case
 from src.domain.storage import cache_ipfs_on_gcp_cache_use_case
 from src.repositories.ipfs_repository import IpfsRepository
 from src.repositories.web3.chat_repository import Web3ChatRepository
+from src.service.job_engine import JobHandler
 
-CHAT_TASKS = {}
 MAX_CONCURRENT_CHATS = 5
 
 
-async def execute(
-    repository: Web3ChatRepository,
-    ipfs_repository: IpfsRepository,
-):
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
-    while True:
-        try:
-            chats = await repository.get_unanswered_chats()
-            for chat in chats:
-                if chat.id not in CHAT_TASKS:
-                    task = asyncio.create_task(
-                        _answer_chat(repository, ipfs_repository, chat, semaphore)
-                    )
-                    CHAT_TASKS[chat.id] = task
-            completed_tasks = [
-                index for index, task in CHAT_TASKS.items() if task.done()
-            ]
-            for index in completed_tasks:
-                try:
-                    await CHAT_TASKS[index]
-                except Exception as e:
-                    print(f"Task for chat {index} raised an exception: {e}", flush=True)
-                del CHAT_TASKS[index]
-        except Exception as exc:
-            print(f"Chat loop raised an exception: {exc}", flush=True)
-        await asyncio.sleep(1)
+class ChatHandler(JobHandler[Chat]):
+    name = "chats"
+    event_name = "PromptAdded"
+    max_concurrency = MAX_CONCURRENT_CHATS
+
+    def __init__(
+        self, repository: Web3ChatRepository, ipfs_repository: IpfsRepository
+    ) -> None:
+        self.repository = repository
+        self.ipfs_repository = ipfs_repository
+
+    async def get_jobs(self) -> List[Chat]:
+        return await self.repository.get_unanswered_chats()
 
+    def get_flow(self, chat: Chat) -> str:
+        return chat.callback_address or ""
 
-async def _answer_chat(
-    repository: Web3ChatRepository,
-    ipfs_repository: IpfsRepository,
-    chat: Chat,
-    semaphore: Semaphore,
-):
-    try:
-        async with semaphore:
-            print(f"Answering chat {chat.id}", flush=True)
-            await _cache_ipfs_urls(chat, ipfs_repository)
-            if chat.response is None:
+    async def process(self, chat: Chat) -> Awaitable[bool]:
+        print(f"Answering chat {chat.id}", flush=True)
+        try:
+            with tracing.span("ipfs_cache"):
+                await _cache_ipfs_urls(chat, self.ipfs_repository)
+        except DeadlineExceeded:
+            # the LLM stage runs out of time as well and answers with the error
+            pass
+        if chat.response is None:
+            with tracing.span("llm"):
                 response = await generate_response_use_case.execute(
                     "gpt-4-turbo-preview", chat
                 )
-                chat.response = response.chat_completion
-                chat.error_message = response.error
+            chat.response = response.chat_completion
+            chat.error_message = response.error
+        return await self.repository.submit_chat_response(chat)
+
+    async def expire(self, chat: Chat) -> Awaitable[bool]:
+        print(f"Chat {chat.id} expired", flush=True)
+        if chat.response is None:
+            chat.error_message = DEADLINE_EXCEEDED_ERROR
+        return await self.repository.submit_chat_response(chat)
+
+    def on_done(self, chat: Chat, success: bool) -> None:
+        print(
+            f"Chat {chat.id} {'' if success else 'not '}"
+            f"replied, tx: {chat.transaction_receipt}",
+            flush=True,
+        )
 
-            success = await repository.send_chat_response(chat)
-            print(
-                f"Chat {chat.id} {'' if success else 'not '}"
-                f"replied, tx: {chat.transaction_receipt}",
-                flush=True,
-            )
-    except Exception as ex:
-        print(f"Failed to answer chat {chat.id}, exc: {ex}", flush=True)
+    def on_error(self, chat: Chat, error: Exception) -> None:
+        print(f"Failed to answer chat {chat.id}, exc: {error}", flush=True)
 
 
 async def _cache_ipfs_urls(chat: Chat, ipfs_repository: IpfsRepository):
@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import settings
+
+# seconds an idle flow keeps being reported in the metrics
+FLOW_STATS_WINDOW = 60
+
+
+class FlowStats:
+    def __init__(self) -> None:
+        self.queued = 0
+        self.served = 0
+        self.wait = 0.0
+        self.last_active = time.monotonic()
+
+
+class FairQueue:
+    """
+    Weighted fair queue of the jobs waiting for a concurrency slot. Each flow,
+    the callback contract of a job, is served in proportion to its
+    FAIR_QUEUE_WEIGHTS weight, 1 by default, however many jobs it queued. The
+    turn of a flow goes to its waiter with the earliest deadline.
+    """
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None) -> None:
+        if weights is None:
+            weights = parse_weights(settings.FAIR_QUEUE_WEIGHTS)
+        self.weights = weights
+        # start-time fair queueing, flows take turns by their virtual finish
+        self.heap: List[Tuple[float, int, float, str]] = []
+        self.queues: Dict[str, List[Tuple[float, int, asyncio.Future]]] = {}
+        self.entries: Dict[asyncio.Future, Tuple[str, float]] = {}
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+        self.flows: Dict[str, FlowStats] = {}
+        self.sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def push(self, flow: str, waiter: asyncio.Future, deadline: float = 0.0) -> None:
+        start = max(self.virtual_time, self.last_finish.get(flow, 0.0))
+        finish = start + 1 / self.weights.get(flow.lower(), 1.0)
+        self.last_finish[flow] = finish
+        sequence = next(self.sequence)
+        heapq.heappush(self.heap, (finish, sequence, start, flow))
+        heapq.heappush(self.queues.setdefault(flow, []), (deadline, sequence, waiter))
+        self.entries[waiter] = (flow, time.monotonic())
+        stats = self.flows.setdefault(flow, FlowStats())
+        stats.queued += 1
+        stats.last_active = time.monotonic()
+
+    def pop(self) -> Optional[asyncio.Future]:
+        """Returns the next waiter to serve, None when nobody is waiting."""
+        while self.heap:
+            _, _, start, flow = heapq.heappop(self.heap)
+            waiter = self._pop_earliest(flow)
+            if waiter is None:
+                # the turn of a waiter that was discarded after it was cancelled
+                continue
+            flow, enqueued = self.entries.pop(waiter)
+            self.virtual_time = max(self.virtual_time, start)
+            stats = self.flows[flow]
+            stats.queued -= 1
+            stats.served += 1
+            stats.wait += time.monotonic() - enqueued
+            stats.last_active = time.monotonic()
+            return waiter
+        return None
+
+    def _pop_earliest(self, flow: str) -> Optional[asyncio.Future]:
+        queue = self.queues.get(flow)
+        waiter = None
+        while queue and waiter is None:
+            _, _, waiter = heapq.heappop(queue)
+            if waiter not in self.entries:
+                waiter = None
+        if not queue:
+            self.queues.pop(flow, None)
+        return waiter
+
+    def discard(self, waiter: asyncio.Future) -> None:
+        entry = self.entries.pop(waiter, None)
+        if entry:
+            self.flows[entry[0]].queued -= 1
+
+    def get_metrics(self, name: str):
+        self._forget_idle_flows()
+        metrics = {f"{name}_queue_depth": len(self.entries)}
+        for flow, stats in self.flows.items():
+            label = flow or "unknown"
+            metrics[f"{name}_queue_depth_{label}"] = stats.queued
+            metrics[f"{name}_queue_avg_wait_s_{label}"] = (
+                round(stats.wait / stats.served, 3) if stats.served else 0.0
+            )
+        return metrics
+
+    def _forget_idle_flows(self) -> None:
+        idle_since = time.monotonic() - FLOW_STATS_WINDOW
+        for flow in list(self.flows):
+            stats = self.flows[flow]
+            if not stats.queued and stats.last_active < idle_since:
+                del self.flows[flow]
+        for flow in list(self.last_finish):
+            # an idle flow starts from the virtual time again anyway
+            if flow not in self.flows and self.last_finish[flow] <= self.virtual_time:
+                del self.last_finish[flow]
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """Parses "address=weight" entries separated by commas."""
+    weights = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        address, weight = entry.split("=")
+        weights[address.strip().lower()] = float(weight)
+    return weights
@@ -1,7 +1,10 @@
-import asyncio
-from asyncio import Semaphore
+from typing import Awaitable
+from typing import List
+from typing import Optional
 
 from src.entities import FunctionCall
+from src.domain import tracing
+from src.domain.deadline import DEADLINE_EXCEEDED_ERROR
 from src.domain.storage import reupload_url_to_gcp_use_case
 from src.domain.tools import utils
 from src.domain.tools.image_generation import generate_image_use_case
@@ -9,50 +12,31 @@ from src.domain.tools.search import web_search_use_case
 from src.domain.tools.code_interpreter import python_interpreter_use_case
 from src.entities import FunctionCall
 from src.repositories.web3.function_repository import Web3FunctionRepository
+from src.service.job_engine import JobHandler
 
-FUNCTION_TASKS = {}
 MAX_CONCURRENT_FUNCTION_CALLS = 5
 
 
-async def execute(repository: Web3FunctionRepository):
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FUNCTION_CALLS)
-    while True:
-        try:
-            function_calls = await repository.get_unanswered_function_calls()
-            for function_call in function_calls:
-                if function_call.id not in FUNCTION_TASKS:
-                    task = asyncio.create_task(
-                        _call_function(repository, function_call, semaphore)
-                    )
-                    FUNCTION_TASKS[function_call.id] = task
-            completed_tasks = [
-                index for index, task in FUNCTION_TASKS.items() if task.done()
-            ]
-            for index in completed_tasks:
-                try:
-                    await FUNCTION_TASKS[index]
-                except Exception as e:
-                    print(
-                        f"Task for function {index} raised an exception: {e}",
-                        flush=True,
-                    )
-                del FUNCTION_TASKS[index]
-        except Exception as exc:
-            print(f"Function loop raised an exception: {exc}", flush=True)
-        await asyncio.sleep(1)
+class FunctionCallHandler(JobHandler[FunctionCall]):
+    name = "functions"
+    event_name = "FunctionAdded"
+    max_concurrency = MAX_CONCURRENT_FUNCTION_CALLS
+
+    def __init__(self, repository: Web3FunctionRepository) -> None:
+        self.repository = repository
+
+    async def get_jobs(self) -> List[FunctionCall]:
+        return await self.repository.get_unanswered_function_calls()
 
+    def get_flow(self, function_call: FunctionCall) -> str:
+        return function_call.callback_address or ""
 
-async def _call_function(
-    repository: Web3FunctionRepository,
-    function_call: FunctionCall,
-    semaphore: Semaphore,
-):
-    try:
-        async with semaphore:
-            print(f"Calling function {function_call.id}", flush=True)
-            response = ""
-            error_message = ""
-            if function_call.response is None:
+    async def process(self, function_call: FunctionCall) -> Optional[Awaitable[bool]]:
+        print(f"Calling function {function_call.id}", flush=True)
+        response = ""
+        error_message = ""
+        if function_call.response is None:
+            with tracing.span("tool"):
                 formatted_input = utils.format_tool_input(function_call.function_input)
                 if function_call.function_type == "image_generation":
                     image = await generate_image_use_case.execute(formatted_input)
@@ -77,17 +61,32 @@ async def _call_function(
                 else:
                     response = ""
                     error_message = f"Unknown function '{function_call.function_type}'"
-                function_call.response = response
-                function_call.error_message = error_message
+            function_call.response = response
+            function_call.error_message = error_message
+
+        if function_call.is_processed:
+            return None
+        return await self.repository.submit_function_call_response(
+            function_call, function_call.response, function_call.error_message
+        )
+
+    async def expire(self, function_call: FunctionCall) -> Optional[Awaitable[bool]]:
+        print(f"Function {function_call.id} expired", flush=True)
+        if function_call.is_processed:
+            return None
+        if function_call.response is None:
+            function_call.response = ""
+            function_call.error_message = DEADLINE_EXCEEDED_ERROR
+        return await self.repository.submit_function_call_response(
+            function_call, function_call.response, function_call.error_message
+        )
+
+    def on_done(self, function_call: FunctionCall, success: bool) -> None:
+        print(
+            f"Function {function_call.id} {'' if success else 'not '}"
+            f"called, tx: {function_call.transaction_receipt}",
+            flush=True,
+        )
 
-            if not function_call.is_processed:
-                success = await repository.send_function_call_response(
-                    function_call, function_call.response, function_call.error_message
-                )
-                print(
-                    f"Function {function_call.id} {'' if success else 'not '}"
-                    f"called, tx: {function_call.transaction_receipt}",
-                    flush=True,
-                )
-    except Exception as ex:
-        print(f"Failed to call function {function_call.id}, exc: {ex}", flush=True)
+    def on_error(self, function_call: FunctionCall, error: Exception) -> None:
+        print(f"Failed to call function {function_call.id}, exc: {error}", flush=True)
@@ -0,0 +1,251 @@
+import asyncio
+import time
+from abc import ABC
+from abc import abstractmethod
+from collections import deque
+from typing import Awaitable
+from typing import Deque
+from typing import Dict
+from typing import Generic
+from typing import List
+from typing import Optional
+from typing import TypeVar
+
+import settings
+from src.domain import deadline
+from src.domain import tracing
+from src.domain.throttling import is_rate_limit_error
+from src.domain.throttling import watch_rate_limits
+from src.repositories.web3.subscription import OracleSubscription
+from src.service.adaptive_limiter import AdaptiveLimiter
+
+T = TypeVar("T")
+
+# window the jobs per minute throughput is measured over, in seconds
+THROUGHPUT_WINDOW = 60
+
+
+class JobHandler(ABC, Generic[T]):
+    """
+    Processes one type of oracle request. Jobs are the unanswered entities of
+    the type, identified by their id.
+    """
+
+    # prefix of the job type metrics
+    name: str
+    # oracle event emitted when a new job of this type is created
+    event_name: str
+    # starting concurrency, fixed unless ADAPTIVE_CONCURRENCY is enabled
+    max_concurrency: int = 5
+
+    @abstractmethod
+    async def get_jobs(self) -> List[T]:
+        """Returns every unanswered job, jobs already running are skipped."""
+
+    def get_deadline(self, job: T) -> float:
+        """Jobs are started earliest deadline first."""
+        return job.created_at + settings.JOB_DEADLINE
+
+    def get_flow(self, job: T) -> str:
+        """Jobs are queued fairly across flows, usually their callback contract."""
+        return ""
+
+    @abstractmethod
+    async def process(self, job: T) -> Optional[Awaitable[bool]]:
+        """
+        Runs the job while holding one of the concurrency slots and returns
+        once its response is broadcast, the returned awaitable resolves when the
+        response is mined. None when there is nothing left to send.
+        """
+
+    @abstractmethod
+    async def expire(self, job: T) -> Optional[Awaitable[bool]]:
+        """
+        Answers a job started after its deadline with DEADLINE_EXCEEDED_ERROR
+        instead of running it, which marks the request as done. Same contract
+        as process.
+        """
+
+    def on_done(self, job: T, success: bool) -> None:
+        pass
+
+    def on_error(self, job: T, error: Exception) -> None:
+        print(f"Failed to process {self.name} job {job.id}, exc: {error}", flush=True)
+
+
+class JobQueue(Generic[T]):
+    """Dispatch and retry state of a single job type."""
+
+    def __init__(self, handler: JobHandler[T]) -> None:
+        self.handler = handler
+        if settings.ADAPTIVE_CONCURRENCY:
+            self.limiter = AdaptiveLimiter(
+                handler.max_concurrency,
+                settings.ADAPTIVE_CONCURRENCY_MIN,
+                settings.ADAPTIVE_CONCURRENCY_MAX,
+            )
+        else:
+            self.limiter = AdaptiveLimiter(
+                handler.max_concurrency,
+                handler.max_concurrency,
+                handler.max_concurrency,
+            )
+        self.running: Dict[int, asyncio.Task] = {}
+        self.attempts: Dict[int, int] = {}
+        self.retry_at: Dict[int, float] = {}
+        self.completed_at: Deque[float] = deque()
+        self.metrics = {
+            "completed": 0,
+            "failed": 0,
+            "expired": 0,
+            "duration": 0.0,
+        }
+
+    def dispatch(self, jobs: List[T]) -> None:
+        now = time.monotonic()
+        if self.retry_at:
+            # jobs answered in the meantime are not retried anymore
+            ids = {job.id for job in jobs}
+            for job_id in [i for i in self.retry_at if i not in ids]:
+                del self.retry_at[job_id]
+                self.attempts.pop(job_id, None)
+        for job in sorted(jobs, key=self.handler.get_deadline):
+            if job.id in self.running or self.retry_at.get(job.id, 0) > now:
+                continue
+            task = asyncio.create_task(self._run(job))
+            self.running[job.id] = task
+            task.add_done_callback(lambda _, job_id=job.id: self._finish(job_id))
+
+    async def _run(self, job: T) -> None:
+        started = time.monotonic()
+        tracing.set_trace(job.trace)
+        try:
+            # the slot is freed as soon as the response is broadcast
+            response_mined = await self._process(job)
+            success = True
+            if response_mined is not None:
+                success = await response_mined
+                self.handler.on_done(job, success)
+        except Exception as e:
+            success = False
+            self.handler.on_error(job, e)
+        self._record(job.id, success, time.monotonic() - started)
+        tracing.tracer.finish(self.handler.name, job.id, job.trace, success)
+        # a retry is traced from scratch
+        job.trace = tracing.Trace()
+
+    async def _process(self, job: T) -> Optional[Awaitable[bool]]:
+        job_deadline = self.handler.get_deadline(job)
+        await self.limiter.acquire(self.handler.get_flow(job), job_deadline)
+        if settings.JOB_DEADLINE:
+            if job_deadline <= time.time():
+                # every stage would time out, retries keep the deadline as well
+                self.metrics["expired"] += 1
+                try:
+                    return await self.handler.expire(job)
+                finally:
+                    self.limiter.release(None, False)
+            # the IPFS, LLM and tool stages time out with the remaining budget
+            deadline.set_deadline(job_deadline)
+        rate_limits = watch_rate_limits()
+        started = time.monotonic()
+        latency: Optional[float] = None
+        overloaded = False
+        try:
+            response_mined = await self.handler.process(job)
+            latency = time.monotonic() - started
+            return response_mined
+        except Exception as e:
+            overloaded = is_rate_limit_error(e)
+            raise e
+        finally:
+            self.limiter.release(latency, overloaded or rate_limits.hits > 0)
+
+    def get_next_retry(self) -> Optional[float]:
+        """Monotonic time the next failed job is due to be retried at."""
+        return min(
+            (at for job_id, at in self.retry_at.items() if job_id not in self.running),
+            default=None,
+        )
+
+    def _finish(self, job_id: int) -> None:
+        self.running.pop(job_id, None)
+
+    def _record(self, job_id: int, success: bool, duration: float) -> None:
+        now = time.monotonic()
+        self.metrics["duration"] += duration
+        if success:
+            self.metrics["completed"] += 1
+            self.completed_at.append(now)
+            self.attempts.pop(job_id, None)
+            self.retry_at.pop(job_id, None)
+            return
+        self.metrics["failed"] += 1
+        attempts = self.attempts.get(job_id, 0) + 1
+        self.attempts[job_id] = attempts
+        self.retry_at[job_id] = now + min(
+            settings.JOB_RETRY_MAX_DELAY,
+            settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+        )
+
+    def get_metrics(self):
+        while (
+            self.completed_at
+            and self.completed_at[0] < time.monotonic() - THROUGHPUT_WINDOW
+        ):
+            self.completed_at.popleft()
+        finished = self.metrics["completed"] + self.metrics["failed"]
+        name = self.handler.name
+        return {
+            f"{name}_jobs_running": len(self.running),
+            f"{name}_jobs_retrying": len(self.retry_at),
+            f"{name}_jobs_completed": self.metrics["completed"],
+            f"{name}_jobs_failed": self.metrics["failed"],
+            f"{name}_jobs_expired": self.metrics["expired"],
+            f"{name}_jobs_per_minute": len(self.completed_at),
+            f"{name}_job_avg_duration_s": (
+                round(self.metrics["duration"] / finished, 3) if finished else 0.0
+            ),
+            f"{name}_concurrency_limit": self.limiter.current,
+            f"{name}_concurrency_decreases": self.limiter.decreases,
+            **self.limiter.waiters.get_metrics(name),
+        }
+
+
+class JobEngine:
+    """
+    Discovers the jobs of every registered handler, dispatches them within the
+    handler's concurrency limit and retries failed ones with an exponential
+    backoff of JOB_RETRY_DELAY seconds, up to JOB_RETRY_MAX_DELAY.
+    """
+
+    def __init__(self, subscription: Optional[OracleSubscription] = None) -> None:
+        self.subscription = subscription
+        self.queues: List[JobQueue] = []
+
+    def register(self, handler: JobHandler) -> None:
+        self.queues.append(JobQueue(handler))
+
+    async def run(self) -> None:
+        await asyncio.gather(*[self._discover(queue) for queue in self.queues])
+
+    async def _discover(self, queue: JobQueue) -> None:
+        handler = queue.handler
+        while True:
+            try:
+                queue.dispatch(await handler.get_jobs())
+            except Exception as exc:
+                print(f"{handler.name} loop raised an exception: {exc}", flush=True)
+            if self.subscription:
+                # a job waiting to be retried is not woken up by new events
+                await self.subscription.wait_for(
+                    handler.event_name, queue.get_next_retry()
+                )
+            else:
+                await asyncio.sleep(1)
+
+    def get_metrics(self):
+        metrics = {}
+        for queue in self.queues:
+            metrics.update(queue.get_metrics())
+        return metrics
@@ -1,74 +1,63 @@
-import asyncio
-from asyncio import Semaphore
+from typing import Awaitable
+from typing import List
 
 from src.entities import KnowledgeBaseQuery
+from src.domain import tracing
+from src.domain.deadline import DEADLINE_EXCEEDED_ERROR
 from src.domain.knowledge_base import query_knowledge_base_use_case
 from src.repositories.ipfs_repository import IpfsRepository
 from src.repositories.knowledge_base_repository import KnowledgeBaseRepository
 from src.repositories.web3.knowledge_base_repository import Web3KnowledgeBaseRepository
+from src.service.job_engine import JobHandler
 
-KB_QUERY_TASKS = {}
 MAX_CONCURRENT_KB_QUERIES = 5
 
 
-async def execute(
-    repository: Web3KnowledgeBaseRepository,
-    ipfs_repository: IpfsRepository,
-    kb_repository: KnowledgeBaseRepository,
-):
-    ipfs_repository = IpfsRepository()
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_KB_QUERIES)
-    while True:
-        try:
-            kb_queries = await repository.get_unanswered_kb_queries()
-            for kb_query in kb_queries:
-                if kb_query.id not in KB_QUERY_TASKS:
-                    print(
-                        f"Querying knowledge base {kb_query.id}, cid {kb_query.cid}, index_cid {kb_query.index_cid}"
-                    )
-                    task = asyncio.create_task(
-                        _query_knowledge_base(
-                            kb_query,
-                            repository,
-                            ipfs_repository,
-                            kb_repository,
-                            semaphore,
-                        )
-                    )
-                    KB_QUERY_TASKS[kb_query.id] = task
-            completed_tasks = [
-                query for query, task in KB_QUERY_TASKS.items() if task.done()
-            ]
-            for index in completed_tasks:
-                try:
-                    await KB_QUERY_TASKS[index]
-                except Exception as e:
-                    print(f"Task for kb query {index} raised an exception: {e}")
-                del KB_QUERY_TASKS[index]
-        except Exception as exc:
-            print(f"Kb query loop raised an exception: {exc}")
-        await asyncio.sleep(1)
+class KnowledgeBaseQueryHandler(JobHandler[KnowledgeBaseQuery]):
+    name = "knowledgebase_query"
+    event_name = "KnowledgeBaseQueryAdded"
+    max_concurrency = MAX_CONCURRENT_KB_QUERIES
 
+    def __init__(
+        self,
+        repository: Web3KnowledgeBaseRepository,
+        ipfs_repository: IpfsRepository,
+        kb_repository: KnowledgeBaseRepository,
+    ) -> None:
+        self.repository = repository
+        self.ipfs_repository = ipfs_repository
+        self.kb_repository = kb_repository
 
-async def _query_knowledge_base(
-    request: KnowledgeBaseQuery,
-    repository: Web3KnowledgeBaseRepository,
-    ipfs_repository: IpfsRepository,
-    kb_repository: KnowledgeBaseRepository,
-    semaphore: Semaphore,
-):
-    try:
-        async with semaphore:
+    async def get_jobs(self) -> List[KnowledgeBaseQuery]:
+        return await self.repository.get_unanswered_kb_queries()
+
+    def get_flow(self, request: KnowledgeBaseQuery) -> str:
+        return request.callback_address or ""
+
+    async def process(self, request: KnowledgeBaseQuery) -> Awaitable[bool]:
+        print(
+            f"Querying knowledge base {request.id}, cid {request.cid}, index_cid {request.index_cid}"
+        )
+        with tracing.span("knowledge_base"):
             query_result = await query_knowledge_base_use_case.execute(
-                request, ipfs_repository, kb_repository
+                request, self.ipfs_repository, self.kb_repository
             )
-            success = await repository.send_kb_query_response(
-                request, query_result.documents, error_message=query_result.error
-            )
-            print(
-                f"Knowledge base query {request.id} {'' if success else 'not '} answered, tx: {request.transaction_receipt}"
-            )
-    except Exception as ex:
+        return await self.repository.submit_kb_query_response(
+            request, query_result.documents, error_message=query_result.error
+        )
+
+    async def expire(self, request: KnowledgeBaseQuery) -> Awaitable[bool]:
+        print(f"Knowledge base query {request.id} expired")
+        return await self.repository.submit_kb_query_response(
+            request, [], error_message=DEADLINE_EXCEEDED_ERROR
+        )
+
+    def on_done(self, request: KnowledgeBaseQuery, success: bool) -> None:
+        print(
+            f"Knowledge base query {request.id} {'' if success else 'not '} answered, tx: {request.transaction_receipt}"
+        )
+
+    def on_error(self, request: KnowledgeBaseQuery, error: Exception) -> None:
         print(
-            f"Failed to query knowledge base {request.id}, cid {request.index_cid}, exc: {ex}"
+            f"Failed to query knowledge base {request.id}, cid {request.index_cid}, exc: {error}"
         )
@@ -0,0 +1,156 @@
+import asyncio
+import math
+import re
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from aiohttp import web
+
+import settings
+from src.domain.tracing import LatencyHistogram
+
+# every exposed metric name starts with it
+PREFIX = "oracle_"
+# metrics that only grow, exposed as counters with a _total suffix
+COUNTER_SUFFIXES = (
+    "errors",
+    "_sent",
+    "_read",
+    "_answered",
+    "_marked_as_done",
+    "_completed",
+    "_failed",
+    "_expired",
+    "_decreases",
+    "_batched",
+    "_restarted",
+    "_held",
+    "_rate_limit_wait_s",
+    "_hits",
+    "_misses",
+    "_evictions",
+    "_updates",
+    "_fallbacks",
+    "_capped",
+    "_created",
+    "_reused",
+    "_broadcasts",
+    "_failovers",
+    "_hedged_reads",
+)
+
+# flat metrics kept per signer, RPC endpoint or callback contract, exposed as
+# one metric with the instance as a label: (key pattern, name, label)
+LABELLED_METRICS = [
+    (re.compile(r"^signer_(?P<label>\d+)_(.+)$"), r"signer_\2", "signer"),
+    (re.compile(r"^rpc_endpoint_(?P<label>\d+)_(.+)$"), r"rpc_endpoint_\2", "endpoint"),
+    (
+        re.compile(
+            r"^(.+)_queue_(depth|avg_wait_s)_(?P<label>0x[0-9a-fA-F]+|unknown)$"
+        ),
+        r"\1_flow_queue_\2",
+        "flow",
+    ),
+]
+
+Histogram = Tuple[str, Dict[str, str], LatencyHistogram]
+
+
+class MetricsServer:
+    """
+    Serves the oracle metrics on /metrics in the Prometheus text format. Flat
+    metrics are exposed as counters or gauges, latency histograms with their
+    buckets.
+    """
+
+    def __init__(
+        self,
+        get_metrics: Callable[[], Dict[str, float]],
+        get_histograms: Callable[[], List[Histogram]],
+        host: str = settings.METRICS_HOST,
+        port: int = settings.METRICS_PORT,
+    ) -> None:
+        self.get_metrics = get_metrics
+        self.get_histograms = get_histograms
+        self.host = host
+        self.port = port
+
+    async def run(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+            print(f"Serving metrics on {self.host}:{self.port}", flush=True)
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        text = format_metrics(self.get_metrics(), self.get_histograms())
+        return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
+
+def format_metrics(metrics: Dict[str, float], histograms: List[Histogram]) -> str:
+    samples: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+    for key, value in metrics.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name, labels = _split_labels(key)
+        samples.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, values in samples.items():
+        if name.endswith(COUNTER_SUFFIXES):
+            name = PREFIX + _sanitize(name) + "_total"
+            lines.append(f"# TYPE {name} counter")
+        else:
+            name = PREFIX + _sanitize(name)
+            lines.append(f"# TYPE {name} gauge")
+        for labels, value in values:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    typed = set()
+    for key, labels, histogram in sorted(histograms, key=lambda h: h[0]):
+        name = PREFIX + _sanitize(key)
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            le = "+Inf" if math.isinf(bound) else _format_value(bound)
+            bucket_labels = _format_labels({**labels, "le": le})
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        label_text = _format_labels(labels)
+        lines.append(f"{name}_sum{label_text} {_format_value(histogram.sum)}")
+        lines.append(f"{name}_count{label_text} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+
+def _split_labels(key: str) -> Tuple[str, Dict[str, str]]:
+    for pattern, name, label in LABELLED_METRICS:
+        match = pattern.match(key)
+        if match:
+            return match.expand(name), {label: match.group("label")}
+    return key, {}
+
+
+def _sanitize(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    values = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + values + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import sys
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import settings
+
+# metrics files written by every oracle process, merged by the supervisor
+METRICS_FILES = ["metrics.json", "component_metrics.json"]
+# seconds before a worker that exited is started again
+WORKER_RESTART_DELAY = 5
+# seconds between two merges of the worker metrics
+METRICS_INTERVAL = 10
+
+
+class Supervisor:
+    """
+    Runs ORACLE_WORKERS oracle processes. Worker i answers the requests whose
+    id modulo the number of workers is i and signs with every ORACLE_WORKERS-th
+    private key starting from the i-th, so workers never share a nonce
+    sequence. Workers that exit are started again, their metrics files are
+    merged into the usual ones.
+    """
+
+    def __init__(self, script: str, workers: int = settings.ORACLE_WORKERS) -> None:
+        if len(settings.PRIVATE_KEYS) < workers:
+            raise ValueError(
+                f"{workers} oracle workers need at least as many PRIVATE_KEYS"
+            )
+        self.script = script
+        self.workers = workers
+        self.processes: Dict[int, asyncio.subprocess.Process] = {}
+        self.metrics = {
+            "workers_restarted": 0,
+        }
+
+    async def run(self) -> None:
+        await asyncio.gather(
+            *[self._run_worker(index) for index in range(self.workers)],
+            self._merge_metrics_files(),
+        )
+
+    async def _run_worker(self, index: int) -> None:
+        env = {
+            **os.environ,
+            "ORACLE_WORKERS": str(self.workers),
+            "ORACLE_WORKER_INDEX": str(index),
+        }
+        while True:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, self.script, env=env
+            )
+            self.processes[index] = process
+            try:
+                return_code = await process.wait()
+            finally:
+                if process.returncode is None:
+                    process.terminate()
+            print(
+                f"Oracle worker {index} exited with {return_code}, restarting",
+                flush=True,
+            )
+            self.metrics["workers_restarted"] += 1
+            await asyncio.sleep(WORKER_RESTART_DELAY)
+
+    async def _merge_metrics_files(self) -> None:
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL)
+            for name in METRICS_FILES:
+                worker_metrics = [
+                    metrics
+                    for index in range(self.workers)
+                    if (metrics := _read_json(get_worker_path(name, index)))
+                ]
+                merged = merge_metrics(worker_metrics)
+                if name == "component_metrics.json":
+                    merged.update(self.get_metrics())
+                with open(name, "w") as f:
+                    json.dump(merged, f)
+
+    def get_metrics(self):
+        return {
+            "workers_running": sum(
+                process.returncode is None for process in self.processes.values()
+            ),
+            "workers_restarted": self.metrics["workers_restarted"],
+        }
+
+
+def get_worker_path(name: str, index: Optional[int]) -> str:
+    """Path of a metrics file of the given worker, name itself when unsharded."""
+    if index is None:
+        return name
+    base, extension = os.path.splitext(name)
+    return f"{base}.{index}{extension}"
+
+
+def merge_metrics(worker_metrics: List[Dict]) -> Dict:
+    """
+    Adds up the worker metrics. Request counts read from the chain are the
+    same for every worker and averages, latency percentiles and rates are
+    averaged instead.
+    """
+    merged = {}
+    for key in dict.fromkeys(key for metrics in worker_metrics for key in metrics):
+        values = [metrics[key] for metrics in worker_metrics if key in metrics]
+        if key.endswith("_count"):
+            merged[key] = max(values)
+        elif "_avg_" in key or "_latency_p" in key or key.endswith("_rate"):
+            merged[key] = round(sum(values) / len(values), 3)
+        else:
+            merged[key] = sum(values)
+    return merged
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
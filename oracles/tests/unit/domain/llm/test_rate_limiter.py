@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from src.domain.llm import rate_limiter
+from src.domain.llm.rate_limiter import RateLimiter
+
+
+def _limiter(config: str) -> RateLimiter:
+    limiter = RateLimiter()
+    limiter.config = rate_limiter.parse_rate_limits(config)
+    return limiter
+
+
+def test_parse_rate_limits():
+    assert rate_limiter.parse_rate_limits(
+        "openai=500:30000, groq/llama3-70b-8192=30:0"
+    ) == {"openai": (500, 30000), "groq/llama3-70b-8192": (30, 0)}
+    assert rate_limiter.parse_rate_limits("") == {}
+
+
+def test_estimate_tokens():
+    messages = [
+        {"role": "system", "content": "a" * 40},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "b" * 20},
+                {"type": "image_url", "image_url": {"url": "https://x"}},
+            ],
+        },
+    ]
+    assert rate_limiter.estimate_tokens(messages, 100) == 10 + 5 + 765 + 100
+
+
+@pytest.mark.asyncio
+async def test_unconfigured_model_not_limited():
+    limiter = _limiter("groq=1:1")
+
+    reservation = await limiter.reserve("openai", "gpt-4o", [], 10)
+
+    assert reservation.limits is None
+    assert limiter.metrics["llm_requests_held"] == 0
+
+
+@pytest.mark.asyncio
+async def test_request_held_when_budget_exhausted():
+    limiter = _limiter("openai/gpt-4o=1:0")
+    await limiter.reserve("openai", "gpt-4o", [], 10)
+
+    waiter = asyncio.create_task(limiter.reserve("openai", "gpt-4o", [], 10))
+    await asyncio.sleep(0.05)
+
+    assert not waiter.done()
+    assert limiter.metrics["llm_requests_held"] == 1
+    waiter.cancel()
+
+
+@pytest.mark.asyncio
+async def test_provider_limits_applied_per_model():
+    limiter = _limiter("openai=1:0")
+    await limiter.reserve("openai", "gpt-4o", [], 10)
+
+    await asyncio.wait_for(limiter.reserve("openai", "gpt-4-turbo", [], 10), 1)
+
+    assert limiter.metrics["llm_requests_held"] == 0
+
+
+@pytest.mark.asyncio
+async def test_estimate_corrected_with_usage():
+    limiter = _limiter("openai=0:1000")
+
+    reservation = await limiter.reserve("openai", "gpt-4o", [], 500)
+    async with reservation:
+        reservation.used_tokens = 100
+
+    assert reservation.limits.tokens.tokens == pytest.approx(900, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_estimate_refunded_when_call_fails():
+    limiter = _limiter("openai=0:1000")
+
+    reservation = await limiter.reserve("openai", "gpt-4o", [], 500)
+    with pytest.raises(ValueError):
+        async with reservation:
+            raise ValueError("rejected")
+
+    assert reservation.limits.tokens.tokens == pytest.approx(1000, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_call_duration_recorded_per_model():
+    limiter = _limiter("")
+
+    async with await limiter.reserve("openai", "gpt-4o", [], 10):
+        await asyncio.sleep(0.01)
+    async with await limiter.reserve("groq", "llama3-8b-8192", [], 10):
+        pass
+
+    histograms = {labels["model"]: h for _, labels, h in limiter.get_histograms()}
+    assert histograms["gpt-4o"].count == 1
+    assert histograms["gpt-4o"].sum >= 0.01
+    assert histograms["llama3-8b-8192"].count == 1
@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.domain import deadline
+
+
+@pytest.mark.asyncio
+async def test_timeout_capped_at_remaining_budget():
+    async def stage():
+        deadline.set_deadline(time.time() + 5)
+        return deadline.get_timeout(600), deadline.get_http_timeout(
+            httpx.Timeout(timeout=600.0, connect=10.0)
+        )
+
+    timeout, http_timeout = await asyncio.create_task(stage())
+
+    assert 4 < timeout <= 5
+    assert 4 < http_timeout.read <= 5
+    assert 4 < http_timeout.connect <= 5
+    # the deadline only applies to the task that set it
+    assert deadline.get_timeout(600) == 600
+
+
+@pytest.mark.asyncio
+async def test_exhausted_budget_fails_fast():
+    async def stage():
+        deadline.set_deadline(time.time() - 1)
+        deadline.get_timeout(None)
+
+    with pytest.raises(deadline.DeadlineExceeded):
+        await asyncio.create_task(stage())
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from src.domain import tracing
+from src.domain.tracing import LatencyHistogram
+from src.domain.tracing import Trace
+from src.domain.tracing import Tracer
+
+
+def test_span_recorded_on_current_trace():
+    trace = Trace()
+    tracing.set_trace(trace)
+    try:
+        with tracing.span("tx_sign"):
+            pass
+    finally:
+        tracing.set_trace(None)
+
+    assert [stage for stage, _, _ in trace.spans] == ["tx_sign"]
+
+
+def test_span_without_trace_ignored():
+    with tracing.span("tx_sign"):
+        pass
+
+
+def test_span_recorded_when_stage_fails():
+    trace = Trace()
+    tracing.set_trace(trace)
+    try:
+        with pytest.raises(ValueError):
+            with tracing.span("llm"):
+                raise ValueError("failed")
+    finally:
+        tracing.set_trace(None)
+
+    assert len(trace.spans) == 1
+
+
+def test_histogram_quantiles():
+    histogram = LatencyHistogram(buckets=(1, 2, 4, float("inf")))
+    for value in [0.5] * 50 + [1.5] * 45 + [3] * 4 + [10]:
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == 1
+    assert 1 < histogram.quantile(0.95) <= 2
+    assert 2 < histogram.quantile(0.99) <= 4
+    assert LatencyHistogram().quantile(0.5) == 0.0
+
+
+def test_histogram_open_bucket_reports_its_lower_bound():
+    histogram = LatencyHistogram(buckets=(1, float("inf")))
+    histogram.observe(30)
+
+    assert histogram.quantile(0.99) == 1
+
+
+def test_tracer_metrics_per_job_type_and_stage():
+    tracer = Tracer(path=None)
+    trace = Trace()
+    trace.add("hydration", 0.2)
+    trace.add("tx_receipt", 3)
+    tracer.finish("chats", 1, trace, True)
+
+    metrics = tracer.get_metrics()
+
+    assert 0.1 < metrics["chats_hydration_latency_p50_s"] <= 0.25
+    assert 2.5 < metrics["chats_tx_receipt_latency_p99_s"] <= 5
+    assert len(metrics) == 6
+    assert [labels for _, labels, _ in tracer.get_histograms()] == [
+        {"job": "chats", "stage": "hydration"},
+        {"job": "chats", "stage": "tx_receipt"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_tracer_writes_json_lines_on_flush(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(path=str(path))
+    trace = Trace()
+    trace.add("llm", 1.5, start=100)
+    tracer.finish("chats", 7, trace, False)
+    tracer.finish("functions", 8, Trace(), True)
+
+    assert not path.exists()
+    await tracer.flush()
+    await tracer.flush()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+
+    assert len(lines) == 2
+    assert lines[0] == {
+        "type": "chats",
+        "id": 7,
+        "success": False,
+        "spans": [{"stage": "llm", "start": 100, "duration": 1.5}],
+    }
+    assert lines[1]["spans"] == []
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.repositories.web3.read_cache import ReadCache
+
+
+class FakeCall:
+    def __init__(self, reads, fn_name, args, value):
+        self.reads = reads
+        self.fn_name = fn_name
+        self.args = args
+        self.value = value
+
+    async def call(self):
+        self.reads.append(self.fn_name)
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+class FakeFunctions:
+    """Contract getters returning the values keyed by (function, *args)."""
+
+    def __init__(self, values):
+        self.values = values
+        self.reads = []
+
+    def __getattr__(self, fn_name):
+        return lambda *args: FakeCall(
+            self.reads, fn_name, args, self.values.get((fn_name, *args))
+        )
+
+
+class FakeMulticall:
+    """Returns reverting calls as exceptions in place, the first failures fail."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.aggregated = []
+
+    async def aggregate(self, calls):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("multicall unavailable")
+        self.aggregated.append([call.fn_name for call in calls])
+        return [call.value for call in calls]
+
+
+def get_fields(entity):
+    """Fields of the entity that come from the chain."""
+    return {
+        key: value
+        for key, value in vars(entity).items()
+        if key not in ("created_at", "trace")
+    }
+
+
+@pytest.fixture
+def get_chain_client():
+    """
+    Builds a chain client for the repositories whose oracle contract getters
+    return the given values, read one by one or through a fake multicall.
+    """
+
+    def get(values, failures: int = 0):
+        return SimpleNamespace(
+            web3_client=None,
+            signers=None,
+            receipt_tracker=None,
+            fee_oracle=None,
+            checkpoint=None,
+            oracle_contract=SimpleNamespace(functions=FakeFunctions(values)),
+            multicall=FakeMulticall(failures),
+            read_cache=ReadCache(0),
+            event_discovery=None,
+        )
+
+    return get
@@ -0,0 +1,216 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+
+import pytest
+
+from src.domain.tracing import Trace
+from src.repositories.web3.base import Web3BaseRepository
+from src.repositories.web3.base import count_own_requests
+from src.repositories.web3.checkpoint import Checkpoint
+from src.repositories.web3.nonce_manager import NonceManager
+
+
+def _get_repository(read_batch_size: int = 1) -> Web3BaseRepository:
+    repository = Web3BaseRepository.__new__(Web3BaseRepository)
+    repository.read_batch_size = read_batch_size
+    repository.metrics = {"transactions_sent": 0, "errors": 0}
+    return repository
+
+
+def _get_entities(ids):
+    return [SimpleNamespace(id=i, trace=Trace()) for i in ids]
+
+
+@pytest.mark.asyncio
+async def test_read_in_order_yields_every_entity_in_order():
+    repository = _get_repository(read_batch_size=3)
+
+    async def read(ids):
+        # later batches finish first
+        await asyncio.sleep(0.01 * (10 - ids[0]))
+        return _get_entities(ids)
+
+    with patch("settings.INDEXING_CONCURRENCY", 4):
+        result = [item async for item in repository._read_in_order(2, 12, read)]
+
+    assert [(i, entity.id) for i, entity in result] == [(i, i) for i in range(2, 12)]
+    for _, entity in result:
+        assert [stage for stage, _, _ in entity.trace.spans] == ["hydration"]
+
+
+@pytest.mark.asyncio
+async def test_read_in_order_reads_only_own_shard():
+    repository = _get_repository(read_batch_size=2)
+    read_ids = []
+
+    async def read(ids):
+        read_ids.append(ids)
+        return _get_entities(ids)
+
+    with patch("settings.ORACLE_WORKERS", 3), patch("settings.ORACLE_WORKER_INDEX", 1):
+        result = [item async for item in repository._read_in_order(0, 12, read)]
+
+    assert read_ids == [[1, 4], [7, 10]]
+    assert [i for i, _ in result] == [1, 4, 7, 10]
+
+
+def test_count_own_requests():
+    assert count_own_requests(10) == 10
+    with patch("settings.ORACLE_WORKERS", 3), patch("settings.ORACLE_WORKER_INDEX", 1):
+        assert count_own_requests(10) == 3
+        assert count_own_requests(1) == 0
+
+
+@pytest.mark.asyncio
+async def test_read_in_order_limits_batches_in_flight():
+    repository = _get_repository()
+    in_flight = 0
+    max_in_flight = 0
+
+    async def read(ids):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return _get_entities(ids)
+
+    with patch("settings.INDEXING_CONCURRENCY", 3):
+        result = [item async for item in repository._read_in_order(0, 10, read)]
+
+    assert len(result) == 10
+    assert max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_read_in_order_stops_before_failed_batch():
+    repository = _get_repository()
+    read_ids = []
+
+    async def read(ids):
+        if ids[0] == 3:
+            raise Exception("RPC error")
+        return _get_entities(ids)
+
+    with patch("settings.INDEXING_CONCURRENCY", 4):
+        with pytest.raises(Exception, match="RPC error"):
+            async for i, _ in repository._read_in_order(0, 10, read):
+                read_ids.append(i)
+
+    assert read_ids == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_find_resume_point_uses_checkpoint(tmp_path):
+    repository = _get_repository(read_batch_size=2)
+    repository.checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), "test")
+    await repository.checkpoint.save("chats", 10, [4, 7, 8])
+
+    async def is_processed(index):
+        raise AssertionError("binary search should not run")
+
+    async def read(ids):
+        return [SimpleNamespace(id=i) if i != 7 else None for i in ids]
+
+    last_count, entities = await repository._find_resume_point(
+        "chats", 12, is_processed, read
+    )
+
+    assert last_count == 10
+    assert [entity.id for entity in entities] == [4, 8]
+
+
+@pytest.mark.asyncio
+async def test_find_resume_point_ignores_checkpoint_ahead_of_chain(tmp_path):
+    repository = _get_repository()
+    repository.checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), "test")
+    await repository.checkpoint.save("chats", 10, [])
+
+    async def is_processed(index):
+        return index < 3
+
+    last_count, entities = await repository._find_resume_point(
+        "chats", 5, is_processed, None
+    )
+
+    assert last_count == 3
+    assert entities == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fanout", [1, 2, 8])
+@pytest.mark.parametrize("first_unprocessed", [0, 1, 500, 999, 1000])
+async def test_find_first_unprocessed(fanout, first_unprocessed):
+    repository = _get_repository()
+
+    async def is_processed(index):
+        return index < first_unprocessed
+
+    with patch("settings.COLD_START_SEARCH_FANOUT", fanout):
+        result = await repository._find_first_unprocessed(1000, is_processed)
+
+    assert result == first_unprocessed
+
+
+@pytest.mark.asyncio
+async def test_find_first_unprocessed_takes_fewer_rounds_with_fanout():
+    repository = _get_repository()
+    rounds = 0
+    in_round = False
+
+    async def is_processed(index):
+        nonlocal rounds, in_round
+        if not in_round:
+            in_round = True
+            rounds += 1
+        await asyncio.sleep(0)
+        in_round = False
+        return index < 123456
+
+    with patch("settings.COLD_START_SEARCH_FANOUT", 15):
+        result = await repository._find_first_unprocessed(1000000, is_processed)
+
+    assert result == 123456
+    assert rounds <= 6
+
+
+@pytest.mark.asyncio
+async def test_find_first_unprocessed_does_not_skip_unreadable_index():
+    repository = _get_repository()
+    attempts = {}
+
+    async def is_processed(index):
+        attempts[index] = attempts.get(index, 0) + 1
+        if index == 4:
+            raise Exception("unreadable")
+        return index < 6
+
+    with patch("settings.COLD_START_SEARCH_FANOUT", 2):
+        result = await repository._find_first_unprocessed(
+            10, is_processed, max_retries=2
+        )
+
+    # the unreadable index is checked again by the indexer instead of skipped
+    assert result == 4
+    assert attempts[4] == 2
+
+
+@pytest.mark.asyncio
+async def test_receipt_timeout_frees_nonce():
+    repository = _get_repository()
+    web3_client = AsyncMock()
+    web3_client.eth.get_transaction_count.return_value = 0
+    nonce_manager = NonceManager(web3_client, "0x0")
+    signer = SimpleNamespace(nonce_manager=nonce_manager)
+    nonce = await nonce_manager.get_nonce()
+
+    async def receipt():
+        raise asyncio.TimeoutError()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await repository._wait_for_receipt(signer, {"nonce": nonce}, receipt())
+
+    assert nonce_manager.in_flight == set()
+    assert repository.metrics == {"transactions_sent": 1, "errors": 1}
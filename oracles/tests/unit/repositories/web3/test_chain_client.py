@@ -0,0 +1,65 @@
+import pytest
+from aiohttp import web
+
+import settings
+from src.repositories.web3.chain_client import ChainClient
+
+ORACLE_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+# first hardhat development account
+PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+
+
+@pytest.fixture
+def chain_client(monkeypatch):
+    monkeypatch.setattr(settings, "ORACLE_ADDRESS", ORACLE_ADDRESS)
+    monkeypatch.setattr(settings, "MULTICALL_ADDRESS", None)
+    monkeypatch.setattr(settings, "CHECKPOINT_PATH", None)
+    monkeypatch.setattr(settings, "PRIVATE_KEYS", [PRIVATE_KEY])
+
+    def _get_chain_client(rpc_url: str = "http://127.0.0.1:8545") -> ChainClient:
+        return ChainClient([rpc_url])
+
+    return _get_chain_client
+
+
+def test_contracts_are_built_once(chain_client):
+    client = chain_client()
+
+    contract = client.get_contract(settings.ORACLE_ABI_PATH, ORACLE_ADDRESS)
+
+    assert contract is client.oracle_contract
+    assert list(client.abis) == [settings.ORACLE_ABI_PATH]
+
+
+def test_nonce_managers_are_shared_per_address(chain_client):
+    client = chain_client()
+
+    assert client.get_nonce_manager(ORACLE_ADDRESS) is client.get_nonce_manager(
+        ORACLE_ADDRESS
+    )
+
+
+@pytest.mark.asyncio
+async def test_connections_are_reused(chain_client):
+    async def handle(request):
+        body = await request.json()
+        return web.json_response({"jsonrpc": "2.0", "id": body["id"], "result": "0x2a"})
+
+    app = web.Application()
+    app.router.add_post("/", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    client = chain_client(f"http://127.0.0.1:{port}/")
+    try:
+        await client.connect()
+        for _ in range(3):
+            assert await client.web3_client.eth.block_number == 42
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+    assert client.metrics["rpc_connections_created"] == 1
+    assert client.metrics["rpc_connections_reused"] == 2
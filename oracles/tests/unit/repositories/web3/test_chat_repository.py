@@ -0,0 +1,86 @@
+import pytest
+from web3.exceptions import ContractLogicError
+
+from src.entities import PromptType
+from conftest import get_fields
+from src.repositories.web3.chat_repository import Web3ChatRepository
+
+
+def _get_history(content):
+    return [("user", [("text", content)])]
+
+
+def _get_values(ids):
+    values = {}
+    for i in ids:
+        values.update(
+            {
+                ("promptCallbackIds", i): 10 + i,
+                ("promptType", i): "",
+                ("isPromptProcessed", i): False,
+                ("callbackAddresses", i): f"0xcallback{i}",
+                # no model set, the chat runs without a configuration
+                ("llmConfigurations", i): ("",) + ("", 0) * 6,
+                ("getMessagesAndRoles", i, 10 + i): _get_history(f"chat {i}"),
+            }
+        )
+    return values
+
+
+@pytest.mark.asyncio
+async def test_aggregated_chats_match_single_reads(get_chain_client):
+    repository = Web3ChatRepository(get_chain_client(_get_values([1, 2])))
+
+    chats = await repository._get_chats_aggregated([1, 2])
+
+    for chat in chats:
+        assert get_fields(chat) == get_fields(await repository._get_chat(chat.id))
+    assert chats[0].callback_id == 11
+    assert chats[0].callback_address == "0xcallback1"
+    assert chats[0].prompt_type == PromptType.DEFAULT
+    assert chats[0].messages == [
+        {"role": "user", "content": [{"type": "text", "text": "chat 1"}]}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_aggregated_reverting_chat_is_none(get_chain_client):
+    values = _get_values([1, 2, 3])
+    values[("callbackAddresses", 2)] = ContractLogicError("reverted")
+    repository = Web3ChatRepository(get_chain_client(values))
+
+    chats = await repository._get_chats_aggregated([1, 2, 3])
+
+    assert [chat and chat.id for chat in chats] == [1, None, 3]
+    assert repository.metrics["chats_configuration_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_aggregated_chat_history_falls_back_to_legacy_getters(
+    get_chain_client,
+):
+    values = _get_values([1, 2, 3])
+    values[("getMessagesAndRoles", 2, 12)] = ContractLogicError("reverted")
+    values[("getMessages", 2, 12)] = ["hello"]
+    values[("getRoles", 2, 12)] = ["user"]
+    values[("getMessagesAndRoles", 3, 13)] = ContractLogicError("reverted")
+    values[("getMessages", 3, 13)] = ContractLogicError("reverted")
+    values[("getRoles", 3, 13)] = ["user"]
+    repository = Web3ChatRepository(get_chain_client(values))
+
+    chats = await repository._get_chats_aggregated([1, 2, 3])
+
+    assert chats[1].messages == [{"role": "user", "content": "hello"}]
+    assert chats[2] is None
+    assert repository.multicall.aggregated[-1] == ["getMessages", "getRoles"] * 2
+    assert repository.metrics["chats_history_read_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_aggregate_falls_back_to_single_reads(get_chain_client):
+    repository = Web3ChatRepository(get_chain_client(_get_values([1, 2]), failures=1))
+
+    chats = await repository._get_chats([1, 2])
+
+    assert [chat.id for chat in chats] == [1, 2]
+    assert repository.oracle_contract.functions.reads.count("promptCallbackIds") == 2
@@ -0,0 +1,36 @@
+import pytest
+
+from src.repositories.web3.checkpoint import Checkpoint
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_survives_restart(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    await Checkpoint(path, "31337:0xoracle").save("chats", 5, [4, 2])
+
+    checkpoint = Checkpoint(path, "31337:0xoracle")
+
+    assert checkpoint.get("chats") == {"last_count": 5, "in_flight": [2, 4]}
+    assert checkpoint.get("kb_queries") is None
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_is_scoped(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    await Checkpoint(path, "31337:0xoracle").save("chats", 5, [])
+
+    assert Checkpoint(path, "696969:0xoracle").get("chats") is None
+
+
+@pytest.mark.asyncio
+async def test_corrupt_checkpoint_is_ignored(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    path.write_text("{not json")
+
+    checkpoint = Checkpoint(str(path), "31337:0xoracle")
+    await checkpoint.save("chats", 1, [])
+
+    assert Checkpoint(str(path), "31337:0xoracle").get("chats") == {
+        "last_count": 1,
+        "in_flight": [],
+    }
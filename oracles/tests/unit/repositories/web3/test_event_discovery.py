@@ -0,0 +1,205 @@
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+
+import pytest
+from eth_utils import event_abi_to_log_topic
+from hexbytes import HexBytes
+from web3 import AsyncWeb3
+
+from src.repositories.web3.event_discovery import REQUEST_EVENTS
+from src.repositories.web3.event_discovery import OracleEventDiscovery
+
+ORACLE_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+
+def _get_discovery() -> OracleEventDiscovery:
+    web3_client = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider("http://127.0.0.1:8545"))
+    with open("abi/ChatOracle.json", "r", encoding="utf-8") as f:
+        abi = json.loads(f.read())["abi"]
+    oracle_contract = web3_client.eth.contract(address=ORACLE_ADDRESS, abi=abi)
+    discovery = OracleEventDiscovery(web3_client, oracle_contract)
+    discovery.web3_client = AsyncMock()
+    discovery.oracle_contract = oracle_contract
+    return discovery
+
+
+def _log(
+    discovery: OracleEventDiscovery,
+    event_name: str,
+    request_id: int,
+    block_number: int = 0,
+    block_hash: str = "0x00",
+) -> dict:
+    abi = discovery.oracle_contract.events[event_name]().abi
+    return {
+        "blockNumber": block_number,
+        "blockHash": HexBytes(block_hash),
+        "topics": [
+            HexBytes(event_abi_to_log_topic(abi)),
+            HexBytes(request_id.to_bytes(32, "big")),
+        ],
+    }
+
+
+@pytest.fixture(autouse=True)
+def sync_interval():
+    with patch("settings.DISCOVERY_SYNC_INTERVAL", 0):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_get_count_reads_counter_once_then_follows_logs():
+    discovery = _get_discovery()
+    discovery.web3_client.eth.get_block_number.return_value = 10
+    count_func = AsyncMock(side_effect=[3, 5])
+
+    assert await discovery.get_count("PromptAdded", count_func) == 3
+
+    discovery.web3_client.eth.get_block_number.return_value = 12
+    discovery.web3_client.eth.get_logs.return_value = [
+        _log(discovery, "PromptAdded", 3),
+        _log(discovery, "PromptAdded", 4),
+        _log(discovery, "FunctionAdded", 7),
+    ]
+    with patch("settings.DISCOVERY_REORG_DEPTH", 0):
+        assert await discovery.get_count("PromptAdded", count_func) == 5
+
+    # the growth is checked on-chain every DISCOVERY_VERIFY_INTERVAL only
+    assert count_func.await_count == 1
+    discovery.web3_client.eth.get_logs.assert_awaited_once()
+    logs_filter = discovery.web3_client.eth.get_logs.call_args[0][0]
+    assert logs_filter["fromBlock"] == 11
+    assert logs_filter["toBlock"] == 12
+    assert len(logs_filter["topics"][0]) == 4
+
+
+@pytest.mark.asyncio
+async def test_get_count_rescans_reorg_depth_and_splits_ranges():
+    discovery = _get_discovery()
+    discovery.cursor = 100
+    discovery.counts = {"KnowledgeBaseQueryAdded": 2}
+    discovery.verified_counts = {"KnowledgeBaseQueryAdded": 2}
+    discovery.verified_at = {"KnowledgeBaseQueryAdded": time.monotonic()}
+    discovery.web3_client.eth.get_block_number.return_value = 110
+    discovery.web3_client.eth.get_logs.return_value = [
+        _log(discovery, "KnowledgeBaseQueryAdded", 1),
+    ]
+
+    with patch("settings.DISCOVERY_REORG_DEPTH", 5), patch(
+        "settings.DISCOVERY_MAX_BLOCK_RANGE", 10
+    ):
+        count = await discovery.get_count("KnowledgeBaseQueryAdded", AsyncMock())
+
+    assert count == 2
+    ranges = [
+        (call[0][0]["fromBlock"], call[0][0]["toBlock"])
+        for call in discovery.web3_client.eth.get_logs.call_args_list
+    ]
+    assert ranges == [(96, 105), (106, 110)]
+    assert discovery.cursor == 110
+
+
+@pytest.mark.asyncio
+async def test_discovered_requests_dated_by_block_once():
+    discovery = _get_discovery()
+    discovery.cursor = 10
+    discovery.counts = {"PromptAdded": 3}
+    discovery.verified_counts = {"PromptAdded": 3}
+    discovery.verified_at = {"PromptAdded": time.monotonic()}
+    discovery.web3_client.eth.get_block_number.return_value = 12
+    discovery.web3_client.eth.get_logs.return_value = [
+        _log(discovery, "PromptAdded", 2, 9),
+        _log(discovery, "PromptAdded", 3, 11),
+        _log(discovery, "PromptAdded", 4, 11),
+    ]
+    discovery.web3_client.eth.get_block.return_value = {"timestamp": 1700000000}
+    with patch("settings.DISCOVERY_REORG_DEPTH", 2):
+        await discovery.get_count("PromptAdded", AsyncMock(return_value=5))
+
+    assert await discovery.get_created_at("PromptAdded", 2) is None
+    assert await discovery.get_created_at("PromptAdded", 3) == 1700000000
+    assert await discovery.get_created_at("PromptAdded", 4) == 1700000000
+    assert await discovery.get_created_at("PromptAdded", 4) is None
+    discovery.web3_client.eth.get_block.assert_awaited_once_with(11)
+
+
+@pytest.mark.asyncio
+async def test_count_capped_at_chain_count_after_reorg():
+    discovery = _get_discovery()
+    discovery.web3_client.eth.get_block_number.return_value = 10
+    count_func = AsyncMock(side_effect=[3, 4])
+    await discovery.get_count("PromptAdded", count_func)
+
+    # request 4 was created in a block that was reorged out
+    discovery.web3_client.eth.get_block_number.return_value = 12
+    discovery.web3_client.eth.get_logs.return_value = [
+        _log(discovery, "PromptAdded", 3, block_number=11),
+        _log(discovery, "PromptAdded", 4, block_number=12),
+    ]
+    with patch("settings.DISCOVERY_REORG_DEPTH", 0), patch(
+        "settings.DISCOVERY_VERIFY_INTERVAL", 0
+    ):
+        assert await discovery.get_count("PromptAdded", count_func) == 4
+
+    assert list(discovery.created_blocks) == [("PromptAdded", 3)]
+
+
+@pytest.mark.asyncio
+async def test_reorged_logs_checked_against_chain_count():
+    discovery = _get_discovery()
+    discovery.web3_client.eth.get_block_number.return_value = 10
+    count_func = AsyncMock(side_effect=[3, 4])
+    await discovery.get_count("PromptAdded", count_func)
+
+    discovery.web3_client.eth.get_block_number.return_value = 12
+    discovery.web3_client.eth.get_logs.return_value = [
+        _log(discovery, "PromptAdded", 3, 11, "0x11"),
+        _log(discovery, "PromptAdded", 4, 12, "0x12"),
+    ]
+    with patch("settings.DISCOVERY_REORG_DEPTH", 3):
+        assert await discovery.get_count("PromptAdded", count_func) == 5
+        assert count_func.await_count == 1
+
+        # block 12 was replaced, request 4 is not part of the new one
+        discovery.web3_client.eth.get_block_number.return_value = 13
+        discovery.web3_client.eth.get_logs.return_value = [
+            _log(discovery, "PromptAdded", 3, 11, "0x11"),
+        ]
+        assert await discovery.get_count("PromptAdded", count_func) == 4
+
+    assert count_func.await_count == 2
+    assert discovery.reorged == set()
+
+
+@pytest.mark.asyncio
+async def test_one_sync_per_tick_for_all_request_types():
+    discovery = _get_discovery()
+    eth = discovery.web3_client.eth
+    eth.get_block_number.return_value = 10
+    count_funcs = {name: AsyncMock(return_value=0) for name in REQUEST_EVENTS}
+
+    async def tick():
+        return await asyncio.gather(
+            *[
+                discovery.get_count(name, count_func)
+                for name, count_func in count_funcs.items()
+            ]
+        )
+
+    with patch("settings.DISCOVERY_SYNC_INTERVAL", 0.05):
+        assert await tick() == [0, 0, 0, 0]
+        eth.get_block_number.return_value = 12
+        eth.get_logs.return_value = [
+            _log(discovery, name, 0, 12) for name in REQUEST_EVENTS
+        ]
+        assert await tick() == [1, 1, 1, 1]
+        eth.get_logs.return_value = []
+        assert await tick() == [1, 1, 1, 1]
+
+    # the counters are read once, every tick reads the block number once
+    assert [f.await_count for f in count_funcs.values()] == [1, 1, 1, 1]
+    assert eth.get_block_number.await_count == 3
+    assert eth.get_logs.await_count == 1
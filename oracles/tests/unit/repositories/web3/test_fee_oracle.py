@@ -0,0 +1,74 @@
+from unittest.mock import AsyncMock
+
+import pytest
+from web3 import AsyncWeb3
+
+import settings
+from src.repositories.web3.fee_oracle import DEFAULT_MAX_FEE_PER_GAS
+from src.repositories.web3.fee_oracle import DEFAULT_MAX_PRIORITY_FEE_PER_GAS
+from src.repositories.web3.fee_oracle import FeeOracle
+
+GWEI = AsyncWeb3.to_wei("1", "gwei")
+
+
+def _get_fee_oracle(fee_history) -> FeeOracle:
+    web3_client = AsyncMock()
+    if isinstance(fee_history, Exception):
+        web3_client.eth.fee_history.side_effect = fee_history
+    else:
+        web3_client.eth.fee_history.return_value = fee_history
+    return FeeOracle(web3_client)
+
+
+@pytest.mark.asyncio
+async def test_fees_follow_fee_history():
+    fee_oracle = _get_fee_oracle(
+        {
+            "baseFeePerGas": [GWEI, 3 * GWEI],
+            "reward": [[GWEI // 10], [GWEI // 2], [GWEI]],
+        }
+    )
+
+    fees = await fee_oracle.get_fees()
+
+    assert fees == {
+        "maxPriorityFeePerGas": GWEI // 2,
+        "maxFeePerGas": 6 * GWEI + GWEI // 2,
+    }
+    assert fee_oracle.metrics["fee_oracle_updates"] == 1
+    assert fee_oracle.metrics["fee_oracle_base_fee_per_gas"] == 3 * GWEI
+
+
+@pytest.mark.asyncio
+async def test_fees_are_cached():
+    fee_oracle = _get_fee_oracle({"baseFeePerGas": [GWEI], "reward": [[GWEI]]})
+
+    await fee_oracle.get_fees()
+    await fee_oracle.get_fees()
+
+    fee_oracle.web3_client.eth.fee_history.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_fees_are_capped(monkeypatch):
+    monkeypatch.setattr(settings, "FEE_MAX_FEE_GWEI", 5)
+    fee_oracle = _get_fee_oracle({"baseFeePerGas": [10 * GWEI], "reward": [[GWEI]]})
+
+    fees = await fee_oracle.get_fees()
+
+    assert fees == {"maxFeePerGas": 5 * GWEI, "maxPriorityFeePerGas": GWEI}
+    assert fee_oracle.metrics["fee_oracle_capped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fees_fall_back_to_defaults_on_error():
+    fee_oracle = _get_fee_oracle(Exception("fee history not supported"))
+
+    fees = await fee_oracle.get_fees()
+
+    assert fees == {
+        "maxFeePerGas": DEFAULT_MAX_FEE_PER_GAS,
+        "maxPriorityFeePerGas": DEFAULT_MAX_PRIORITY_FEE_PER_GAS,
+    }
+    assert fee_oracle.metrics["fee_oracle_errors"] == 1
+    assert fee_oracle.metrics["fee_oracle_fallbacks"] == 1
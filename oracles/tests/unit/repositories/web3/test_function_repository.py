@@ -0,0 +1,58 @@
+import pytest
+from web3.exceptions import ContractLogicError
+
+from conftest import get_fields
+from src.repositories.web3.function_repository import Web3FunctionRepository
+
+
+def _get_values(ids):
+    values = {}
+    for i in ids:
+        values.update(
+            {
+                ("functionCallbackIds", i): 10 + i,
+                ("isFunctionProcessed", i): False,
+                ("functionTypes", i): "image_generation",
+                ("functionInputs", i): f"input {i}",
+                ("functionCallbackAddresses", i): f"0xcallback{i}",
+            }
+        )
+    return values
+
+
+@pytest.mark.asyncio
+async def test_aggregated_function_calls_match_single_reads(get_chain_client):
+    repository = Web3FunctionRepository(get_chain_client(_get_values([1, 2])))
+
+    function_calls = await repository._get_function_calls_aggregated([1, 2])
+
+    for function_call in function_calls:
+        assert get_fields(function_call) == get_fields(
+            await repository._get_function_call(function_call.id)
+        )
+    assert function_calls[1].function_input == "input 2"
+    assert function_calls[1].callback_address == "0xcallback2"
+
+
+@pytest.mark.asyncio
+async def test_aggregated_reverting_function_call_is_none(get_chain_client):
+    values = _get_values([1, 2, 3])
+    values[("functionInputs", 2)] = ContractLogicError("reverted")
+    repository = Web3FunctionRepository(get_chain_client(values))
+
+    function_calls = await repository._get_function_calls_aggregated([1, 2, 3])
+
+    assert [call and call.id for call in function_calls] == [1, None, 3]
+    assert repository.metrics["functions_read_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_aggregate_falls_back_to_single_reads(get_chain_client):
+    repository = Web3FunctionRepository(
+        get_chain_client(_get_values([1, 2]), failures=1)
+    )
+
+    function_calls = await repository._get_function_calls([1, 2])
+
+    assert [call.id for call in function_calls] == [1, 2]
+    assert repository.oracle_contract.functions.reads.count("functionInputs") == 2
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from web3.exceptions import ContractLogicError
+
+from conftest import get_fields
+from src.repositories.web3.knowledge_base_repository import (
+    Web3KnowledgeBaseRepository,
+)
+
+
+def _get_repository(index_cids):
+    repository = Web3KnowledgeBaseRepository.__new__(Web3KnowledgeBaseRepository)
+    repository.multicall = None
+    repository.index_cids = {}
+    repository.index_cid_lookups = {}
+    reads = []
+
+    def kb_indexes(cid):
+        async def call():
+            reads.append(cid)
+            await asyncio.sleep(0.01)
+            index_cid = index_cids[cid]
+            if isinstance(index_cid, Exception):
+                raise index_cid
+            return index_cid
+
+        return MagicMock(call=call)
+
+    repository.oracle_contract = MagicMock()
+    repository.oracle_contract.functions.kbIndexes = kb_indexes
+    return repository, reads
+
+
+@pytest.mark.asyncio
+async def test_concurrent_index_cid_lookups_coalesced():
+    repository, reads = _get_repository({"kb1": "index1", "kb2": ""})
+
+    results = await asyncio.gather(
+        repository._get_index_cids(["kb1", "kb2", "kb1"]),
+        repository._get_index_cid("kb1"),
+    )
+
+    assert results == [["index1", "", "index1"], "index1"]
+    assert reads == ["kb1", "kb2"]
+
+
+@pytest.mark.asyncio
+async def test_only_indexed_knowledge_bases_cached():
+    repository, reads = _get_repository({"kb1": "index1", "kb2": ""})
+
+    await repository._get_index_cids(["kb1", "kb2"])
+    await repository._get_index_cids(["kb1", "kb2"])
+
+    assert reads == ["kb1", "kb2", "kb2"]
+    assert list(repository.index_cids) == ["kb1"]
+
+
+@pytest.mark.asyncio
+async def test_expired_index_cid_read_again():
+    repository, reads = _get_repository({"kb1": "index2"})
+    repository.index_cids["kb1"] = ("index1", time.monotonic() - 1)
+
+    assert await repository._get_index_cid("kb1") == "index2"
+    assert await repository._get_index_cid("kb1") == "index2"
+    assert reads == ["kb1"]
+
+
+@pytest.mark.asyncio
+async def test_index_cid_reset_on_chain_dropped():
+    repository, _ = _get_repository({"kb1": ""})
+    repository.index_cids["kb1"] = ("index1", time.monotonic() - 1)
+
+    assert await repository._get_index_cid("kb1") == ""
+    assert repository.index_cids == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_index_cid_lookup_returned_in_place():
+    error = ContractLogicError("reverted")
+    repository, _ = _get_repository({"kb1": "index1", "kb2": error})
+
+    assert await repository._get_index_cids(["kb1", "kb2"]) == ["index1", error]
+    with pytest.raises(ContractLogicError):
+        await repository._get_index_cid("kb2")
+
+
+def _get_indexing_repository():
+    repository, _ = _get_repository({})
+    repository.pending_kb_index_requests = MagicMock()
+    repository.metrics = {
+        "knowledgebase_index_answered": 0,
+        "knowledgebase_index_marked_as_done": 0,
+    }
+    return repository
+
+
+def test_own_indexing_response_fills_map():
+    repository = _get_indexing_repository()
+    request = MagicMock(cid="kb1")
+
+    assert repository._on_indexing_response_mined(request, "index1", {"status": 1})
+    assert repository._get_cached_index_cid("kb1") == "index1"
+
+
+def test_own_indexing_response_replaces_cached_index():
+    repository = _get_indexing_repository()
+    repository.index_cids["kb1"] = ("index1", time.monotonic() + 60)
+    request = MagicMock(cid="kb1")
+
+    repository._on_indexing_response_mined(request, "index2", {"status": 1})
+    assert repository._get_cached_index_cid("kb1") == "index2"
+    # an error response resets the index on chain
+    repository._on_indexing_response_mined(request, "", {"status": 1})
+    assert repository.index_cids == {}
+
+
+def _get_values(ids):
+    values = {}
+    for i in ids:
+        values.update(
+            {
+                ("isKbIndexingRequestProcessed", i): False,
+                ("kbIndexingRequests", i): f"kb{i}",
+                ("kbQueryCallbackIds", i): 10 + i,
+                ("isKbQueryProcessed", i): False,
+                ("kbQueries", i): (f"kb{i}", f"query {i}", 3),
+                ("kbQueryCallbackAddresses", i): f"0xcallback{i}",
+                ("kbIndexes", f"kb{i}"): f"index{i}",
+            }
+        )
+    return values
+
+
+@pytest.mark.asyncio
+async def test_aggregated_indexing_requests_match_single_reads(get_chain_client):
+    repository = Web3KnowledgeBaseRepository(get_chain_client(_get_values([1, 2])))
+
+    requests = await repository._get_knowledge_base_indexing_requests_aggregated([1, 2])
+
+    for request in requests:
+        assert get_fields(request) == get_fields(
+            await repository._get_knowledge_base_indexing_request(request.id)
+        )
+    assert (requests[1].cid, requests[1].index_cid) == ("kb2", "index2")
+
+
+@pytest.mark.asyncio
+async def test_aggregated_reverting_indexing_request_is_none(get_chain_client):
+    values = _get_values([1, 2, 3, 4])
+    values[("kbIndexingRequests", 2)] = ContractLogicError("reverted")
+    values[("kbIndexes", "kb4")] = ContractLogicError("reverted")
+    repository = Web3KnowledgeBaseRepository(get_chain_client(values))
+
+    requests = await repository._get_knowledge_base_indexing_requests_aggregated(
+        [1, 2, 3, 4]
+    )
+
+    assert [request and request.id for request in requests] == [1, None, 3, None]
+
+
+@pytest.mark.asyncio
+async def test_failed_indexing_aggregate_falls_back_to_single_reads(
+    get_chain_client,
+):
+    repository = Web3KnowledgeBaseRepository(
+        get_chain_client(_get_values([1, 2]), failures=1)
+    )
+
+    requests = await repository._get_knowledge_base_indexing_requests([1, 2])
+
+    assert [request.index_cid for request in requests] == ["index1", "index2"]
+    reads = repository.oracle_contract.functions.reads
+    assert reads.count("kbIndexingRequests") == 2
+
+
+@pytest.mark.asyncio
+async def test_aggregated_kb_queries_match_single_reads(get_chain_client):
+    repository = Web3KnowledgeBaseRepository(get_chain_client(_get_values([1, 2])))
+
+    queries = await repository._get_kb_queries_aggregated([1, 2])
+
+    for query in queries:
+        assert get_fields(query) == get_fields(
+            await repository._get_kb_query(query.id)
+        )
+    assert queries[1].query == "query 2"
+    assert queries[1].index_cid == "index2"
+    assert queries[1].callback_address == "0xcallback2"
+
+
+@pytest.mark.asyncio
+async def test_aggregated_reverting_kb_query_is_none(get_chain_client):
+    values = _get_values([1, 2, 3, 4])
+    values[("kbQueryCallbackAddresses", 2)] = ContractLogicError("reverted")
+    values[("kbIndexes", "kb4")] = ContractLogicError("reverted")
+    repository = Web3KnowledgeBaseRepository(get_chain_client(values))
+
+    queries = await repository._get_kb_queries_aggregated([1, 2, 3, 4])
+
+    assert [query and query.id for query in queries] == [1, None, 3, None]
+
+
+@pytest.mark.asyncio
+async def test_failed_kb_query_aggregate_falls_back_to_single_reads(
+    get_chain_client,
+):
+    repository = Web3KnowledgeBaseRepository(
+        get_chain_client(_get_values([1, 2]), failures=1)
+    )
+
+    queries = await repository._get_kb_queries([1, 2])
+
+    assert [query.id for query in queries] == [1, 2]
+    assert repository.oracle_contract.functions.reads.count("kbQueries") == 2
@@ -0,0 +1,67 @@
+import json
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+from eth_abi import encode
+from web3 import AsyncWeb3
+from web3.exceptions import ContractLogicError
+
+from src.repositories.web3.multicall import Multicall
+from src.repositories.web3.multicall import get_first_error
+
+ORACLE_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+MULTICALL_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+
+def _get_oracle_contract(web3_client: AsyncWeb3):
+    with open("abi/ChatOracle.json", "r", encoding="utf-8") as f:
+        abi = json.loads(f.read())["abi"]
+    return web3_client.eth.contract(address=ORACLE_ADDRESS, abi=abi)
+
+
+@pytest.mark.asyncio
+async def test_aggregate_decodes_every_call_separately():
+    web3_client = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider("http://127.0.0.1:8545"))
+    oracle_contract = _get_oracle_contract(web3_client)
+    multicall = Multicall(web3_client, MULTICALL_ADDRESS)
+    aggregate3 = MagicMock()
+    aggregate3.return_value.call = AsyncMock(
+        return_value=[
+            (True, encode(["string"], ["OpenAI"])),
+            (True, encode(["string", "string", "uint32"], ["cid", "query", 3])),
+            (False, b""),
+        ]
+    )
+    multicall.contract.functions.aggregate3 = aggregate3
+
+    results = await multicall.aggregate(
+        [
+            oracle_contract.functions.promptType(1),
+            oracle_contract.functions.kbQueries(2),
+            oracle_contract.functions.isPromptProcessed(3),
+        ]
+    )
+
+    calls = aggregate3.call_args[0][0]
+    assert len(calls) == 3
+    assert all(call[0] == ORACLE_ADDRESS and call[1] for call in calls)
+    assert results[0] == "OpenAI"
+    assert results[1] == ["cid", "query", 3]
+    assert isinstance(results[2], ContractLogicError)
+
+
+@pytest.mark.asyncio
+async def test_aggregate_empty_calls_does_not_call_rpc():
+    web3_client = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider("http://127.0.0.1:8545"))
+    multicall = Multicall(web3_client, MULTICALL_ADDRESS)
+    multicall.contract.functions.aggregate3 = MagicMock()
+
+    assert await multicall.aggregate([]) == []
+    multicall.contract.functions.aggregate3.assert_not_called()
+
+
+def test_get_first_error():
+    error = ContractLogicError("reverted")
+    assert get_first_error(1, "a", error, ValueError()) is error
+    assert get_first_error(1, "a", None) is None
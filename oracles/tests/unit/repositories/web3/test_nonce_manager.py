@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.repositories.web3.nonce_manager import NonceManager
+
+ADDRESS = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+
+
+def _get_nonce_manager(chain_nonce: int) -> NonceManager:
+    web3_client = AsyncMock()
+    web3_client.eth.get_transaction_count.return_value = chain_nonce
+    return NonceManager(web3_client, ADDRESS)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_nonces_are_unique_and_sequential():
+    nonce_manager = _get_nonce_manager(7)
+
+    nonces = await asyncio.gather(*[nonce_manager.get_nonce() for _ in range(10)])
+
+    assert sorted(nonces) == list(range(7, 17))
+    nonce_manager.web3_client.eth.get_transaction_count.assert_awaited_once_with(
+        ADDRESS, "pending"
+    )
+
+
+@pytest.mark.asyncio
+async def test_released_nonce_is_reused_first():
+    nonce_manager = _get_nonce_manager(0)
+    for _ in range(3):
+        await nonce_manager.get_nonce()
+
+    nonce_manager.release(1)
+
+    assert await nonce_manager.get_nonce() == 1
+    assert await nonce_manager.get_nonce() == 3
+
+
+@pytest.mark.asyncio
+async def test_confirmed_nonce_can_not_be_released():
+    nonce_manager = _get_nonce_manager(0)
+    nonce = await nonce_manager.get_nonce()
+
+    nonce_manager.confirm(nonce)
+    nonce_manager.release(nonce)
+
+    assert await nonce_manager.get_nonce() == 1
+
+
+@pytest.mark.asyncio
+async def test_resync_fills_gaps_and_follows_chain():
+    nonce_manager = _get_nonce_manager(0)
+    for _ in range(5):
+        await nonce_manager.get_nonce()
+    # 0 and 1 mined, 3 still in flight, 2 and 4 were lost
+    nonce_manager.confirm(0)
+    nonce_manager.confirm(1)
+    nonce_manager.in_flight.discard(2)
+    nonce_manager.in_flight.discard(4)
+    nonce_manager.web3_client.eth.get_transaction_count.return_value = 2
+
+    await nonce_manager.resync()
+
+    assert [await nonce_manager.get_nonce() for _ in range(3)] == [2, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_resync_skips_nonces_used_outside_the_oracle():
+    nonce_manager = _get_nonce_manager(0)
+    await nonce_manager.get_nonce()
+    nonce_manager.web3_client.eth.get_transaction_count.return_value = 10
+
+    await nonce_manager.resync()
+
+    assert await nonce_manager.get_nonce() == 10
+
+
+@pytest.mark.asyncio
+async def test_dropped_nonce_no_longer_in_flight():
+    nonce_manager = _get_nonce_manager(0)
+    for _ in range(3):
+        await nonce_manager.get_nonce()
+
+    # nonce 0 was mined meanwhile, the transaction of nonce 1 never made it
+    nonce_manager.web3_client.eth.get_transaction_count.return_value = 1
+    await nonce_manager.resync(dropped=1)
+
+    assert nonce_manager.in_flight == {2}
+    assert await nonce_manager.get_nonce() == 1
+
+
+@pytest.mark.asyncio
+async def test_dropped_nonce_counted_by_chain_not_reused():
+    nonce_manager = _get_nonce_manager(0)
+    for _ in range(2):
+        await nonce_manager.get_nonce()
+
+    # the transaction of nonce 1 is still pending when its receipt times out
+    nonce_manager.web3_client.eth.get_transaction_count.return_value = 2
+    await nonce_manager.resync(dropped=1)
+
+    assert nonce_manager.in_flight == set()
+    assert await nonce_manager.get_nonce() == 2
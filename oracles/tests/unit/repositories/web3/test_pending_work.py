@@ -0,0 +1,41 @@
+from src.entities import Chat
+from src.entities import PromptType
+from src.repositories.web3.pending_work import PendingWork
+
+
+def _get_chat(i: int, is_processed: bool = False) -> Chat:
+    return Chat(
+        id=i,
+        callback_id=0,
+        is_processed=is_processed,
+        prompt_type=PromptType.DEFAULT,
+        messages=[],
+        config=None,
+    )
+
+
+def test_processed_entities_are_evicted():
+    pending_work = PendingWork(history_size=2)
+    chats = [_get_chat(i, is_processed=i == 1) for i in range(4)]
+    pending_work.extend(chats)
+
+    chats[2].is_processed = True
+    pending_work.complete(chats[2])
+    chats[3].is_processed = True
+
+    assert pending_work.get_unprocessed() == [chats[0]]
+    assert len(pending_work) == 1
+    # only the most recent processed entities are kept
+    assert list(pending_work.history) == [chats[2], chats[3]]
+
+
+def test_unprocessed_entities_keep_creation_order():
+    pending_work = PendingWork(history_size=10)
+    chats = [_get_chat(i) for i in range(5)]
+    pending_work.extend(chats)
+
+    pending_work.complete(chats[0])
+    pending_work.complete(chats[0])
+
+    assert [chat.id for chat in pending_work.get_unprocessed()] == [1, 2, 3, 4]
+    assert list(pending_work.history) == [chats[0]]
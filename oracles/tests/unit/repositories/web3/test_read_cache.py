@@ -0,0 +1,98 @@
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+from web3 import AsyncWeb3
+from web3.exceptions import ContractLogicError
+
+from src.repositories.web3.read_cache import ReadCache
+
+ORACLE_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+
+def _get_oracle_contract():
+    web3_client = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider("http://127.0.0.1:8545"))
+    with open("abi/ChatOracle.json", "r", encoding="utf-8") as f:
+        abi = json.loads(f.read())["abi"]
+    return web3_client.eth.contract(address=ORACLE_ADDRESS, abi=abi)
+
+
+def _mock_call(function, value):
+    function.call = AsyncMock(return_value=value)
+    return function
+
+
+@pytest.mark.asyncio
+async def test_immutable_reads_cached_by_arguments():
+    functions = _get_oracle_contract().functions
+    cache = ReadCache(10)
+
+    assert await cache.call(_mock_call(functions.promptType(1), "OpenAI")) == "OpenAI"
+    cached = _mock_call(functions.promptType(1), "Groq")
+    assert await cache.call(cached) == "OpenAI"
+    assert await cache.call(_mock_call(functions.promptType(2), "Groq")) == "Groq"
+
+    assert not cached.call.called
+    assert cache.get_metrics()["read_cache_hits"] == 1
+    assert cache.get_metrics()["read_cache_misses"] == 2
+    assert cache.get_metrics()["read_cache_hit_rate"] == 0.333
+
+
+@pytest.mark.asyncio
+async def test_processed_flags_never_cached():
+    functions = _get_oracle_contract().functions
+    cache = ReadCache(10)
+
+    assert await cache.call(_mock_call(functions.isPromptProcessed(1), False)) is False
+    assert await cache.call(_mock_call(functions.isPromptProcessed(1), True)) is True
+    assert cache.get_metrics()["read_cache_size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_evicted():
+    functions = _get_oracle_contract().functions
+    cache = ReadCache(2)
+
+    await cache.call(_mock_call(functions.promptType(1), "OpenAI"))
+    await cache.call(_mock_call(functions.promptType(2), "Groq"))
+    await cache.call(_mock_call(functions.promptType(1), "OpenAI"))
+    await cache.call(_mock_call(functions.promptType(3), "OpenAI"))
+
+    evicted = _mock_call(functions.promptType(2), "Groq")
+    await cache.call(evicted)
+    assert evicted.call.called
+    assert cache.get_metrics()["read_cache_evictions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_aggregate_only_sends_missing_calls():
+    functions = _get_oracle_contract().functions
+    cache = ReadCache(10)
+    await cache.call(_mock_call(functions.promptType(1), "OpenAI"))
+    error = ContractLogicError("reverted")
+    aggregate = AsyncMock(side_effect=[[True, error], [True, "Groq"]])
+
+    results = await cache.aggregate(
+        [
+            functions.promptType(1),
+            functions.isPromptProcessed(1),
+            functions.promptType(2),
+        ],
+        aggregate,
+    )
+    assert results == ["OpenAI", True, error]
+    assert [call.fn_name for call in aggregate.call_args.args[0]] == [
+        "isPromptProcessed",
+        "promptType",
+    ]
+
+    # the failed read is retried, the processed flag is read again
+    results = await cache.aggregate(
+        [
+            functions.promptType(1),
+            functions.isPromptProcessed(1),
+            functions.promptType(2),
+        ],
+        aggregate,
+    )
+    assert results == ["OpenAI", True, "Groq"]
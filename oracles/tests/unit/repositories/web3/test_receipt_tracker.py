@@ -0,0 +1,70 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+from web3.exceptions import TransactionNotFound
+
+import settings
+from src.repositories.web3.receipt_tracker import ReceiptTracker
+
+TX_HASH_1 = HexBytes(b"\x01" * 32)
+TX_HASH_2 = HexBytes(b"\x02" * 32)
+
+
+def _get_tracker(blocks):
+    web3_client = AsyncMock()
+    web3_client.eth.get_block_number.side_effect = lambda: max(blocks)
+
+    async def get_block(number):
+        return {"transactions": blocks[number]}
+
+    async def get_transaction_receipt(tx_hash):
+        if not any(tx_hash in block for block in blocks.values()):
+            raise TransactionNotFound("not mined")
+        return {"transactionHash": tx_hash, "status": 1}
+
+    web3_client.eth.get_block.side_effect = get_block
+    web3_client.eth.get_transaction_receipt.side_effect = get_transaction_receipt
+    return ReceiptTracker(web3_client)
+
+
+@pytest.mark.asyncio
+async def test_receipts_are_found_from_new_blocks(monkeypatch):
+    monkeypatch.setattr(settings, "RECEIPT_POLL_INTERVAL", 0.01)
+    blocks = {10: []}
+    tracker = _get_tracker(blocks)
+
+    receipts = [tracker.track(TX_HASH_1), tracker.track(TX_HASH_2)]
+    await asyncio.sleep(0.05)
+    blocks[11] = [TX_HASH_1, TX_HASH_2]
+    results = await asyncio.wait_for(asyncio.gather(*receipts), 1)
+
+    assert [r["transactionHash"] for r in results] == [TX_HASH_1, TX_HASH_2]
+    assert not tracker.pending
+    # one block query per new block, not a polling loop per transaction
+    block_numbers = [
+        c.args[0] for c in tracker.web3_client.eth.get_block.call_args_list
+    ]
+    assert block_numbers.count(11) == 1
+
+
+@pytest.mark.asyncio
+async def test_receipt_mined_before_tracking_is_found():
+    tracker = _get_tracker({5: [TX_HASH_1]})
+
+    receipt = await asyncio.wait_for(tracker.track(TX_HASH_1), 1)
+
+    assert receipt["status"] == 1
+
+
+@pytest.mark.asyncio
+async def test_receipt_times_out(monkeypatch):
+    monkeypatch.setattr(settings, "RECEIPT_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(settings, "RECEIPT_TIMEOUT", 0.05)
+    tracker = _get_tracker({1: []})
+
+    with pytest.raises(TimeExhausted):
+        await asyncio.wait_for(tracker.track(TX_HASH_1), 1)
+    assert not tracker.pending
@@ -0,0 +1,163 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+from eth_abi import encode
+from hexbytes import HexBytes
+from web3 import AsyncWeb3
+from web3.exceptions import ContractLogicError
+
+from src.domain import tracing
+from src.repositories.web3.response_batcher import ResponseBatcher
+
+ORACLE_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+
+def _get_oracle_contract():
+    web3_client = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider("http://127.0.0.1:8545"))
+    with open("abi/ChatOracle.json", "r", encoding="utf-8") as f:
+        abi = json.loads(f.read())["abi"]
+    return web3_client.eth.contract(address=ORACLE_ADDRESS, abi=abi)
+
+
+def _get_receipt(failed_calls=(), status=1):
+    topic = AsyncWeb3.keccak(text="BatchCallFailed(uint256,bytes)")
+    logs = [
+        {
+            "address": ORACLE_ADDRESS,
+            "topics": [topic],
+            "data": HexBytes(encode(["uint256", "bytes"], [index, b"\x01\x02"])),
+            "logIndex": n,
+            "transactionIndex": 0,
+            "transactionHash": HexBytes(b"\x01" * 32),
+            "blockHash": HexBytes(b"\x02" * 32),
+            "blockNumber": 1,
+        }
+        for n, index in enumerate(failed_calls)
+    ]
+    return {"status": status, "logs": logs}
+
+
+def _get_batcher(oracle_contract, tx_receipt):
+    build_tx = AsyncMock(return_value={"nonce": 1})
+    send_tx = AsyncMock(return_value=asyncio.ensure_future(_resolve(tx_receipt)))
+    return ResponseBatcher("chats", oracle_contract, build_tx, send_tx)
+
+
+async def _resolve(value):
+    return value
+
+
+@pytest.mark.asyncio
+async def test_batch_flushed_once_full():
+    oracle_contract = _get_oracle_contract()
+    batcher = _get_batcher(oracle_contract, _get_receipt())
+    functions = [
+        oracle_contract.functions.addResponse(i, i, "Hi", "") for i in range(2)
+    ]
+
+    with patch("settings.RESPONSE_BATCH_SIZE", 2), patch(
+        "settings.RESPONSE_BATCH_MAX_WAIT", 60
+    ):
+        results = [
+            batcher.submit(function, lambda tx_receipt: True, AsyncMock())
+            for function in functions
+        ]
+        assert await asyncio.gather(*results) == [True, True]
+
+    batch = batcher.build_tx.call_args.args[0]
+    assert batch.fn_name == "batchResponses"
+    assert batch.args[0] == [f._encode_transaction_data() for f in functions]
+    assert batcher.metrics["chats_response_batches_sent"] == 1
+    assert batcher.metrics["chats_responses_batched"] == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_flushed_after_max_wait():
+    oracle_contract = _get_oracle_contract()
+    batcher = _get_batcher(oracle_contract, _get_receipt())
+
+    with patch("settings.RESPONSE_BATCH_SIZE", 10), patch(
+        "settings.RESPONSE_BATCH_MAX_WAIT", 0.01
+    ):
+        result = batcher.submit(
+            oracle_contract.functions.addResponse(0, 0, "Hi", ""),
+            lambda tx_receipt: True,
+            AsyncMock(),
+        )
+        assert not batcher.build_tx.called
+        assert await result is True
+
+    assert batcher.build_tx.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_call_handed_to_on_error():
+    oracle_contract = _get_oracle_contract()
+    batcher = _get_batcher(oracle_contract, _get_receipt(failed_calls=[1]))
+    on_receipt = MagicMock(return_value=True)
+    on_error = AsyncMock()
+
+    with patch("settings.RESPONSE_BATCH_SIZE", 2):
+        results = [
+            batcher.submit(
+                oracle_contract.functions.addResponse(i, i, "Hi", ""),
+                on_receipt,
+                on_error,
+            )
+            for i in range(2)
+        ]
+        assert await asyncio.gather(*results) == [True, False]
+
+    assert on_receipt.call_count == 1
+    error = on_error.call_args.args[0]
+    assert isinstance(error, ContractLogicError)
+    assert "addResponse reverted" in str(error)
+    assert batcher.metrics["chats_batch_calls_failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_send_error_fails_every_call():
+    oracle_contract = _get_oracle_contract()
+    batcher = _get_batcher(oracle_contract, _get_receipt())
+    batcher.send_tx.side_effect = ValueError("nonce too low")
+
+    with patch("settings.RESPONSE_BATCH_SIZE", 2):
+        results = [
+            batcher.submit(
+                oracle_contract.functions.addResponse(i, i, "Hi", ""),
+                lambda tx_receipt: True,
+                AsyncMock(),
+            )
+            for i in range(2)
+        ]
+        results = await asyncio.gather(*results, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_batch_stages_recorded_on_every_call():
+    oracle_contract = _get_oracle_contract()
+    batcher = _get_batcher(oracle_contract, _get_receipt())
+
+    async def build_tx(function):
+        with tracing.span("tx_build"):
+            return {"nonce": 1}
+
+    batcher.build_tx = build_tx
+    traces = [tracing.Trace(), tracing.Trace()]
+
+    async def submit(trace, i):
+        tracing.set_trace(trace)
+        function = oracle_contract.functions.addResponse(i, i, "Hi", "")
+        return await batcher.submit(function, lambda tx_receipt: True, AsyncMock())
+
+    with patch("settings.RESPONSE_BATCH_SIZE", 2):
+        await asyncio.gather(*[submit(trace, i) for i, trace in enumerate(traces)])
+
+    for trace in traces:
+        assert [stage for stage, _, _ in trace.spans] == ["tx_build"]
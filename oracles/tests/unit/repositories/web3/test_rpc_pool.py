@@ -0,0 +1,96 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from src.repositories.web3.rpc_pool import PooledHTTPProvider
+
+
+class FakeProvider:
+    def __init__(self, delay: float = 0, error: Exception = None, response=None):
+        self.delay = delay
+        self.error = error
+        self.response = response or {"jsonrpc": "2.0", "id": 1, "result": "0x1"}
+        self.calls = 0
+
+    async def make_request(self, method, params):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.response
+
+
+def _get_provider(*providers: FakeProvider) -> PooledHTTPProvider:
+    provider = PooledHTTPProvider([f"http://node-{i}" for i in range(len(providers))])
+    for endpoint, fake in zip(provider.endpoints, providers):
+        endpoint.provider = fake
+    return provider
+
+
+@pytest.mark.asyncio
+async def test_read_goes_to_healthiest_endpoint():
+    slow, fast = FakeProvider(), FakeProvider()
+    provider = _get_provider(slow, fast)
+    provider.endpoints[0].latency = 0.5
+    provider.endpoints[1].latency = 0.01
+
+    await provider.make_request("eth_blockNumber", [])
+
+    assert (slow.calls, fast.calls) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_read_fails_over_and_scores_errors():
+    broken, healthy = FakeProvider(error=ConnectionError("down")), FakeProvider()
+    provider = _get_provider(broken, healthy)
+
+    response = await provider.make_request("eth_blockNumber", [])
+
+    assert response["result"] == "0x1"
+    assert provider.metrics["rpc_failovers"] == 1
+    assert provider.endpoints[0].score > provider.endpoints[1].score
+
+
+@pytest.mark.asyncio
+async def test_read_raises_when_every_endpoint_fails():
+    provider = _get_provider(
+        FakeProvider(error=ConnectionError("down")),
+        FakeProvider(error=ConnectionError("down too")),
+    )
+
+    with pytest.raises(ConnectionError):
+        await provider.make_request("eth_blockNumber", [])
+
+
+@pytest.mark.asyncio
+async def test_slow_read_is_hedged():
+    stuck = FakeProvider(delay=10)
+    fast = FakeProvider(response={"jsonrpc": "2.0", "id": 1, "result": "0x2"})
+    provider = _get_provider(stuck, fast)
+
+    with patch("settings.RPC_HEDGE_AFTER", 0.01):
+        response = await asyncio.wait_for(
+            provider.make_request("eth_blockNumber", []), 1
+        )
+
+    assert response["result"] == "0x2"
+    assert provider.metrics["rpc_hedged_reads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_raw_transaction_is_broadcast():
+    nodes = [
+        FakeProvider(response={"jsonrpc": "2.0", "id": 1, "error": "already known"}),
+        FakeProvider(delay=0.01),
+        FakeProvider(delay=0.02),
+    ]
+    provider = _get_provider(*nodes)
+
+    with patch("settings.RPC_BROADCAST_COUNT", 3):
+        response = await provider.make_request("eth_sendRawTransaction", ["0x"])
+        await asyncio.sleep(0.05)
+
+    assert response["result"] == "0x1"
+    assert [node.calls for node in nodes] == [1, 1, 1]
+    assert not provider.background_tasks
@@ -0,0 +1,76 @@
+from unittest.mock import AsyncMock
+from unittest.mock import patch
+
+import pytest
+from web3 import AsyncWeb3
+
+from src.repositories.web3.nonce_manager import NonceManager
+from src.repositories.web3.signer_pool import SignerPool
+
+# hardhat development accounts
+PRIVATE_KEYS = [
+    "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80",
+    "0x59c6995e998f97a5a0044966f0945389dc9e86dae88c7a8412f4603b6b78690d",
+    "0x5de4111afa1a4b94908f83103eb1f1706367c2e68ca870fc3fb9a804cdab365a",
+]
+
+
+def _get_signer_pool() -> SignerPool:
+    web3_client = AsyncWeb3()
+    web3_client.eth.get_transaction_count = AsyncMock(return_value=0)
+    web3_client.eth.get_balance = AsyncMock(return_value=10**18)
+    return SignerPool(
+        web3_client,
+        PRIVATE_KEYS,
+        lambda address: NonceManager(web3_client, address),
+    )
+
+
+def test_round_robin_takes_turns():
+    signer_pool = _get_signer_pool()
+
+    addresses = [signer_pool.acquire().address for _ in range(6)]
+
+    assert addresses[:3] == list(signer_pool.signers)
+    assert addresses[3:] == addresses[:3]
+
+
+@pytest.mark.asyncio
+async def test_least_pending_picks_idle_signer():
+    signer_pool = _get_signer_pool()
+    busy, idle, _ = signer_pool.signers.values()
+    await busy.nonce_manager.get_nonce()
+    for signer in signer_pool.signers.values():
+        if signer is not idle:
+            await signer.nonce_manager.get_nonce()
+
+    with patch("settings.SIGNER_STRATEGY", "least_pending"):
+        assert signer_pool.acquire() is idle
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_per_signer():
+    signer_pool = _get_signer_pool()
+    await signer_pool.update_balances()
+    signer = signer_pool.acquire()
+    await signer.nonce_manager.get_nonce()
+
+    metrics = signer_pool.get_metrics()
+
+    assert metrics["signer_0_pending"] == 1
+    assert metrics["signer_1_pending"] == 0
+    assert metrics["signer_2_balance_wei"] == 10**18
+
+
+def test_worker_signs_with_own_share_of_keys():
+    with patch("settings.ORACLE_WORKERS", 2), patch("settings.ORACLE_WORKER_INDEX", 1):
+        signer_pool = _get_signer_pool()
+
+    assert len(signer_pool.signers) == 1
+    assert "signer_1_pending" in signer_pool.get_metrics()
+
+
+def test_worker_without_key_refused():
+    with patch("settings.ORACLE_WORKERS", 4), patch("settings.ORACLE_WORKER_INDEX", 3):
+        with pytest.raises(ValueError):
+            _get_signer_pool()
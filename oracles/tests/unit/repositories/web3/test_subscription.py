@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from web3 import AsyncWeb3
+
+from src.repositories.web3 import subscription
+from src.repositories.web3.subscription import OracleSubscription
+
+ORACLE_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+
+def _get_subscription() -> OracleSubscription:
+    web3_client = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider("http://127.0.0.1:8545"))
+    with open("abi/ChatOracle.json", "r", encoding="utf-8") as f:
+        abi = json.loads(f.read())["abi"]
+    oracle_contract = web3_client.eth.contract(address=ORACLE_ADDRESS, abi=abi)
+    return OracleSubscription("ws://127.0.0.1:8546", oracle_contract)
+
+
+class FakeWebSocket:
+    def __init__(self, messages):
+        self.messages = asyncio.Queue()
+        for message in messages:
+            self.messages.put_nowait(json.dumps(message))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def send(self, message):
+        pass
+
+    async def recv(self):
+        return await self.messages.get()
+
+
+def _get_messages(oracle_subscription: OracleSubscription, event_name: str):
+    topic = next(
+        topic.hex()
+        for topic, name in oracle_subscription.topics.items()
+        if name == event_name
+    )
+    return [
+        {"id": 1, "result": "0xblocks"},
+        {"id": 2, "result": "0xlogs"},
+        {"params": {"subscription": "0xblocks", "result": {"number": "0x10"}}},
+        {"params": {"subscription": "0xlogs", "result": {"topics": [topic]}}},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_oracle_log_wakes_its_waiter():
+    oracle_subscription = _get_subscription()
+    websocket = FakeWebSocket(_get_messages(oracle_subscription, "FunctionAdded"))
+    chat_waiter = asyncio.create_task(oracle_subscription.wait_for("PromptAdded"))
+    function_waiter = asyncio.create_task(oracle_subscription.wait_for("FunctionAdded"))
+
+    with patch.object(subscription.websockets, "connect", lambda url: websocket):
+        listener = asyncio.create_task(oracle_subscription._listen())
+        await asyncio.wait_for(function_waiter, 1)
+    listener.cancel()
+
+    assert oracle_subscription.is_connected
+    assert oracle_subscription.latest_block_number == 16
+    assert not chat_waiter.done()
+    chat_waiter.cancel()
+
+
+@pytest.mark.asyncio
+async def test_stale_subscription_falls_back_to_polling():
+    oracle_subscription = _get_subscription()
+    websocket = FakeWebSocket(_get_messages(oracle_subscription, "PromptAdded")[:2])
+
+    with patch.object(subscription.websockets, "connect", lambda url: websocket):
+        with patch("settings.WEB3_WS_STALE_TIMEOUT", 0.05):
+            with pytest.raises(asyncio.TimeoutError):
+                await oracle_subscription._listen()
+
+
+@pytest.mark.asyncio
+async def test_dropped_subscription_wakes_waiters_and_polls():
+    oracle_subscription = _get_subscription()
+    oracle_subscription.is_connected = True
+
+    def connect(url):
+        raise OSError("refused")
+
+    with patch.object(subscription.websockets, "connect", connect), patch.object(
+        subscription, "POLL_INTERVAL", 0.05
+    ), patch("settings.WEB3_WS_IDLE_POLL_INTERVAL", 60):
+        waiter = asyncio.create_task(oracle_subscription.wait_for("PromptAdded"))
+        runner = asyncio.create_task(oracle_subscription.run())
+        await asyncio.wait_for(waiter, 1)
+        runner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await runner
+
+        # nothing wakes it up anymore, waiting polls every POLL_INTERVAL
+        for event in oracle_subscription.events.values():
+            event.clear()
+        started = time.monotonic()
+        await asyncio.wait_for(oracle_subscription.wait_for("FunctionAdded"), 1)
+
+    assert not oracle_subscription.is_connected
+    assert time.monotonic() - started < 0.5
+
+
+@pytest.mark.asyncio
+async def test_wait_ends_at_wake_time():
+    oracle_subscription = _get_subscription()
+    oracle_subscription.is_connected = True
+
+    started = time.monotonic()
+    with patch("settings.WEB3_WS_IDLE_POLL_INTERVAL", 60):
+        await asyncio.wait_for(
+            oracle_subscription.wait_for("PromptAdded", started + 0.05), 1
+        )
+
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.domain import throttling
+from src.service.adaptive_limiter import AdaptiveLimiter
+
+
+async def _run_jobs(limiter: AdaptiveLimiter, count: int, latency: float):
+    async def job():
+        await limiter.acquire()
+        await asyncio.sleep(0)
+        limiter.release(latency)
+
+    await asyncio.gather(*[job() for _ in range(count)])
+
+
+@pytest.mark.asyncio
+async def test_limit_grows_while_latency_is_stable():
+    limiter = AdaptiveLimiter(2, 1, 10)
+
+    await _run_jobs(limiter, 200, 1.0)
+
+    assert limiter.current == 10
+
+
+@pytest.mark.asyncio
+async def test_limit_not_grown_when_not_reached():
+    limiter = AdaptiveLimiter(5, 1, 10)
+
+    for _ in range(20):
+        await limiter.acquire()
+        limiter.release(1.0)
+
+    assert limiter.current == 5
+
+
+@pytest.mark.asyncio
+async def test_limit_shrinks_when_latency_rises():
+    limiter = AdaptiveLimiter(10, 1, 10)
+    await _run_jobs(limiter, 5, 1.0)
+
+    await limiter.acquire()
+    limiter.release(5.0)
+
+    assert limiter.current == 9
+    assert limiter.decreases == 1
+
+
+@pytest.mark.asyncio
+async def test_limit_halved_when_rate_limited():
+    limiter = AdaptiveLimiter(8, 1, 10)
+
+    for _ in range(4):
+        await limiter.acquire()
+        limiter.release(None, overloaded=True)
+
+    assert limiter.current == 1
+    assert limiter.decreases == 3
+
+
+@pytest.mark.asyncio
+async def test_waiters_admitted_up_to_limit():
+    limiter = AdaptiveLimiter(1, 1, 1)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+
+    limiter.release(1.0)
+    await waiter
+    assert limiter.in_use == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_retries_reported_to_current_task():
+    async def job(rate_limited: bool):
+        watch = throttling.watch_rate_limits()
+        if rate_limited:
+            throttling.on_backoff(
+                {"exception": SimpleNamespace(status_code=429), "tries": 1}
+            )
+        throttling.on_backoff(
+            {"exception": SimpleNamespace(status_code=408), "tries": 1}
+        )
+        return watch.hits
+
+    assert await asyncio.gather(
+        asyncio.create_task(job(True)), asyncio.create_task(job(False))
+    ) == [1, 0]
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from src.service.adaptive_limiter import AdaptiveLimiter
+from src.service.fair_queue import FairQueue
+from src.service.fair_queue import parse_weights
+
+
+def _serve_order(queue: FairQueue, waiters):
+    order = []
+    while queue:
+        order.append(waiters[queue.pop()])
+    return order
+
+
+@pytest.mark.asyncio
+async def test_flows_served_in_turn():
+    queue = FairQueue({})
+    loop = asyncio.get_running_loop()
+    waiters = {}
+    for flow in ["a", "a", "a", "a", "b", "b"]:
+        waiter = loop.create_future()
+        waiters[waiter] = flow
+        queue.push(flow, waiter)
+
+    assert _serve_order(queue, waiters) == ["a", "b", "a", "b", "a", "a"]
+
+
+@pytest.mark.asyncio
+async def test_weighted_flow_served_more_often():
+    queue = FairQueue({"a": 2})
+    loop = asyncio.get_running_loop()
+    waiters = {}
+    for flow in ["a"] * 4 + ["b"] * 2:
+        waiter = loop.create_future()
+        waiters[waiter] = flow
+        queue.push(flow, waiter)
+
+    assert _serve_order(queue, waiters) == ["a", "a", "b", "a", "a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_late_flow_not_behind_backlog():
+    queue = FairQueue({})
+    loop = asyncio.get_running_loop()
+    waiters = {}
+    for _ in range(10):
+        waiter = loop.create_future()
+        waiters[waiter] = "a"
+        queue.push("a", waiter)
+    for _ in range(5):
+        queue.pop()
+    waiter = loop.create_future()
+    waiters[waiter] = "b"
+    queue.push("b", waiter)
+
+    assert _serve_order(queue, waiters)[0] == "b"
+
+
+@pytest.mark.asyncio
+async def test_limiter_admits_waiters_fairly():
+    limiter = AdaptiveLimiter(1, 1, 1, FairQueue({}))
+    served = []
+
+    async def job(flow: str):
+        await limiter.acquire(flow)
+        served.append(flow)
+        await asyncio.sleep(0)
+        limiter.release(1.0)
+
+    await asyncio.gather(*[job(flow) for flow in ["a", "a", "a", "b"]])
+
+    assert served == ["a", "a", "b", "a"]
+    metrics = limiter.waiters.get_metrics("chats")
+    assert metrics["chats_queue_depth"] == 0
+    assert metrics["chats_queue_depth_b"] == 0
+    assert "chats_queue_avg_wait_s_a" in metrics
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    limiter = AdaptiveLimiter(1, 1, 1, FairQueue({}))
+    await limiter.acquire("a")
+    waiter = asyncio.create_task(limiter.acquire("b"))
+    await asyncio.sleep(0)
+    assert len(limiter.waiters) == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert len(limiter.waiters) == 0
+    assert limiter.waiters.get_metrics("chats")["chats_queue_depth_b"] == 0
+
+
+def test_parse_weights():
+    assert parse_weights("0xAbC=2, 0xdef=0.5") == {"0xabc": 2.0, "0xdef": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_flow_turn_goes_to_earliest_deadline():
+    queue = FairQueue({})
+    loop = asyncio.get_running_loop()
+    waiters = {}
+    for job_id, flow, deadline in [(1, "a", 30), (2, "a", 10), (3, "b", 20)]:
+        waiter = loop.create_future()
+        waiters[waiter] = job_id
+        queue.push(flow, waiter, deadline)
+
+    assert _serve_order(queue, waiters) == [2, 3, 1]
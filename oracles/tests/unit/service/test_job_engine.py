@@ -0,0 +1,252 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from src.domain import deadline
+from src.domain import tracing
+from src.domain.tracing import Trace
+from src.service.job_engine import JobHandler
+from src.service.job_engine import JobQueue
+
+
+class FakeHandler(JobHandler):
+    name = "fake"
+    event_name = "PromptAdded"
+    max_concurrency = 2
+
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.processing = 0
+        self.max_processing = 0
+        self.processed = []
+        self.expired = []
+        self.done = []
+        self.errors = []
+
+    async def get_jobs(self):
+        return []
+
+    async def process(self, job):
+        self.processing += 1
+        self.max_processing = max(self.max_processing, self.processing)
+        await asyncio.sleep(0.01)
+        self.processing -= 1
+        self.processed.append(job.id)
+        if job.id in self.fail_ids:
+            raise ValueError("failed")
+        return asyncio.sleep(0, result=True)
+
+    async def expire(self, job):
+        self.expired.append(job.id)
+        return asyncio.sleep(0, result=True)
+
+    def on_done(self, job, success):
+        self.done.append((job.id, success))
+
+    def on_error(self, job, error):
+        self.errors.append(job.id)
+
+
+def _get_jobs(*ids):
+    return [SimpleNamespace(id=i, created_at=time.time(), trace=Trace()) for i in ids]
+
+
+async def _wait_for_idle(queue: JobQueue):
+    while queue.running:
+        await asyncio.sleep(0.005)
+
+
+@pytest.mark.asyncio
+async def test_jobs_dispatched_within_max_concurrency():
+    handler = FakeHandler()
+    queue = JobQueue(handler)
+
+    queue.dispatch(_get_jobs(1, 2, 3, 4, 5))
+    await _wait_for_idle(queue)
+
+    assert sorted(handler.processed) == [1, 2, 3, 4, 5]
+    assert handler.max_processing == 2
+    assert queue.get_metrics()["fake_jobs_completed"] == 5
+    assert queue.get_metrics()["fake_jobs_per_minute"] == 5
+
+
+@pytest.mark.asyncio
+async def test_running_job_not_dispatched_twice():
+    handler = FakeHandler()
+    queue = JobQueue(handler)
+
+    queue.dispatch(_get_jobs(1))
+    queue.dispatch(_get_jobs(1))
+    assert queue.get_metrics()["fake_jobs_running"] == 1
+    await _wait_for_idle(queue)
+
+    assert handler.processed == [1]
+    assert handler.done == [(1, True)]
+
+
+@pytest.mark.asyncio
+async def test_failed_job_retried_after_backoff():
+    handler = FakeHandler(fail_ids=[1])
+    queue = JobQueue(handler)
+
+    with patch("settings.JOB_RETRY_DELAY", 60):
+        queue.dispatch(_get_jobs(1))
+        await _wait_for_idle(queue)
+        queue.dispatch(_get_jobs(1))
+        await _wait_for_idle(queue)
+        assert handler.processed == [1]
+        assert queue.get_metrics()["fake_jobs_retrying"] == 1
+
+        queue.retry_at[1] = 0
+        queue.dispatch(_get_jobs(1))
+        await _wait_for_idle(queue)
+
+    assert handler.processed == [1, 1]
+    assert handler.errors == [1, 1]
+    assert queue.attempts[1] == 2
+    assert queue.get_metrics()["fake_jobs_failed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_answered_job_no_longer_retried():
+    handler = FakeHandler(fail_ids=[1])
+    queue = JobQueue(handler)
+
+    queue.dispatch(_get_jobs(1))
+    await _wait_for_idle(queue)
+    queue.dispatch(_get_jobs(2))
+    await _wait_for_idle(queue)
+
+    assert queue.retry_at == {}
+    assert queue.attempts == {}
+
+
+@pytest.mark.asyncio
+async def test_jobs_started_earliest_deadline_first():
+    handler = FakeHandler()
+    handler.max_concurrency = 1
+    queue = JobQueue(handler)
+    jobs = _get_jobs(1, 2, 3)
+    jobs[0].created_at -= 10
+    jobs[1].created_at -= 30
+    jobs[2].created_at -= 20
+
+    queue.dispatch(jobs)
+    await _wait_for_idle(queue)
+
+    assert handler.processed == [2, 3, 1]
+
+
+@pytest.mark.asyncio
+async def test_stages_time_out_once_deadline_passed():
+    class StageHandler(FakeHandler):
+        async def process(self, job):
+            await asyncio.sleep(0.05)
+            return deadline.get_timeout(600)
+
+    handler = StageHandler()
+    queue = JobQueue(handler)
+    jobs = _get_jobs(1)
+    jobs[0].created_at -= 59.98
+
+    with patch("settings.JOB_DEADLINE", 60):
+        queue.dispatch(jobs)
+        await _wait_for_idle(queue)
+
+    assert handler.errors == [1]
+    assert handler.expired == []
+
+
+@pytest.mark.asyncio
+async def test_expired_job_answered_without_processing():
+    handler = FakeHandler()
+    queue = JobQueue(handler)
+    jobs = _get_jobs(1, 2)
+    jobs[0].created_at -= 120
+
+    with patch("settings.JOB_DEADLINE", 60):
+        queue.dispatch(jobs)
+        await _wait_for_idle(queue)
+
+    assert handler.processed == [2]
+    assert handler.expired == [1]
+    assert handler.done == [(1, True), (2, True)]
+    assert queue.get_metrics()["fake_jobs_expired"] == 1
+    assert queue.get_metrics()["fake_jobs_completed"] == 2
+    assert queue.limiter.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_retried_job_answered_once_expired():
+    handler = FakeHandler(fail_ids=[1])
+    queue = JobQueue(handler)
+    jobs = _get_jobs(1)
+
+    with patch("settings.JOB_DEADLINE", 60):
+        queue.dispatch(jobs)
+        await _wait_for_idle(queue)
+        # the retry keeps the creation time of the request
+        jobs[0].created_at -= 120
+        queue.retry_at[1] = 0
+        queue.dispatch(jobs)
+        await _wait_for_idle(queue)
+
+    assert handler.processed == [1]
+    assert handler.expired == [1]
+    assert queue.retry_at == {}
+    assert queue.attempts == {}
+
+
+@pytest.mark.asyncio
+async def test_late_job_processed_without_deadline():
+    handler = FakeHandler()
+    queue = JobQueue(handler)
+    jobs = _get_jobs(1)
+    jobs[0].created_at -= 3600
+
+    with patch("settings.JOB_DEADLINE", 0):
+        queue.dispatch(jobs)
+        await _wait_for_idle(queue)
+
+    assert handler.processed == [1]
+    assert handler.expired == []
+    assert queue.get_metrics()["fake_jobs_expired"] == 0
+
+
+@pytest.mark.asyncio
+async def test_job_stages_traced():
+    class StageHandler(FakeHandler):
+        async def process(self, job):
+            with tracing.span("llm"):
+                await asyncio.sleep(0.01)
+            return await super().process(job)
+
+    handler = StageHandler()
+    queue = JobQueue(handler)
+    jobs = _get_jobs(1)
+    traced = jobs[0].trace
+    tracer = tracing.Tracer(path=None)
+
+    with patch.object(tracing, "tracer", tracer):
+        queue.dispatch(jobs)
+        await _wait_for_idle(queue)
+
+    assert [stage for stage, _, _ in traced.spans] == ["llm"]
+    assert tracer.get_metrics()["fake_llm_latency_p50_s"] > 0
+    assert jobs[0].trace is not traced
+
+
+@pytest.mark.asyncio
+async def test_next_retry_of_failed_jobs():
+    handler = FakeHandler(fail_ids=[2])
+    queue = JobQueue(handler)
+
+    queue.dispatch(_get_jobs(1, 2))
+    await _wait_for_idle(queue)
+
+    assert queue.get_next_retry() == queue.retry_at[2]
+    assert queue.get_next_retry() > time.monotonic()
+    assert JobQueue(handler).get_next_retry() is None
@@ -0,0 +1,119 @@
+import pytest
+
+from src.domain.tracing import LatencyHistogram
+from src.service.metrics_server import MetricsServer
+from src.service.metrics_server import format_metrics
+
+
+def _get_histogram(*values):
+    histogram = LatencyHistogram(buckets=(0.5, 1, float("inf")))
+    for value in values:
+        histogram.observe(value)
+    return histogram
+
+
+def test_counters_and_gauges():
+    text = format_metrics(
+        {
+            "transactions_sent": 14,
+            "chats_queue_depth": 3,
+            "llm_rate_limit_wait_s": 1.5,
+            "read_cache_hit_rate": 0.25,
+        },
+        [],
+    )
+
+    assert text.splitlines() == [
+        "# TYPE oracle_transactions_sent_total counter",
+        "oracle_transactions_sent_total 14",
+        "# TYPE oracle_chats_queue_depth gauge",
+        "oracle_chats_queue_depth 3",
+        "# TYPE oracle_llm_rate_limit_wait_s_total counter",
+        "oracle_llm_rate_limit_wait_s_total 1.5",
+        "# TYPE oracle_read_cache_hit_rate gauge",
+        "oracle_read_cache_hit_rate 0.25",
+    ]
+
+
+def test_metric_names_sanitized():
+    text = format_metrics({"rpc.errors-5xx": 1}, [])
+
+    assert "oracle_rpc_errors_5xx 1" in text.splitlines()
+
+
+def test_per_instance_metrics_share_one_name():
+    text = format_metrics(
+        {
+            "chats_queue_depth": 3,
+            "chats_queue_depth_0xAbC1": 2,
+            "chats_queue_depth_unknown": 1,
+            "chats_queue_avg_wait_s_0xAbC1": 0.5,
+            "signer_0_transactions_sent": 4,
+            "signer_1_transactions_sent": 5,
+            "rpc_endpoint_0_latency_ms": 12,
+        },
+        [],
+    )
+
+    assert text.splitlines() == [
+        "# TYPE oracle_chats_queue_depth gauge",
+        "oracle_chats_queue_depth 3",
+        "# TYPE oracle_chats_flow_queue_depth gauge",
+        'oracle_chats_flow_queue_depth{flow="0xAbC1"} 2',
+        'oracle_chats_flow_queue_depth{flow="unknown"} 1',
+        "# TYPE oracle_chats_flow_queue_avg_wait_s gauge",
+        'oracle_chats_flow_queue_avg_wait_s{flow="0xAbC1"} 0.5',
+        "# TYPE oracle_signer_transactions_sent_total counter",
+        'oracle_signer_transactions_sent_total{signer="0"} 4',
+        'oracle_signer_transactions_sent_total{signer="1"} 5',
+        "# TYPE oracle_rpc_endpoint_latency_ms gauge",
+        'oracle_rpc_endpoint_latency_ms{endpoint="0"} 12',
+    ]
+
+
+def test_histograms_with_cumulative_buckets():
+    histograms = [
+        (
+            "stage_duration_seconds",
+            {"job": "chats", "stage": "llm"},
+            _get_histogram(0.2, 0.7, 3),
+        ),
+        (
+            "stage_duration_seconds",
+            {"job": "chats", "stage": "tx_receipt"},
+            _get_histogram(),
+        ),
+    ]
+
+    lines = format_metrics({}, histograms).splitlines()
+
+    assert lines[:6] == [
+        "# TYPE oracle_stage_duration_seconds histogram",
+        'oracle_stage_duration_seconds_bucket{job="chats",stage="llm",le="0.5"} 1',
+        'oracle_stage_duration_seconds_bucket{job="chats",stage="llm",le="1"} 2',
+        'oracle_stage_duration_seconds_bucket{job="chats",stage="llm",le="+Inf"} 3',
+        'oracle_stage_duration_seconds_sum{job="chats",stage="llm"} 3.9',
+        'oracle_stage_duration_seconds_count{job="chats",stage="llm"} 3',
+    ]
+    assert lines.count("# TYPE oracle_stage_duration_seconds histogram") == 1
+    assert (
+        'oracle_stage_duration_seconds_count{job="chats",stage="tx_receipt"} 0' in lines
+    )
+
+
+def test_label_values_escaped():
+    histograms = [("d", {"model": 'a"b\\c'}, _get_histogram())]
+
+    assert 'oracle_d_count{model="a\\"b\\\\c"} 0' in format_metrics({}, histograms)
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_serves_current_metrics():
+    metrics = {"chats_jobs_running": 1}
+    server = MetricsServer(lambda: metrics, lambda: [], port=0)
+
+    metrics["chats_jobs_running"] = 2
+    response = await server.handle_metrics(None)
+
+    assert response.content_type == "text/plain"
+    assert "oracle_chats_jobs_running 2" in response.text
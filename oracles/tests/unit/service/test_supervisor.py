@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+
+from src.domain.tracing import Trace
+from src.repositories.web3.chat_repository import Web3ChatRepository
+from src.service.supervisor import Supervisor
+from src.service.supervisor import get_worker_path
+from src.service.supervisor import merge_metrics
+
+
+def test_worker_metrics_files_kept_apart():
+    assert get_worker_path("metrics.json", None) == "metrics.json"
+    assert get_worker_path("component_metrics.json", 2) == "component_metrics.2.json"
+
+
+def test_merge_metrics():
+    merged = merge_metrics(
+        [
+            {
+                "chats_count": 10,
+                "chats_answered": 3,
+                "chats_job_avg_duration_s": 1.0,
+                "read_cache_hit_rate": 0.5,
+                "signer_0_pending": 1,
+            },
+            {
+                "chats_count": 11,
+                "chats_answered": 4,
+                "chats_job_avg_duration_s": 2.0,
+                "read_cache_hit_rate": 0.7,
+                "signer_1_pending": 2,
+            },
+        ]
+    )
+
+    assert merged == {
+        "chats_count": 11,
+        "chats_answered": 7,
+        "chats_job_avg_duration_s": 1.5,
+        "read_cache_hit_rate": 0.6,
+        "signer_0_pending": 1,
+        "signer_1_pending": 2,
+    }
+
+
+@pytest.mark.asyncio
+async def test_merge_cold_start_marked_as_done():
+    # chats 0-9 and 11 are answered, 10 and 12 are not
+    processed = set(range(10)) | {11}
+    worker_metrics = []
+    for index in (0, 1):
+        with patch("settings.ORACLE_WORKERS", 2), patch(
+            "settings.ORACLE_WORKER_INDEX", index
+        ):
+            repository = _get_chat_repository(13, processed)
+            await repository._index_new_chats()
+        worker_metrics.append(repository.metrics)
+
+    merged = merge_metrics(worker_metrics)
+
+    assert worker_metrics[0]["chats_marked_as_done"] == 5
+    assert worker_metrics[1]["chats_marked_as_done"] == 6
+    assert merged["chats_marked_as_done"] == 11
+    assert merged["chats_read"] == 3
+
+
+def _get_chat_repository(count, processed):
+    functions = MagicMock()
+    functions.promptsCount.return_value.call = AsyncMock(return_value=count)
+    functions.isPromptProcessed = lambda i: MagicMock(
+        call=AsyncMock(return_value=i in processed)
+    )
+    chain_client = SimpleNamespace(
+        web3_client=None,
+        signers=None,
+        receipt_tracker=None,
+        fee_oracle=None,
+        checkpoint=None,
+        oracle_contract=SimpleNamespace(functions=functions),
+        multicall=None,
+        read_cache=None,
+        event_discovery=None,
+    )
+    repository = Web3ChatRepository(chain_client)
+
+    async def get_chats(ids):
+        return [
+            SimpleNamespace(id=i, is_processed=i in processed, trace=Trace())
+            for i in ids
+        ]
+
+    repository._get_chats = get_chats
+    return repository
+
+
+def test_every_worker_needs_a_key():
+    with patch("settings.PRIVATE_KEYS", ["0x1"]):
+        with pytest.raises(ValueError):
+            Supervisor("oracle.py", workers=2)